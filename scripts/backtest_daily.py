@@ -21,6 +21,10 @@ import numpy as np
 import pandas as pd
 
 ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.profiling import profile_run
+
 DB = ROOT / "data" / "research.db"
 COST = 0.0015
 # データがKraken 720日(2024-07〜)のみとなったため分割を調整 (2026-07-06、結果を見る前に確定):
@@ -190,4 +194,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with profile_run("backtest_daily"):
+        main()
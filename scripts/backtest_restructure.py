@@ -6,11 +6,15 @@ DBの価格履歴を使い、旧設定(5分足グリッド・閾値0.05・クー
 各botのシグナル→約定をリプレイし、取引数・コスト・グロス/ネット損益を比較する。
 
 簡略化(結果の解釈時に注意):
-- 対象は単銘柄テクニカルの6bot(01-06)。07(ペア)/08(メタ)/09(ML)/10(外部データ)は除外
+- 対象は単銘柄テクニカルの6bot(01-06)。07(ペア)/08(メタ)/10(外部データ)は除外
   — ただし除外botも同じ執行レイヤ(閾値/クールダウン/レジーム)を通るため方向性は共通
+- 09(ML)はウォークフォワードの OOS 予測 (scripts/ml_walk_forward.py の出力) があれば
+  新設定のみ評価する (予測は1時間足の確定時点のものなので、旧グリッドには当てはめない)
 - 銘柄ごとに独立サブ口座(初期資産を銘柄数で等分)として簡易執行
 - 旧グリッドはpricesテーブルの実記録間隔(≈15分〜1時間)そのまま = 本番実行周期の近似
 - bot実装コードそのものを呼ぶ(compute_signal)。ロジックの再実装はしない
+- 約定も本番の Simulator そのもの (台帳だけメモリ上の MemoryLedger に差し替え)。
+  クールダウン = 最低保有期間、サブ口座の初期資産基準でサーキットブレーカーも掛かる
 
 usage: python scripts/backtest_restructure.py [days]
 """
@@ -22,13 +26,16 @@ import pandas as pd
 
 sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
 
-from src.config import DB_PATH, BOT_CONFIGS, USD_JPY_RATE, TOTAL_COST_RATE
+from src.config import DB_PATH, BOT_CONFIGS, USD_JPY_RATE, TOTAL_COST_RATE, REGIME_BEAR_MAX_POSITION
+from src.profiling import profile_run
+from src.simulator import Simulator, MemoryLedger
 from src.bots.bot_01_donchian import BotDonchian
 from src.bots.bot_02_ema_adx import BotEmaAdx
 from src.bots.bot_03_bb_zscore import BotBBZscore
 from src.bots.bot_04_vwap import BotVWAP
 from src.bots.bot_05_squeeze import BotSqueeze
 from src.bots.bot_06_vol_momentum import BotVolMomentum
+from src.walk_forward import PredictionSignals, load_predictions
 
 BOTS = {
     "01_donchian": BotDonchian,
@@ -67,13 +74,15 @@ def to_hourly(df: pd.DataFrame) -> pd.DataFrame:
 def replay(bot, df: pd.DataFrame, symbol: str, eval_start,
            threshold: float, cooldown_min: int,
            regime_sma: int | None, sub_capital: float):
-    """1銘柄サブ口座の簡易リプレイ。戻り値: (trades, cost, net_pnl, gross_pnl)"""
-    balance = sub_capital
-    qty = 0.0
-    trades = 0
-    cost_paid = 0.0
-    last_trade_ts = None
-
+    """
+    1銘柄サブ口座のリプレイ。戻り値: (trades, cost, net_pnl, gross_pnl)
+    約定は本番と同じ Simulator (閾値・最低保有期間・コスト・サーキットブレーカー) に
+    メモリ上の台帳 (MemoryLedger) を渡して行い、時刻は足の時刻で進める。
+    """
+    ledger = MemoryLedger()
+    sim = Simulator(getattr(bot, "name", "replay"), ledger,
+                    initial_balance=sub_capital, position_change_threshold=threshold,
+                    min_hold_minutes=cooldown_min)
     sma = df["close"].rolling(regime_sma).mean() if regime_sma else None
 
     for i in range(len(df)):
@@ -87,49 +96,26 @@ def replay(bot, df: pd.DataFrame, symbol: str, eval_start,
             sig = bot.compute_signal(window, symbol)
         except Exception:
             continue
-        target = float(sig.get("target_position", 0.0) or 0.0)
+        # BaseBot.get_signals と同じく 0〜1 に収める
+        target = max(0.0, min(1.0, float(sig.get("target_position", 0.0) or 0.0)))
 
         if regime_sma is not None and not pd.isna(sma.iloc[i]) \
                 and df["close"].iloc[i] < sma.iloc[i]:
-            target = 0.0  # 下落レジーム退避
-
-        price_jpy = df["close"].iloc[i] * USD_JPY_RATE
-        total = balance + qty * price_jpy
-        cur_pos = (qty * price_jpy) / total if total > 0 else 0.0
-        delta = target - cur_pos
-        if abs(delta) < threshold:
-            continue
-        if cooldown_min and last_trade_ts is not None \
-                and (ts - last_trade_ts).total_seconds() / 60 < cooldown_min:
-            continue
+            target = min(target, REGIME_BEAR_MAX_POSITION)  # 下落レジーム退避
 
-        if delta > 0:
-            amount = min(total * delta, balance)
-            if amount <= 0:
-                continue
-            eff = price_jpy * (1 + TOTAL_COST_RATE)
-            qty += amount / eff
-            balance -= amount
-            cost_paid += amount / eff * price_jpy * TOTAL_COST_RATE
-        else:
-            sell_qty = qty * min(1.0, -delta / cur_pos) if cur_pos > 0 else 0.0
-            if sell_qty <= 0:
-                continue
-            eff = price_jpy * (1 - TOTAL_COST_RATE)
-            balance += sell_qty * eff
-            qty -= sell_qty
-            cost_paid += sell_qty * price_jpy * TOTAL_COST_RATE
-        trades += 1
-        last_trade_ts = ts
+        ledger.set_time(ts)
+        sim.apply_signal(symbol, {"target_position": target}, df["close"].iloc[i])
 
+    trades = ledger.trades()
+    cost_paid = float((trades["quantity"] * trades["price"]).sum() * TOTAL_COST_RATE)
     final_price = df["close"].iloc[-1] * USD_JPY_RATE
-    net = balance + qty * final_price - sub_capital
-    return trades, cost_paid, net, net + cost_paid
+    net = sim.balance + sim.quantities.get(symbol, 0.0) * final_price - sub_capital
+    return len(trades), cost_paid, net, net + cost_paid
 
 
 def main():
     days = int(sys.argv[1]) if len(sys.argv) > 1 else 30
-    print(f"=== 構成見直しバックテスト (直近{days}日評価 / 対象: 01-06) ===")
+    print(f"=== 構成見直しバックテスト (直近{days}日評価 / 対象: 01-06 + 09[予測系列があれば]) ===")
 
     raw = {}
     hourly = {}
@@ -142,18 +128,23 @@ def main():
              f"{'新:取引':>8}{'新:コスト':>10}{'新:純損益':>10}"
     print(header)
     totals = [0, 0.0, 0.0, 0, 0.0, 0.0]
-    for name, cls in BOTS.items():
+    factories = {name: (lambda cls=cls, cfg=BOT_CONFIGS[name]: cls(cfg)) for name, cls in BOTS.items()}
+    ml_predictions = {sym: load_predictions(sym) for sym in BOT_CONFIGS["09_ml_gate"]["symbols"]}
+    if any(p is not None for p in ml_predictions.values()):
+        factories["09_ml_gate"] = lambda: PredictionSignals(ml_predictions)
+    for name, factory in factories.items():
         cfg = BOT_CONFIGS[name]
         syms = cfg["symbols"]
         sub = 50_000 / len(syms)
         old = [0, 0.0, 0.0]
         new = [0, 0.0, 0.0]
         for sym in syms:
-            t, c, n, _ = replay(cls(cfg), raw[sym], sym, eval_start,
-                                threshold=0.05, cooldown_min=0,
-                                regime_sma=None, sub_capital=sub)
-            old[0] += t; old[1] += c; old[2] += n
-            t, c, n, _ = replay(cls(cfg), hourly[sym], sym, eval_start,
+            if name != "09_ml_gate":
+                t, c, n, _ = replay(factory(), raw[sym], sym, eval_start,
+                                    threshold=0.05, cooldown_min=0,
+                                    regime_sma=None, sub_capital=sub)
+                old[0] += t; old[1] += c; old[2] += n
+            t, c, n, _ = replay(factory(), hourly[sym], sym, eval_start,
                                 threshold=0.20, cooldown_min=240,
                                 regime_sma=200, sub_capital=sub)
             new[0] += t; new[1] += c; new[2] += n
@@ -168,4 +159,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with profile_run("backtest_restructure"):
+        main()
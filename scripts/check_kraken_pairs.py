@@ -1,10 +1,15 @@
 
-import ccxt
+import os
 import sys
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.data_collector import create_exchange
+
 def check_pairs():
     try:
-        exchange = ccxt.kraken()
+        # マーケット情報はキャッシュ (data/cache) から注入済み。期限切れ時のみ再取得される
+        exchange = create_exchange()
         markets = exchange.load_markets()
         
         print("Searching for USD/JPY pairs...")
@@ -0,0 +1,108 @@
+"""
+src/tree_predictor.py の TreePredictor と lightgbm の Booster.predict の一致確認。
+小さなモデルをその場で学習し、欠損値 (NaN)・ゼロ・分岐閾値ちょうどの値を含む入力で
+両者の予測が完全に一致する (差 0) ことを確かめる。一致しなければ終了コード 1。
+
+- 欠損の扱いの3種 (NaN を欠損 / zero_as_missing / use_missing=false) を学習する
+- 目的関数は回帰系、特徴量は数値のみ (TreePredictor の対応範囲)。
+  カテゴリ特徴量を含むモデルは読込時に ValueError になることも確かめる
+- CI (.github/workflows/tree_predictor_check.yml) と lightgbm の更新時に実行する
+
+usage: python scripts/check_tree_predictor.py
+"""
+import sys
+import logging
+from pathlib import Path
+
+import numpy as np
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.tree_predictor import TreePredictor
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+CASES = {
+    "nan_as_missing": {"objective": "regression"},
+    "zero_as_missing": {"objective": "regression", "zero_as_missing": True},
+    "no_missing": {"objective": "regression", "use_missing": False},
+    "huber": {"objective": "huber"},
+}
+BASE_PARAMS = {"num_leaves": 15, "min_data_in_leaf": 5, "learning_rate": 0.1,
+               "verbose": -1, "seed": 0, "deterministic": True, "force_row_wise": True}
+
+
+def make_data(rng, rows: int, features: int = 6):
+    """ゼロ・欠損値を多めに含む特徴量と、それに依存する目的変数。"""
+    X = rng.normal(size=(rows, features))
+    X[rng.random(X.shape) < 0.15] = 0.0
+    X[rng.random(X.shape) < 0.15] = np.nan
+    filled = np.nan_to_num(X, nan=-1.0)
+    y = filled[:, 0] * 2 - filled[:, 1] ** 2 + np.where(np.isnan(X[:, 2]), 1.5, filled[:, 2]) \
+        + rng.normal(scale=0.1, size=rows)
+    return X, y
+
+
+def probe_rows(booster, rng, X):
+    """評価用の入力: 学習データ・新しい乱数・全欠損/全ゼロの行・分岐閾値ちょうど/前後の値。"""
+    thresholds = []
+    for tree in booster.dump_model()["tree_info"]:
+        stack = [tree["tree_structure"]]
+        while stack:
+            node = stack.pop()
+            if "split_feature" in node:
+                thresholds.append((node["split_feature"], float(node["threshold"])))
+                stack += [node["left_child"], node["right_child"]]
+    edge = np.tile(np.nanmedian(X, axis=0), (len(thresholds) * 3, 1))
+    for i, (feature, threshold) in enumerate(thresholds):
+        edge[3 * i:3 * i + 3, feature] = (threshold, np.nextafter(threshold, -np.inf),
+                                          np.nextafter(threshold, np.inf))
+    fresh, _ = make_data(rng, 500, X.shape[1])
+    special = np.array([np.full(X.shape[1], np.nan), np.zeros(X.shape[1]),
+                        np.full(X.shape[1], 1e-36), np.full(X.shape[1], -0.0)])
+    return np.vstack([X, fresh, special, edge])
+
+
+def main() -> int:
+    import lightgbm
+
+    rng = np.random.default_rng(0)
+    X, y = make_data(rng, 2000)
+    failures = 0
+    for name, params in CASES.items():
+        booster = lightgbm.train({**BASE_PARAMS, **params}, lightgbm.Dataset(X, label=y),
+                                 num_boost_round=50)
+        data = probe_rows(booster, rng, X)
+        expected = booster.predict(data)
+        actual = TreePredictor(booster.model_to_string()).predict(data)
+        mismatched = int(np.sum(actual != expected))
+        diff = float(np.max(np.abs(actual - expected)))
+        if mismatched:
+            failures += 1
+            logger.error(f"❌ {name}: {mismatched}/{len(data)}行が不一致 (最大差 {diff:.3e})")
+        else:
+            logger.info(f"✅ {name}: {len(data)}行・木{booster.num_trees()}本で完全一致")
+
+    # 未対応のモデル (カテゴリ分岐) は黙って誤った値を返さず、読込時に拒否する
+    X_cat = np.column_stack([rng.integers(0, 5, 2000), X[:, 1]])
+    cat_booster = lightgbm.train({**BASE_PARAMS, "objective": "regression"},
+                                 lightgbm.Dataset(X_cat, label=X_cat[:, 0] * 3.0 + y,
+                                                  categorical_feature=[0]),
+                                 num_boost_round=5)
+    try:
+        TreePredictor(cat_booster.model_to_string())
+    except ValueError as e:
+        logger.info(f"✅ カテゴリ分岐のモデルは読込時に拒否: {e}")
+    else:
+        failures += 1
+        logger.error("❌ カテゴリ分岐のモデルを読み込めてしまいました")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+"""
+SQLite クエリ統計の日次レポート (query_metrics テーブル, src/query_log.py が記録)。
+
+日 × 呼び出し元 × SQL で合計時間の多い順に表示し、全件走査と遅いクエリを示す
+(SQL 本文は query_texts からハッシュで引く)。
+インデックス追加・書き換えの対象になる database.py のヘルパーを探す用。
+
+usage: python scripts/db_query_report.py [days] [top]
+"""
+import sys
+import pathlib
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from src.config import DB_SLOW_QUERY_MS
+from src.database import init_database, get_query_metrics_daily
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    init_database()
+    rows = get_query_metrics_daily(days)
+    if not rows:
+        print("query_metrics に記録がありません (DB_QUERY_LOG=0 で記録を止めていないか確認してください)")
+        return
+
+    by_day = {}
+    for r in rows:
+        by_day.setdefault(r["day"], []).append(r)
+
+    for day, day_rows in by_day.items():
+        total = sum(r["total_ms"] for r in day_rows)
+        print(f"\n=== {day}  合計 {total:.0f}ms / {sum(r['count'] for r in day_rows)}文 "
+              f"(遅いクエリ≥{DB_SLOW_QUERY_MS:.0f}ms: {sum(r['slow'] for r in day_rows)}件) ===")
+        print(f"{'呼び出し元':<36} {'実行':>6} {'行数':>8} {'合計ms':>9} {'平均ms':>7} "
+              f"{'p95ms':>7} {'最大ms':>7}  SQL")
+        for r in day_rows[:top]:
+            print(f"{r['call_site']:<36} {r['count']:>6} {r['rows']:>8} {r['total_ms']:>9.1f} "
+                  f"{r['total_ms'] / r['count']:>7.2f} {r['p95_ms']:>7.1f} {r['max_ms']:>7.1f}  "
+                  f"{r['sql'][:90]}")
+            if r["full_scan"]:
+                print(f"{'':<36}   ↳ 全件走査: {r['full_scan']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """
 過去データ一括取得スクリプト
 BTC/ETH/SOLの直近1ヶ月分の5分足データを取得し、SQLiteに保存する。
+ウィンドウ単位でチェックポイントするため、中断後の再実行は続きから再開する。
 """
 import sys
 import os
@@ -9,8 +10,8 @@ import logging
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.config import SYMBOLS, HISTORICAL_DAYS
-from src.data_collector import create_exchange, fetch_historical_data
-from src.database import init_database, save_prices_bulk
+from src.data_collector import create_exchange, backfill_historical_data
+from src.database import init_database
 
 logging.basicConfig(
     level=logging.INFO,
@@ -34,14 +35,9 @@ def main():
     total_records = 0
     for symbol in SYMBOLS:
         logger.info(f"\n--- {symbol} ---")
-        df = fetch_historical_data(exchange, symbol, days=HISTORICAL_DAYS, timeframe="5m")
-
-        if df is not None and not df.empty:
-            save_prices_bulk(df)
-            total_records += len(df)
-            logger.info(f"[{symbol}] {len(df)}件保存完了")
-        else:
-            logger.warning(f"[{symbol}] データ取得失敗")
+        saved = backfill_historical_data(exchange, symbol, days=HISTORICAL_DAYS, timeframe="5m")
+        total_records += saved
+        logger.info(f"[{symbol}] {saved}件保存完了")
 
     logger.info(f"\n合計 {total_records}件のデータを保存しました。")
     logger.info("完了!")
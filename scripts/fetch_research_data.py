@@ -10,19 +10,22 @@
   - funding_rates(source, symbol, timestamp, rate)
 
 冪等: 既存テーブルは作り直す（リサーチ用スナップショットであり運用DBとは分離）。
+送信は運用と同じ共有レートリミッタ (RATE_LIMITER) を経由する
+(Kraken は create_exchange / create_futures_exchange、Yahoo は yahoo_public 系統)。
 """
 import sys
-import time
 import sqlite3
 import pathlib
 import logging
 
-import ccxt
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.data_collector import RATE_LIMITER, create_exchange, create_futures_exchange
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 log = logging.getLogger("fetch_research")
 
-ROOT = pathlib.Path(__file__).resolve().parent.parent
 DB = ROOT / "data" / "research.db"
 
 DAILY_SINCE_MS = 1577836800000  # 2020-01-01T00:00:00Z
@@ -33,7 +36,8 @@ def fetch_daily_paginated(exchange, symbol, since_ms, limit=1000):
     out = []
     since = since_ms
     while True:
-        batch = exchange.fetch_ohlcv(symbol, timeframe="1d", since=since, limit=limit)
+        batch = RATE_LIMITER.call(exchange.fetch_ohlcv, symbol, timeframe="1d", since=since,
+                                  limit=limit, label=f"{symbol} 日足取得")
         if not batch:
             break
         out.extend(batch)
@@ -45,7 +49,6 @@ def fetch_daily_paginated(exchange, symbol, since_ms, limit=1000):
         since = nxt
         if since > exchange.milliseconds():
             break
-        time.sleep(exchange.rateLimit / 1000)
     # 重複除去
     seen, dedup = set(), []
     for row in out:
@@ -60,7 +63,8 @@ def fetch_funding_paginated(exchange, symbol, since_ms, limit=1000):
     since = since_ms
     while True:
         try:
-            batch = exchange.fetch_funding_rate_history(symbol, since=since, limit=limit)
+            batch = RATE_LIMITER.call(exchange.fetch_funding_rate_history, symbol, since=since,
+                                      limit=limit, label=f"{symbol} funding履歴取得")
         except Exception as e:
             log.warning(f"funding取得中断 {symbol}: {e}")
             break
@@ -73,7 +77,6 @@ def fetch_funding_paginated(exchange, symbol, since_ms, limit=1000):
         since = nxt
         if since > exchange.milliseconds():
             break
-        time.sleep(exchange.rateLimit / 1000)
     seen, dedup = set(), []
     for row in out:
         if row["timestamp"] not in seen:
@@ -101,14 +104,14 @@ def main():
 
     # ── 1. Yahoo Finance 日足 (最長10年。Binance は Actions ランナーを
     #      HTTP 451 でジオブロックするため代替。2026-07-06 変更) ──
-    import requests
     for yf_ticker, symbol in (("BTC-USD", "BTC/USD"), ("ETH-USD", "ETH/USD"), ("SOL-USD", "SOL/USD")):
         try:
-            r = requests.get(
+            r = RATE_LIMITER.call(
+                RATE_LIMITER.http_get, "yahoo_public",
                 f"https://query1.finance.yahoo.com/v8/finance/chart/{yf_ticker}",
                 params={"range": "10y", "interval": "1d"},
-                headers={"User-Agent": "Mozilla/5.0"}, timeout=30)
-            r.raise_for_status()
+                headers={"User-Agent": "Mozilla/5.0"}, timeout=30,
+                label=f"Yahoo日足取得 ({yf_ticker})")
             res = r.json()["chart"]["result"][0]
             ts = res["timestamp"]
             q = res["indicators"]["quote"][0]
@@ -121,28 +124,27 @@ def main():
                 "INSERT OR REPLACE INTO daily_prices VALUES ('yahoo', ?, ?, ?, ?, ?, ?, ?)", rows)
             conn.commit()
             log.info(f"yahoo {symbol}: {len(rows)}日分 ({rows[0][1]}〜{rows[-1][1]})")
-            time.sleep(1)
         except Exception as e:
             log.error(f"Yahoo日足の取得に失敗 ({yf_ticker}): {e}")
 
     # ── 2. Kraken 日足 (約720日・クロスチェック用) ──
     try:
-        kraken = ccxt.kraken({"enableRateLimit": True})
+        kraken = create_exchange()
         for symbol in ("BTC/USD", "ETH/USD", "SOL/USD"):
-            rows = kraken.fetch_ohlcv(symbol, timeframe="1d", limit=720)
+            rows = RATE_LIMITER.call(kraken.fetch_ohlcv, symbol, timeframe="1d", limit=720,
+                                     label=f"kraken {symbol} 日足取得")
             conn.executemany(
                 "INSERT OR REPLACE INTO daily_prices VALUES ('kraken', ?, ?, ?, ?, ?, ?, ?)",
                 [(symbol, to_date(r[0]), r[1], r[2], r[3], r[4], r[5]) for r in rows])
             conn.commit()
             log.info(f"kraken {symbol}: {len(rows)}日分")
-            time.sleep(1)
     except Exception as e:
         log.error(f"Kraken日足の取得に失敗: {e}")
 
     # ── 3. Kraken Futures funding rate 履歴 (キャリー検証用。
     #      Binance はジオブロックのため Kraken に変更。2026-07-06) ──
     try:
-        kf = ccxt.krakenfutures({"enableRateLimit": True})
+        kf = create_futures_exchange()
         for symbol in ("BTC/USD:USD", "ETH/USD:USD", "SOL/USD:USD"):
             rows = fetch_funding_paginated(kf, symbol, DAILY_SINCE_MS)
             conn.executemany(
@@ -150,7 +152,6 @@ def main():
                 [(symbol, to_iso(r["timestamp"]), float(r["fundingRate"] or 0)) for r in rows])
             conn.commit()
             log.info(f"funding {symbol}: {len(rows)}件")
-            time.sleep(1)
     except Exception as e:
         log.error(f"Funding履歴の取得に失敗: {e}")
 
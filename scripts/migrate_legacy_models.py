@@ -0,0 +1,90 @@
+"""
+版管理導入前の Bot #09 モデル (models/ml_gate_<銘柄>_<足>.pkl, pickle した Booster) を
+レジストリ形式 (src/model_registry.py) に変換して公開する一度きりの移行スクリプト。
+
+pickle の本体・学習パラメータをレジストリに残し、版管理後の形式で扱えるようにする。
+
+- 読むのはリポジトリにコミットされていた自前のモデルのみ (pickle はコードを実行しうる)
+- 旧モデルは特徴量セット v1 (obv_slope の正規化が現在と異なる) で学習したもの。
+  feature_set_version=1 (スキーマも v1 のハッシュ) として公開するため、現在の v2 の特徴量での
+  推論には使われず、retrain_due() が次の再学習ジョブでフル再学習の対象にする
+- 既に公開中の版がある銘柄は変換しない。公開時に NumPy 推論器との一致を確認する
+
+usage: python scripts/migrate_legacy_models.py [--from 旧モデルのディレクトリ]
+"""
+import sys
+import pickle
+import logging
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import BOT_CONFIGS
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+BOT_NAME = "09_ml_gate"
+LEGACY_FEATURE_SET_VERSION = 1
+
+
+def check_data(booster, rows: int = 256) -> pd.DataFrame:
+    """一致確認用の入力: 学習時の特徴量の範囲 (feature_infos) 内の乱数 + 欠損値の行。"""
+    from src.bots.bot_09_ml_gate import FEATURE_COLUMNS
+    rng = np.random.default_rng(0)
+    infos = booster.dump_model()["feature_infos"]
+    cols = {}
+    for name in FEATURE_COLUMNS:
+        lo, hi = infos.get(name, {}).get("min_value", -1.0), infos.get(name, {}).get("max_value", 1.0)
+        values = rng.uniform(lo, hi, rows)
+        values[rng.random(rows) < 0.05] = np.nan
+        cols[name] = values
+    return pd.DataFrame(cols)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot #09 の旧形式モデルをレジストリへ移行")
+    parser.add_argument("--from", dest="src", default=None,
+                        help="旧モデル (*.pkl) のディレクトリ (既定は bot 設定の model_dir)")
+    args = parser.parse_args()
+
+    from src.bots.bot_09_ml_gate import BotMLGate, FEATURE_COLUMNS, _lightgbm
+    if _lightgbm() is None:
+        return
+
+    bot = BotMLGate(BOT_CONFIGS[BOT_NAME])
+    src_dir = Path(args.src) if args.src else bot.model_dir
+    for symbol in bot.symbols:
+        stem = bot._model_stem(symbol)
+        legacy = src_dir / f"{stem}.pkl"
+        if bot._read_manifest(symbol) is not None:
+            logger.info(f"[{symbol}] 公開中の版があるため移行しません")
+            continue
+        if not legacy.exists():
+            logger.warning(f"[{symbol}] 旧形式のモデルがありません: {legacy}")
+            continue
+        with open(legacy, "rb") as f:
+            booster = pickle.load(f)
+        if tuple(booster.feature_name()) != FEATURE_COLUMNS:
+            logger.warning(f"[{symbol}] 特徴量の並びが現在と異なるため移行しません: {booster.feature_name()}")
+            continue
+        version = bot.publish(symbol, booster, {
+            "mode": "migrated",
+            "migrated_from": legacy.name,
+            "feature_set_version": LEGACY_FEATURE_SET_VERSION,
+            "num_trees": booster.num_trees(),
+            "lgb_params": getattr(booster, "params", None),
+        }, check_data=check_data(booster))
+        logger.info(f"✅ [{symbol}] {legacy.name} → 版 {version} (木={booster.num_trees()})")
+
+
+if __name__ == "__main__":
+    main()
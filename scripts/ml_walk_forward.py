@@ -0,0 +1,75 @@
+"""
+Bot #09 (ML ゲート) のウォークフォワード評価 (src/walk_forward.py)。
+DB の価格履歴全期間で、本番と同じ再学習周期ごとに学習し直したときの OOS 予測を作り、
+予測精度を表示して予測系列を ML_WALK_FORWARD_DIR に CSV で保存する。
+保存した予測系列は scripts/backtest_restructure.py が bot #09 のシグナルとして使う。
+
+fold の学習は ML_WALK_FORWARD_WORKERS (0 = CPU コア数) のプロセスで並列に行う。
+
+usage: python scripts/ml_walk_forward.py [--symbols BTC/USD,ETH/USD] [--workers N] [--limit 5分足行数]
+"""
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import BOT_CONFIGS
+from src.profiling import profile_run
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+BOT_NAME = "09_ml_gate"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot #09 のウォークフォワード評価")
+    parser.add_argument("--symbols", default=None, help="対象銘柄 (カンマ区切り, 既定はbot設定の全銘柄)")
+    parser.add_argument("--workers", type=int, default=None, help="並列プロセス数 (既定は設定値)")
+    parser.add_argument("--limit", type=int, default=10_000_000,
+                        help="DB から読む直近の5分足行数 (既定は全期間)")
+    args = parser.parse_args()
+
+    from src.bots.bot_09_ml_gate import BotMLGate, _lightgbm
+    from src.walk_forward import walk_forward, evaluate, save_predictions, resolve_workers
+    if _lightgbm() is None:
+        return
+
+    bot = BotMLGate(BOT_CONFIGS[BOT_NAME])
+    symbols = args.symbols.split(",") if args.symbols else bot.symbols
+    print(f"=== Bot #09 ウォークフォワード (再学習 {bot.params['retrain_interval_hours']}時間ごと, "
+          f"並列 {resolve_workers(args.workers)}) ===")
+    print(f"{'銘柄':<10}{'fold':>6}{'予測本数':>10}{'MSE':>12}{'的中率':>8}{'IC':>8}"
+          f"{'ロング率':>9}{'秒':>7}")
+    for symbol in symbols:
+        df = bot._load_training_df(symbol, args.limit)
+        if df is None:
+            print(f"{symbol:<10} 価格データなし")
+            continue
+        t0 = time.monotonic()
+        predictions = walk_forward(bot, df, workers=args.workers)
+        elapsed = time.monotonic() - t0
+        if predictions.empty:
+            print(f"{symbol:<10} 学習データ不足 ({len(df)}本 < {bot.params['min_train_samples']}本)")
+            continue
+        m = evaluate(predictions)
+        path = save_predictions(predictions, symbol)
+        if m["mse"] is None:
+            print(f"{symbol:<10}{len(predictions.attrs['folds']):>6}{len(predictions):>10}  (評価可能な足なし)")
+        else:
+            print(f"{symbol:<10}{len(predictions.attrs['folds']):>6}{len(predictions):>10}"
+                  f"{m['mse']:>12.3e}{m['hit_rate']:>8.1%}{m['ic']:>8.3f}{m['long_ratio']:>9.1%}"
+                  f"{elapsed:>7.1f}")
+        logger.info(f"予測系列を保存: {path}")
+
+
+if __name__ == "__main__":
+    # PROFILE=cpu,mem 等でプロファイル出力 (src/profiling.py)
+    with profile_run("ml_walk_forward"):
+        main()
@@ -0,0 +1,246 @@
+"""
+ローカルのモック取引所サーバ (Kraken 現物 + Futures 公開APIの互換サブセット)。
+価格は src/synthetic_market.py の合成マーケットが生成する。
+
+data_collector が使うエンドポイントのみ実装:
+  現物   /0/public/Assets, /0/public/AssetPairs, /0/public/Ticker, /0/public/OHLC
+  先物   /derivatives/api/v3/instruments, /derivatives/api/v3/tickers (funding/OI)
+
+usage:
+  python scripts/mock_exchange_server.py [--port 8765] [--symbols 300] [--scenario gbm|regime|gap] [--seed 42]
+
+起動時に表示される環境変数を設定して run_bots.py を実行すると、本番の代わりにこのサーバへ接続する:
+  EXCHANGE_API_URL=http://127.0.0.1:8765 FUTURES_API_URL=http://127.0.0.1:8765 \\
+  SYMBOLS=... BOT_SYMBOLS=all RATE_LIMIT_SCALE=100 python scripts/run_bots.py
+"""
+import sys
+import json
+import time
+import pathlib
+import argparse
+import logging
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from src.synthetic_market import SyntheticMarket, SCENARIOS, synthetic_symbols
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger("mock_exchange")
+
+# Kraken の資産ID (レガシーな X/Z 接頭辞付き)。未登録はそのまま
+_ASSET_IDS = {"BTC": "XXBT", "ETH": "XETH", "USD": "ZUSD", "JPY": "ZJPY"}
+# Kraken Futures の銘柄名 (BTC は XBT 表記)
+_FUTURES_BASES = {"BTC": "XBT"}
+
+
+def _asset_id(code: str) -> str:
+    return _ASSET_IDS.get(code, code)
+
+
+def _pair_id(symbol: str) -> str:
+    base, quote = symbol.split("/")
+    return _asset_id(base) + _asset_id(quote)
+
+
+def _perp_id(symbol: str) -> str:
+    base = symbol.split("/")[0]
+    return f"PF_{_FUTURES_BASES.get(base, base)}USD"
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class MockKraken:
+    """合成マーケットを Kraken 形式のレスポンスに変換する。"""
+
+    def __init__(self, market: SyntheticMarket):
+        self.market = market
+        self.spot_symbols = market.symbols + ["USD/JPY"]
+        self.by_pair_id = {_pair_id(s): s for s in self.spot_symbols}
+        self.by_altname = {_pair_id(s).replace("XXBT", "XBT").replace("XETH", "ETH")
+                           .replace("ZUSD", "USD").replace("ZJPY", "JPY"): s
+                           for s in self.spot_symbols}
+        self.by_perp_id = {_perp_id(s): s for s in market.symbols}
+
+    def _resolve_pair(self, pair: str):
+        return self.by_pair_id.get(pair) or self.by_altname.get(pair)
+
+    # ── 現物 ──
+
+    def assets(self, query):
+        codes = {c for s in self.spot_symbols for c in s.split("/")}
+        return {"error": [], "result": {
+            _asset_id(c): {
+                "aclass": "currency",
+                "altname": {"BTC": "XBT"}.get(c, c),
+                "decimals": 10, "display_decimals": 5, "status": "enabled",
+            } for c in sorted(codes)
+        }}
+
+    def asset_pairs(self, query):
+        result = {}
+        for symbol in self.spot_symbols:
+            base, quote = symbol.split("/")
+            pid = _pair_id(symbol)
+            altname = next(a for a, s in self.by_altname.items() if s == symbol)
+            result[pid] = {
+                "altname": altname,
+                "wsname": f"{base}/{quote}",
+                "aclass_base": "currency", "base": _asset_id(base),
+                "aclass_quote": "currency", "quote": _asset_id(quote),
+                "lot": "unit", "cost_decimals": 5, "pair_decimals": 5, "lot_decimals": 8,
+                "lot_multiplier": 1, "leverage_buy": [], "leverage_sell": [],
+                "fees": [[0, 0.26]], "fees_maker": [[0, 0.16]],
+                "fee_volume_currency": "ZUSD", "margin_call": 80, "margin_stop": 40,
+                "ordermin": "0.0001", "costmin": "0.5", "tick_size": "0.00001",
+                "status": "online",
+            }
+        return {"error": [], "result": result}
+
+    def ticker(self, query):
+        result = {}
+        now = _now_ms()
+        for pair in ",".join(query.get("pair", [])).split(","):
+            symbol = self._resolve_pair(pair)
+            if symbol is None:
+                return {"error": [f"EQuery:Unknown asset pair"]}
+            t = self.market.ticker(symbol, now)
+            result[_pair_id(symbol)] = {
+                "a": [f"{t['ask']:.8f}", "1", "1.000"],
+                "b": [f"{t['bid']:.8f}", "1", "1.000"],
+                "c": [f"{t['last']:.8f}", "0.01"],
+                "v": [f"{t['volume'] / 2:.8f}", f"{t['volume']:.8f}"],
+                "p": [f"{t['vwap']:.8f}", f"{t['vwap']:.8f}"],
+                "t": [1000, 2000],
+                "l": [f"{t['low']:.8f}", f"{t['low']:.8f}"],
+                "h": [f"{t['high']:.8f}", f"{t['high']:.8f}"],
+                "o": f"{t['open']:.8f}",
+            }
+        return {"error": [], "result": result}
+
+    def ohlc(self, query):
+        pair = query.get("pair", [""])[0]
+        symbol = self._resolve_pair(pair)
+        if symbol is None:
+            return {"error": ["EQuery:Unknown asset pair"]}
+        interval = int(query.get("interval", ["1"])[0])
+        since = query.get("since", [None])[0]
+        since_ms = int(float(since) * 1000) if since else None
+        try:
+            rows = self.market.ohlcv(symbol, interval, _now_ms(), since_ms=since_ms)
+        except ValueError as e:
+            return {"error": [f"EGeneral:Invalid arguments:{e}"]}
+        data = [
+            [ts // 1000, f"{o:.8f}", f"{h:.8f}", f"{l:.8f}", f"{c:.8f}",
+             f"{(h + l + c) / 3:.8f}", f"{v:.8f}", 10]
+            for ts, o, h, l, c, v in rows
+        ]
+        last = data[-1][0] if data else 0
+        return {"error": [], "result": {_pair_id(symbol): data, "last": last}}
+
+    # ── 先物 ──
+
+    def instruments(self, query):
+        return {"result": "success", "instruments": [
+            {
+                "symbol": perp_id, "type": "flexible_futures", "tradeable": True,
+                "tickSize": 0.5, "contractSize": 1, "contractValueTradePrecision": 4,
+                "openingDate": "2022-01-01T00:00:00.000Z", "tags": [],
+            } for perp_id in self.by_perp_id
+        ], "serverTime": datetime.now(timezone.utc).isoformat()}
+
+    def futures_tickers(self, query):
+        now = _now_ms()
+        iso = datetime.fromtimestamp(now / 1000, tz=timezone.utc).isoformat()
+        tickers = []
+        for perp_id, symbol in self.by_perp_id.items():
+            d = self.market.derivatives(symbol, now)
+            tickers.append({
+                "symbol": perp_id, "tag": "perpetual", "pair": f"{perp_id[3:-3]}:USD",
+                "markPrice": d["mark_price"], "indexPrice": d["mark_price"],
+                "last": d["mark_price"], "lastTime": iso,
+                "fundingRate": d["funding_rate"] * d["mark_price"],
+                "fundingRatePrediction": d["funding_rate"] * d["mark_price"],
+                "openInterest": d["open_interest"],
+                "suspended": False, "postOnly": False,
+            })
+        return {"result": "success", "tickers": tickers, "serverTime": iso}
+
+
+ROUTES = {
+    "/0/public/Assets": MockKraken.assets,
+    "/0/public/AssetPairs": MockKraken.asset_pairs,
+    "/0/public/Ticker": MockKraken.ticker,
+    "/0/public/OHLC": MockKraken.ohlc,
+    "/derivatives/api/v3/instruments": MockKraken.instruments,
+    "/derivatives/api/v3/tickers": MockKraken.futures_tickers,
+}
+
+
+def make_handler(mock: MockKraken):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            route = ROUTES.get(parts.path.rstrip("/"))
+            if route is None:
+                self._send(404, {"error": [f"EGeneral:Unknown method {parts.path}"]})
+                return
+            try:
+                self._send(200, route(mock, parse_qs(parts.query)))
+            except Exception as e:
+                logger.exception(f"{parts.path} の処理に失敗")
+                self._send(500, {"error": [f"EService:Internal error: {e}"]})
+
+        def _send(self, status, payload):
+            body = json.dumps(payload, separators=(",", ":")).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            logger.debug(fmt % args)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kraken互換モック取引所サーバ")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--symbols", type=int, default=3, help="銘柄数 (BTC/ETH/SOL + 合成銘柄)")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="gbm")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--history-days", type=int, default=60)
+    args = parser.parse_args()
+
+    symbols = synthetic_symbols(args.symbols)
+    market = SyntheticMarket(symbols, scenario=args.scenario, seed=args.seed,
+                             history_days=args.history_days)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(MockKraken(market)))
+    url = f"http://{args.host}:{args.port}"
+    logger.info(f"モック取引所を起動: {url} (銘柄数={len(symbols)}, シナリオ={args.scenario})")
+    logger.info("接続用の環境変数:")
+    print(f"export EXCHANGE_API_URL={url} FUTURES_API_URL={url}")
+    print(f"export SYMBOLS={','.join(symbols)}")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Bot #09 (ML ゲート) の再学習ジョブ。
+売買の実行とは別プロセスで、再学習期限を過ぎた (またはモデル未作成の) 銘柄を学習し、
+版付きモデル + マニフェストとして公開する (src/bots/bot_09_ml_gate.py の publish)。
+売買側は公開済みの最新版で推論するだけで、学習の完了を待たない。
+
+- GitHub Actions: .github/workflows/ml_retrain.yml が定期実行してモデルをコミットする
+- 常駐モード: 任意タスク ml_retrain がこのスクリプトをバックグラウンドで起動する
+- 同時に1つだけ動くよう models/ にロックファイルを置く (古いロックは異常終了の残骸として奪う)
+
+usage: python scripts/retrain_ml.py [--force] [--symbols BTC/USD,ETH/USD] [--deadline 秒]
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import BOT_CONFIGS, ML_RETRAIN_LOCK_STALE_SECONDS
+from src.database import init_database
+from src.profiling import profile_run
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+BOT_NAME = "09_ml_gate"
+
+
+def acquire_lock(path: Path) -> bool:
+    """ロックファイルを排他作成する。既存のロックが古ければ削除して取り直す。"""
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                age = time.time() - path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if age < ML_RETRAIN_LOCK_STALE_SECONDS:
+                return False
+            logger.warning(f"古い再学習ロックを削除します ({age:.0f}秒前): {path}")
+            path.unlink(missing_ok=True)
+            continue
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot #09 のモデル再学習・公開")
+    parser.add_argument("--force", action="store_true", help="期限前の銘柄も学習する")
+    parser.add_argument("--symbols", default=None, help="対象銘柄 (カンマ区切り, 既定はbot設定の全銘柄)")
+    parser.add_argument("--deadline", type=float, default=None,
+                        help="この秒数を過ぎたら残りの銘柄は次回に持ち越す")
+    args = parser.parse_args()
+    started = time.monotonic()
+
+    from src.bots.bot_09_ml_gate import BotMLGate, _lightgbm
+    if _lightgbm() is None:
+        return
+
+    init_database()
+    bot = BotMLGate(BOT_CONFIGS[BOT_NAME])
+    lock = bot.model_dir / "ml_gate.retrain.lock"
+    if not acquire_lock(lock):
+        logger.info("別の再学習ジョブが実行中のため終了します")
+        return
+    try:
+        symbols = args.symbols.split(",") if args.symbols else bot.symbols
+        targets = symbols if args.force else [s for s in bot.retrain_due() if s in symbols]
+        if not targets:
+            logger.info("再学習が必要な銘柄はありません")
+            return
+        for symbol in targets:
+            if args.deadline is not None and time.monotonic() - started > args.deadline:
+                logger.info(f"⏭ [{symbol}] 締切を過ぎたため次回に持ち越し")
+                break
+            t0 = time.monotonic()
+            ok = bot.retrain(symbol)
+            logger.info(f"{'✅' if ok else '⚠️'} [{symbol}] 再学習 "
+                        f"{'公開: ' + str(bot.model_versions.get(symbol)) if ok else '失敗'} "
+                        f"({time.monotonic() - t0:.1f}秒)")
+    finally:
+        lock.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    # PROFILE=cpu,mem 等でプロファイル出力 (src/profiling.py)
+    with profile_run("retrain_ml"):
+        main()
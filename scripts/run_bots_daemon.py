@@ -0,0 +1,281 @@
+"""
+仮想通貨自動売買Bot - 常駐実行スクリプト
+scripts/run_bots.py (GitHub Actions 用の単発実行) と同じ1サイクルを、
+プロセスを落とさずに足確定時刻 (DAEMON_TIMEFRAME) ごとに繰り返す。
+
+単発実行との違い:
+  - 取引所クライアント・botインスタンス (学習済みモデル込み)・OHLCVバーを
+    サイクル間でメモリに保持し、2回目以降のOHLCVは差分のみ取得する
+  - 処理済みの足を DAEMON_STATE_PATH に記録し、再起動時は同じ足を二重実行しない
+  - SIGTERM / SIGINT: 実行中のサイクルを終えてから状態を保存して終了
+  - SIGHUP または DAEMON_OVERRIDES_PATH の更新: bot設定を再読込し、
+    設定が変わったbotだけ作り直す (他botのモデル・内部状態は維持)
+  - 任意タスクは次の足確定までの残り時間で実行する (src/scheduler.py)。ML再学習は
+    別プロセス (scripts/retrain_ml.py) をバックグラウンドで起動し、公開された新しい版を
+    bot #09 が次の推論で読み替える
+
+使い方:
+  python scripts/run_bots_daemon.py
+  python scripts/run_bots_daemon.py --timeframe 5m --max-cycles 3
+"""
+import sys
+import time
+import json
+import signal
+import logging
+import argparse
+import threading
+import traceback
+from datetime import datetime, timezone
+
+import ccxt
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(__import__("pathlib").Path(__file__).resolve().parent.parent))
+
+from src.config import (
+    BOT_NAMES, CACHE_DIR,
+    DAEMON_TIMEFRAME, DAEMON_GRACE_SECONDS, DAEMON_STATE_PATH, DAEMON_OVERRIDES_PATH,
+)
+from src.database import init_database
+from src.data_collector import create_exchange, BarCache
+from src.bot_runner import build_bots, merge_bot_config, schedule_cycle, report_run_metrics
+from src.scheduler import RunScheduler
+from src.checkpoint import RunCheckpoint
+from src.metrics import METRICS, API_STATS
+from src.query_log import QUERY_STATS
+from src.metrics_exporter import write_textfile
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+BAR_CACHE_PATH = CACHE_DIR / "daemon_bars.pkl"
+
+
+def bar_start(now: datetime, timeframe_sec: int) -> datetime:
+    """now を含む足の開始時刻 (UTC, エポック基準で整列)。"""
+    ts = int(now.timestamp()) // timeframe_sec * timeframe_sec
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+def _write_json_atomic(path, data: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2))
+    tmp.replace(path)
+
+
+def load_state(path=DAEMON_STATE_PATH) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"状態ファイル読込失敗 (初期状態で起動します): {e}")
+        return {}
+
+
+class BotDaemon:
+    """足確定ごとに run_cycle を回す常駐ループ。"""
+
+    def __init__(self, timeframe: str = DAEMON_TIMEFRAME, grace: float = DAEMON_GRACE_SECONDS,
+                 state_path=DAEMON_STATE_PATH, overrides_path=DAEMON_OVERRIDES_PATH):
+        self.timeframe = timeframe
+        self.timeframe_sec = ccxt.Exchange.parse_timeframe(timeframe)
+        self.grace = grace
+        self.state_path = state_path
+        self.overrides_path = overrides_path
+
+        self.stop_event = threading.Event()
+        self.reload_requested = False
+        self.state = load_state(state_path)
+
+        self.exchange = None
+        self.bar_cache = BarCache()
+        self.bots = {}
+        self.init_errors = {}
+        self.bot_configs = {}  # {bot_name: 生成時のマージ済み設定} 差分再生成の判定用
+        self._overrides_mtime = None
+
+    # ── シグナル ──
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._on_reload)
+
+    def _on_stop(self, signum, frame):
+        logger.info(f"🛑 停止要求を受信 (signal={signum})。実行中のサイクル完了後に終了します。")
+        self.stop_event.set()
+
+    def _on_reload(self, signum, frame):
+        logger.info("🔄 設定再読込要求を受信 (SIGHUP)")
+        self.reload_requested = True
+
+    # ── 設定 ──
+
+    def _read_overrides(self) -> dict:
+        try:
+            return json.loads(self.overrides_path.read_text())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error(f"上書き設定の読込失敗 (現行設定を維持します): {e}")
+            return None
+
+    def _overrides_changed(self) -> bool:
+        try:
+            mtime = self.overrides_path.stat().st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._overrides_mtime:
+            self._overrides_mtime = mtime
+            return True
+        return False
+
+    def reload_bots(self):
+        """上書き設定を読み、設定が変わったbotだけ作り直す。"""
+        overrides = self._read_overrides()
+        if overrides is None:
+            return
+        disabled = set(overrides.get("disabled", []))
+        bot_overrides = overrides.get("bots", {})
+
+        rebuilt, removed = [], []
+        for bot_name in BOT_NAMES:
+            if bot_name in disabled:
+                if self.bots.pop(bot_name, None) is not None:
+                    removed.append(bot_name)
+                self.init_errors.pop(bot_name, None)
+                self.bot_configs.pop(bot_name, None)
+                continue
+            config = merge_bot_config(bot_name, bot_overrides)
+            if bot_name in self.bots and self.bot_configs.get(bot_name) == config:
+                continue
+            bots, errors = build_bots([bot_name], bot_overrides)
+            self.bots.pop(bot_name, None)
+            self.init_errors.pop(bot_name, None)
+            self.bots.update(bots)
+            self.init_errors.update(errors)
+            self.bot_configs[bot_name] = config
+            rebuilt.append(bot_name)
+
+        # 実行順は常に BOT_NAMES 順 (単一ライターの書き込み順を単発実行と揃える)
+        self.bots = {name: self.bots[name] for name in BOT_NAMES if name in self.bots}
+        if rebuilt or removed:
+            logger.info(f"⚙️ bot設定を反映: 生成={rebuilt or 'なし'}, 停止={removed or 'なし'}")
+
+    # ── 状態 ──
+
+    def checkpoint(self):
+        """処理済みの足とバーキャッシュを保存する。"""
+        _write_json_atomic(self.state_path, self.state)
+        try:
+            self.bar_cache.save(BAR_CACHE_PATH)
+        except Exception as e:
+            logger.warning(f"バーキャッシュ保存失敗: {e}")
+
+    # ── ループ ──
+
+    def run_once(self, bar: datetime):
+        started = datetime.now(timezone.utc)
+        run_start = time.perf_counter()
+        METRICS.reset()  # 計測はサイクル単位
+        API_STATS.reset()
+        QUERY_STATS.reset()
+        logger.info("=" * 60)
+        logger.info(f"⏱ サイクル開始 (足: {bar.isoformat()}, bot数: {len(self.bots)})")
+        # 締切 = 次の足確定 + 猶予 (次サイクルの売買を遅らせない)
+        deadline = bar.timestamp() + self.timeframe_sec + self.grace - started.timestamp()
+        scheduler = RunScheduler(deadline)
+        run_id = bar.isoformat()  # 単発実行 (slot_run_id) と同じ形式。再起動時は続きから再開
+        checkpoint = RunCheckpoint(run_id)
+        schedule_cycle(scheduler, self.exchange, self.bots, self.init_errors, self.bar_cache,
+                       checkpoint=checkpoint)
+        try:
+            results = scheduler.run()["trading"].get("result")
+        except Exception as e:
+            logger.error(f"サイクル実行エラー: {e}")
+            logger.debug(traceback.format_exc())
+            results = None
+        if checkpoint.replayed:
+            # 完了済みの足 (再起動直後など): 計測・メトリクスは最初の実行のものを残す
+            logger.info("完了済みの実行のため、計測の保存とメトリクス出力を省略します")
+        else:
+            METRICS.record("run.total", time.perf_counter() - run_start)
+            report_run_metrics(run_id)
+            write_textfile(results)
+
+        if results is None:
+            # データ取得失敗: 足を処理済みにしない (次の待機明けに再試行)
+            logger.error("市場データを取得できなかったため、このサイクルをスキップします。")
+            return False
+
+        self.state.update({
+            "last_bar": bar.isoformat(),
+            "last_run_at": started.isoformat(),
+            "cycles": self.state.get("cycles", 0) + 1,
+            "errors": sorted(n for n, r in results.items() if r["status"] != "OK"),
+        })
+        self.checkpoint()
+        return True
+
+    def _wait_until(self, target: datetime):
+        seconds = (target - datetime.now(timezone.utc)).total_seconds()
+        if seconds > 0:
+            logger.info(f"💤 次回実行: {target.isoformat()} ({seconds:.0f}秒後)")
+            self.stop_event.wait(seconds)
+
+    def run(self, max_cycles: int = None):
+        init_database()
+        self.exchange = create_exchange()
+        if self.bar_cache.load(BAR_CACHE_PATH):
+            logger.info("バーキャッシュを復元しました")
+        self._overrides_changed()
+        self.reload_bots()
+
+        logger.info(f"常駐モード開始 (足: {self.timeframe}, 猶予: {self.grace:.0f}秒, "
+                    f"前回処理済み: {self.state.get('last_bar', 'なし')})")
+        cycles = 0
+        while not self.stop_event.is_set():
+            if self.reload_requested or self._overrides_changed():
+                self.reload_requested = False
+                self.reload_bots()
+
+            bar = bar_start(datetime.now(timezone.utc), self.timeframe_sec)
+            if self.state.get("last_bar") == bar.isoformat():
+                # この足は処理済み → 次の足確定 + 猶予まで待つ
+                next_bar = datetime.fromtimestamp(
+                    bar.timestamp() + self.timeframe_sec + self.grace, tz=timezone.utc)
+                self._wait_until(next_bar)
+                continue
+
+            ok = self.run_once(bar)
+            cycles += 1
+            if max_cycles is not None and cycles >= max_cycles:
+                break
+            if not ok:
+                self.stop_event.wait(min(60.0, self.timeframe_sec / 4))
+
+        self.checkpoint()
+        logger.info("常駐モードを終了しました")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot常駐実行 (足確定ごとにサイクル実行)")
+    parser.add_argument("--timeframe", default=DAEMON_TIMEFRAME, help="実行間隔の足 (例: 5m, 15m, 1h)")
+    parser.add_argument("--grace", type=float, default=DAEMON_GRACE_SECONDS, help="足確定後の待機秒数")
+    parser.add_argument("--max-cycles", type=int, default=None, help="指定回数で終了 (検証用)")
+    args = parser.parse_args()
+
+    daemon = BotDaemon(timeframe=args.timeframe, grace=args.grace)
+    daemon.install_signal_handlers()
+    daemon.run(max_cycles=args.max_cycles)
+
+
+if __name__ == "__main__":
+    main()
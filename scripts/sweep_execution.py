@@ -0,0 +1,209 @@
+"""
+約定規則のパラメータ研究: POSITION_CHANGE_THRESHOLD × MIN_HOLD_MINUTES (src/execution_kernel.py)。
+
+DB の価格履歴 (1時間足) で各botの足ごとの target_position を作り、閾値 × 最低保有期間の
+全組み合わせ・全botを1回の一括シミュレーションで評価する。
+約定規則は本番の Simulator と同じ (bot ごとに INITIAL_BALANCE の1口座で全銘柄を運用、
+下落レジーム退避・コスト・サーキットブレーカー込み)。
+
+- 対象は scripts/backtest_restructure.py と同じ 01-06 と、予測系列があれば 09
+- target は bot 実装の compute_signal を足ごとに呼んで作る (ロジックの再実装はしない)。
+  01-06 の target は EXECUTION_TARGETS_PATH に保存し、次回は新しい足の分だけ計算する
+  (足の target はその足までの価格だけで決まるため)。bot 設定のハッシュが変わった場合は使わず、
+  未確定の可能性がある各銘柄の最後の1時間足以降は保存しない。09 は予測系列から毎回作る
+- レジーム判定は全期間の1時間足で行い、評価期間 (直近 days 日) の口座は評価開始時点から始める
+
+usage: python scripts/sweep_execution.py [days] [--thresholds 0.05,0.1,0.2,0.3]
+                                         [--holds 0,60,240,480] [--rebuild] [--top 10]
+"""
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import (
+    BOT_CONFIGS, INITIAL_BALANCE, POSITION_CHANGE_THRESHOLD, MIN_HOLD_MINUTES,
+    REGIME_SMA_PERIOD, EXECUTION_TARGETS_PATH,
+)
+from src.profiling import profile_run
+from src.execution_kernel import prepare_targets, sweep
+from src.walk_forward import PredictionSignals, load_predictions
+from backtest_restructure import BOTS, WINDOW, load_prices, to_hourly
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+SYMBOLS = ("BTC/USD", "ETH/USD", "SOL/USD")
+
+
+def signal_targets(bot, df: pd.DataFrame, symbol: str, rows) -> dict:
+    """df の行番号 rows の足での target_position (backtest_restructure.replay と同じ窓)。"""
+    out = {}
+    for i in rows:
+        if i + 1 < 60:
+            continue
+        window = df.iloc[max(0, i - WINDOW + 1): i + 1].reset_index(drop=True)
+        try:
+            sig = bot.compute_signal(window, symbol)
+        except Exception:
+            continue
+        out[i] = float(sig.get("target_position", 0.0) or 0.0)
+    return out
+
+
+def build_targets(factories: dict, hourly: dict, index: pd.DatetimeIndex,
+                  cached: np.ndarray = None, cached_index: pd.DatetimeIndex = None) -> np.ndarray:
+    """
+    (足, bot, 銘柄) の target_position。対象外の銘柄・シグナルの無い足は NaN。
+    cached があれば、cached_index に含まれる足はそこから写し、新しい足だけ計算する。
+    """
+    targets = np.full((len(index), len(factories), len(SYMBOLS)), np.nan)
+    known = np.zeros(len(index), dtype=bool)
+    if cached is not None:
+        pos = cached_index.get_indexer(index)
+        known = pos >= 0
+        targets[known] = cached[pos[known]]
+    for b, (name, factory) in enumerate(factories.items()):
+        for s, symbol in enumerate(SYMBOLS):
+            if symbol not in BOT_CONFIGS[name]["symbols"]:
+                continue
+            df = hourly[symbol]
+            at = index.get_indexer(df["timestamp"])
+            rows = [i for i in range(len(df)) if not known[at[i]]]
+            if not rows:
+                continue
+            t0 = time.monotonic()
+            for i, target in signal_targets(factory(), df, symbol, rows).items():
+                targets[at[i], b, s] = target
+            logger.info(f"[{name}][{symbol}] target 計算: {len(rows)}本 ({time.monotonic() - t0:.1f}秒)")
+    return targets
+
+
+def config_hashes(names: list) -> list:
+    """bot ごとの設定 (と compute_signal に渡す窓の長さ) のハッシュ。変われば target を計算し直す。"""
+    return [hashlib.sha256(json.dumps([BOT_CONFIGS[name], WINDOW], sort_keys=True, default=str)
+                           .encode()).hexdigest()[:16] for name in names]
+
+
+def closed_until(hourly: dict) -> pd.Timestamp:
+    """保存してよい足の上限 (この時刻より前)。各銘柄の最後の足は未確定の場合があるため含めない。"""
+    return min(df["timestamp"].iloc[-1] for df in hourly.values() if len(df))
+
+
+def load_cached_targets(names: list):
+    """保存済みの 01-06 の target (bot 構成・設定が同じときだけ)。"""
+    try:
+        with np.load(EXECUTION_TARGETS_PATH) as z:
+            if list(z["bots"]) != names or list(z["symbols"]) != list(SYMBOLS) \
+                    or "configs" not in z.files or list(z["configs"]) != config_hashes(names):
+                return None, None
+            return z["targets"], pd.DatetimeIndex(z["timestamps"], tz="UTC")
+    except FileNotFoundError:
+        return None, None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"保存済み target の読込失敗: {e}")
+        return None, None
+
+
+def save_cached_targets(names: list, targets: np.ndarray, index: pd.DatetimeIndex, until: pd.Timestamp):
+    """until より前の足 (確定済み) の target を保存する。"""
+    keep = index < until
+    EXECUTION_TARGETS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = EXECUTION_TARGETS_PATH.with_name("tmp_" + EXECUTION_TARGETS_PATH.name)
+    np.savez(tmp, targets=targets[keep], timestamps=index[keep].tz_convert(None).as_unit("ns").asi8,
+             bots=np.array(names), symbols=np.array(SYMBOLS), configs=np.array(config_hashes(names)))
+    tmp.replace(EXECUTION_TARGETS_PATH)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="閾値 × 最低保有期間のパラメータ研究")
+    parser.add_argument("days", nargs="?", type=int, default=None, help="評価期間 (直近 N 日, 既定は全期間)")
+    parser.add_argument("--thresholds", default="0.05,0.1,0.2,0.3", help="閾値の候補 (カンマ区切り)")
+    parser.add_argument("--holds", default="0,60,240,480", help="最低保有期間の候補 (分, カンマ区切り)")
+    parser.add_argument("--rebuild", action="store_true", help="保存済みの target を使わず全期間を計算し直す")
+    parser.add_argument("--top", type=int, default=10, help="表示する上位の組み合わせ数")
+    args = parser.parse_args()
+    thresholds = [float(v) for v in args.thresholds.split(",")]
+    holds = [float(v) for v in args.holds.split(",")]
+
+    hourly = {}
+    for symbol in SYMBOLS:
+        hourly[symbol] = to_hourly(load_prices(symbol))
+    index = pd.DatetimeIndex(sorted(set().union(*(df["timestamp"] for df in hourly.values()))))
+    if index.empty:
+        print("価格データがありません")
+        return
+    closes = pd.DataFrame({s: df.set_index("timestamp")["close"] for s, df in hourly.items()})
+    closes = closes.reindex(index)[list(SYMBOLS)]
+    # 下落レジーム: 銘柄ごとの1時間足の終値 < SMA (bot_runner.detect_bear_regime と同じ)
+    bear = np.column_stack([
+        (df["close"] < df["close"].rolling(REGIME_SMA_PERIOD).mean())
+        .set_axis(df["timestamp"]).reindex(index, fill_value=False).to_numpy(dtype=bool)
+        for df in (hourly[s] for s in SYMBOLS)
+    ])
+
+    names = list(BOTS)
+    factories = {name: (lambda cls=cls, cfg=BOT_CONFIGS[name]: cls(cfg)) for name, cls in BOTS.items()}
+    cached, cached_index = (None, None) if args.rebuild else load_cached_targets(names)
+    targets = build_targets(factories, hourly, index, cached, cached_index)
+    save_cached_targets(names, targets, index, closed_until(hourly))
+    ml_predictions = {sym: load_predictions(sym) for sym in BOT_CONFIGS["09_ml_gate"]["symbols"]}
+    if any(p is not None for p in ml_predictions.values()):
+        names.append("09_ml_gate")
+        targets = np.concatenate([targets, build_targets(
+            {"09_ml_gate": lambda: PredictionSignals(ml_predictions)}, hourly, index)], axis=1)
+
+    start = 0
+    if args.days is not None:
+        start = int(index.searchsorted(index[-1] - pd.Timedelta(days=args.days)))
+    targets = prepare_targets(targets, bear)[start:]
+    prices = closes.to_numpy(dtype=np.float64)[start:]
+    period = index[start:]
+
+    t0 = time.monotonic()
+    res = sweep(targets, prices, period, thresholds, holds)
+    elapsed = time.monotonic() - t0
+    print(f"=== 閾値 × 最低保有期間 ({period[0]:%Y-%m-%d}〜{period[-1]:%Y-%m-%d}, 1時間足 {len(period)}本, "
+          f"bot {len(names)} × 組み合わせ {len(thresholds) * len(holds)} = {len(res['lane_bots'])}口座, "
+          f"{elapsed:.1f}秒) ===")
+
+    lanes = pd.DataFrame({
+        "bot": [names[b] for b in res["lane_bots"]],
+        "threshold": res["thresholds"], "hold": res["min_hold_minutes"],
+        "trades": res["trades"].sum(axis=1), "cost": res["cost"],
+        "net": res["equity"] - INITIAL_BALANCE, "cb_trips": res["cb_trips"],
+    })
+    combos = (lanes.groupby(["threshold", "hold"], sort=False)
+              .agg(trades=("trades", "sum"), cost=("cost", "sum"), net=("net", "sum"),
+                   cb_trips=("cb_trips", "sum"))
+              .sort_values("net", ascending=False).reset_index())
+    print(f"{'順位':>4}{'閾値':>7}{'保有(分)':>9}{'取引':>8}{'コスト':>10}{'純損益':>10}{'停止':>6}")
+    for i, r in enumerate(combos.head(args.top).itertuples(), 1):
+        mark = " (現在)" if r.threshold == POSITION_CHANGE_THRESHOLD and r.hold == MIN_HOLD_MINUTES else ""
+        print(f"{i:>4}{r.threshold:>7.2f}{r.hold:>9.0f}{r.trades:>8}{r.cost:>10.0f}{r.net:>10.0f}"
+              f"{r.cb_trips:>6}{mark}")
+
+    print(f"\n{'bot':<16}{'最良 閾値':>10}{'保有(分)':>9}{'純損益':>10}{'現在の純損益':>13}")
+    for name, group in lanes.groupby("bot", sort=False):
+        best = group.loc[group["net"].idxmax()]
+        current = group[(group["threshold"] == POSITION_CHANGE_THRESHOLD)
+                         & (group["hold"] == MIN_HOLD_MINUTES)]
+        now = f"{current['net'].iloc[0]:>13.0f}" if len(current) else f"{'-':>13}"
+        print(f"{name:<16}{best['threshold']:>10.2f}{best['hold']:>9.0f}{best['net']:>10.0f}{now}")
+
+
+if __name__ == "__main__":
+    # PROFILE=cpu,mem 等でプロファイル出力 (src/profiling.py)
+    with profile_run("sweep_execution"):
+        main()
@@ -0,0 +1,109 @@
+"""
+Bot #09 (ML ゲート) の LightGBM パラメータ探索 (src/ml_tuning.py)。
+DB の価格履歴でウォークフォワードの fold を作り、候補パラメータを OOS の二乗誤差で比べる。
+評価は ML_WALK_FORWARD_WORKERS (0 = CPU コア数) のプロセスで並列に行い、
+(データ, 特徴量セット版, パラメータ, fold) ごとに ML_TUNING_CACHE_DIR へ保存する
+(中断しても同じコマンドの再実行で続きから評価する)。
+
+--write で最良のパラメータを src/config.py の BOT_CONFIGS["09_ml_gate"]["params"]["lgb_params"]
+に書き込む (次の再学習からフル再学習で反映される)。
+
+usage: python scripts/tune_ml.py [--method halving|grid] [--eta 3] [--grid JSON]
+                                 [--symbols BTC/USD,ETH/USD] [--recent-folds N] [--workers N] [--write]
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import BOT_CONFIGS
+from src.profiling import profile_run
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+BOT_NAME = "09_ml_gate"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot #09 の LightGBM パラメータ探索")
+    parser.add_argument("--method", choices=("halving", "grid"), default="halving")
+    parser.add_argument("--eta", type=int, default=3, help="halving で各段に残す割合の逆数")
+    parser.add_argument("--grid", default=None,
+                        help='探索範囲の JSON (例: {"num_leaves": [7, 15], "learning_rate": [0.05]})')
+    parser.add_argument("--symbols", default=None, help="対象銘柄 (カンマ区切り, 既定はbot設定の全銘柄)")
+    parser.add_argument("--recent-folds", type=int, default=None, help="銘柄ごとに直近 N fold だけ使う")
+    parser.add_argument("--workers", type=int, default=None, help="並列プロセス数 (既定は設定値)")
+    parser.add_argument("--limit", type=int, default=10_000_000,
+                        help="DB から読む直近の5分足行数 (既定は全期間)")
+    parser.add_argument("--top", type=int, default=10, help="表示する上位の候補数")
+    parser.add_argument("--write", action="store_true", help="最良のパラメータを config.py に書き込む")
+    args = parser.parse_args()
+
+    from src.bots.bot_09_ml_gate import BotMLGate, _lightgbm
+    from src.ml_tuning import (
+        DEFAULT_GRID, EvaluationCache, SearchData, expand_grid,
+        grid_search, successive_halving, export_to_config,
+    )
+    if _lightgbm() is None:
+        return
+
+    cfg = BOT_CONFIGS[BOT_NAME]
+    bot = BotMLGate(cfg)
+    symbols = args.symbols.split(",") if args.symbols else bot.symbols
+    dfs = {}
+    for symbol in symbols:
+        df = bot._load_training_df(symbol, args.limit)
+        if df is not None:
+            dfs[symbol] = df
+    data = SearchData(bot, dfs, args.recent_folds)
+    if not data.folds:
+        print("探索に使える fold がありません (価格履歴が不足)")
+        return
+
+    current = cfg["params"].get("lgb_params", {})
+    grid = json.loads(args.grid) if args.grid else DEFAULT_GRID
+    candidates = expand_grid(grid, base=current)
+    cache = EvaluationCache()
+    print(f"=== Bot #09 パラメータ探索 ({args.method}, {len(candidates)}候補, "
+          f"fold: {', '.join(f'{s}={len(f)}' for s, f in data.folds.items())}) ===")
+
+    t0 = time.monotonic()
+    if args.method == "grid":
+        ranked = grid_search(data, candidates, cache, args.workers)
+    else:
+        ranked = successive_halving(data, candidates, cache, args.eta, args.workers)
+    elapsed = time.monotonic() - t0
+
+    print(f"{'順位':>4}{'MSE':>12}{'的中率':>8}{'IC':>8}{'fold':>6}{'キャッシュ':>10}  パラメータ")
+    for i, s in enumerate(ranked[:args.top], 1):
+        tuned = {k: v for k, v in s["params"].items() if k in grid or k in current}
+        mark = " (現在)" if s["params"] == current else ""
+        print(f"{i:>4}{s['mse']:>12.4e}{s['hit_rate']:>8.1%}{s['ic']:>8.3f}{s['folds']:>6}"
+              f"{s['cached']:>10}  {json.dumps(tuned)}{mark}")
+    baseline = next((s for s in ranked if s["params"] == current), None)
+    if baseline and ranked[0] is not baseline:
+        print(f"現在の設定との差: MSE {baseline['mse']:.4e} → {ranked[0]['mse']:.4e} "
+              f"({ranked[0]['mse'] / baseline['mse'] - 1:+.1%})")
+    print(f"所要時間: {elapsed:.1f}秒")
+
+    best = ranked[0]["params"]
+    if args.write:
+        if best == current:
+            print("現在の設定が最良のため config.py は変更しません")
+        else:
+            export_to_config(best)
+            print(f"config.py の lgb_params を更新しました: {json.dumps(best)}")
+
+
+if __name__ == "__main__":
+    # PROFILE=cpu,mem 等でプロファイル出力 (src/profiling.py)
+    with profile_run("tune_ml"):
+        main()
@@ -0,0 +1,529 @@
+"""
+仮想通貨自動売買Bot - bot実行エンジン
+シグナル計算 (data_dict は読み取り専用) をワーカーへ並列に展開し、
+Simulator への書き込みは呼び出し元の単一ライターで BOT_NAMES 順に直列化する。
+
+- 結果は完了順ではなく bot の登録順で返すため、並列度によらず処理結果は決定的
+- bot #09 の推論や bot #10 のネットワーク待ちが他botのシグナル計算を塞がない
+
+1サイクル分の処理 (run_cycle) と、その後に残り時間で行う任意タスク (schedule_cycle) は
+単発実行 (scripts/run_bots.py) と常駐実行 (scripts/run_bots_daemon.py) で共有する。
+"""
+import sys
+import copy
+import time
+import logging
+import subprocess
+import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from src.config import (
+    SYMBOLS, BOT_CONFIGS, BOT_NAMES, SIGNAL_TIMEFRAME, BOT_EXECUTOR, BOT_WORKERS,
+    REGIME_FILTER_ENABLED, REGIME_SMA_PERIOD, REGIME_BEAR_MAX_POSITION,
+    PROJECT_ROOT, TRADING_BUDGET_SECONDS, OPTIONAL_TASKS, ENABLED_OPTIONAL_TASKS,
+    RUN_METRICS_LABELED_PREFIXES, RUN_METRICS_HISTORY_RUNS,
+)
+from src.database import (
+    save_price, save_run_metrics, save_api_metrics, save_query_metrics, get_run_metric_totals,
+)
+from src.metrics import METRICS, API_STATS, span, percentile
+from src.query_log import QUERY_STATS
+from src.metrics_exporter import note_market_data
+from src.data_collector import fetch_ohlcv, fetch_current_prices
+from src.indicators import add_core_indicators
+from src.simulator import Simulator
+
+from src.bots import get_bot_class
+
+logger = logging.getLogger(__name__)
+
+
+def merge_bot_config(bot_name: str, overrides: dict = None) -> dict:
+    """BOT_CONFIGS に上書き設定 ({"params": {...}, "symbols": [...]}) を重ねた設定を返す。"""
+    config = copy.deepcopy(BOT_CONFIGS[bot_name])
+    override = (overrides or {}).get(bot_name) or {}
+    config["params"].update(override.get("params", {}))
+    if "symbols" in override:
+        config["symbols"] = list(override["symbols"])
+    return config
+
+
+def build_bots(bot_names=None, overrides: dict = None):
+    """
+    botインスタンスを生成する。botモジュールはここで初めて import される (src/bots レジストリ)。
+
+    Returns:
+        (bots, errors): {bot_name: BaseBot}, {bot_name: {"status": "ERROR", "error": str}}
+    """
+    bots, errors = {}, {}
+    for bot_name in bot_names or BOT_NAMES:
+        try:
+            bots[bot_name] = get_bot_class(bot_name)(merge_bot_config(bot_name, overrides))
+        except Exception as e:
+            logger.error(f"  ❌ [{bot_name}] 初期化エラー: {e}")
+            logger.debug(traceback.format_exc())
+            errors[bot_name] = {"status": "ERROR", "error": str(e)}
+    return bots, errors
+
+
+def collect_market_data(exchange, bar_cache=None):
+    """
+    現在価格と SIGNAL_TIMEFRAME のOHLCV (指標付き) を取得し、5分足の最新バーを prices に記録する。
+
+    Args:
+        bar_cache: data_collector.BarCache (常駐実行時のみ。差分取得になる)
+
+    Returns:
+        (current_prices, data_dict) 取得失敗時は空dict
+    """
+    def _ohlcv(symbol, timeframe, limit):
+        if bar_cache is not None:
+            return bar_cache.fetch(exchange, symbol, timeframe=timeframe, limit=limit)
+        return fetch_ohlcv(exchange, symbol, timeframe=timeframe, limit=limit)
+
+    logger.info("📊 現在価格を取得中...")
+    with span("stage.fetch_prices"):
+        current_prices = fetch_current_prices(exchange)
+    if not current_prices:
+        logger.error("価格データの取得に失敗しました。")
+        return {}, {}
+
+    for symbol, data in current_prices.items():
+        logger.info(f"  {symbol}: ${data['price']:,.2f}")
+
+    # 価格記録は従来どおり5分足の最新バーを保存し（pricesテーブルの粒度を維持）、
+    # シグナル計算は SIGNAL_TIMEFRAME (1時間足) で行う（2026-07-05 構成見直し①）
+    logger.info(f"📈 OHLCVデータを取得中... (シグナル足: {SIGNAL_TIMEFRAME})")
+    data_dict = {}  # {symbol: DataFrame (SIGNAL_TIMEFRAME)}
+
+    for symbol in SYMBOLS:
+        try:
+            # 価格記録用: 5分足の最新バー
+            with span("stage.fetch_ohlcv", symbol):
+                df5 = _ohlcv(symbol, "5m", 10)
+            if df5 is not None and not df5.empty:
+                last = df5.iloc[-1]
+                save_price(
+                    timestamp=last["timestamp"].isoformat() if hasattr(last["timestamp"], "isoformat") else str(last["timestamp"]),
+                    symbol=symbol,
+                    open_p=last["open"],
+                    high=last["high"],
+                    low=last["low"],
+                    close=last["close"],
+                    volume=last["volume"],
+                )
+
+            # シグナル計算用: SIGNAL_TIMEFRAME 足
+            with span("stage.fetch_ohlcv", symbol):
+                df = _ohlcv(symbol, SIGNAL_TIMEFRAME, 500)
+            if df is not None and not df.empty:
+                with span("stage.indicators", symbol):
+                    df = add_core_indicators(df)
+                data_dict[symbol] = df
+            else:
+                logger.warning(f"[{symbol}] OHLCVデータなし")
+        except Exception as e:
+            logger.error(f"[{symbol}] OHLCV取得エラー: {e}")
+
+    if not data_dict:
+        logger.error("OHLCVデータが一切取得できませんでした。")
+    note_market_data(data_dict, SIGNAL_TIMEFRAME)
+    return current_prices, data_dict
+
+
+def detect_bear_regime(data_dict: dict) -> dict:
+    """
+    現金退避レジーム判定 (2026-07-05 構成見直し②・提案書 案A)。
+    終値が長期SMAを下回る銘柄は下落レジームとみなし、全botのロングを制限する。
+    """
+    bear_regime = {}
+    if REGIME_FILTER_ENABLED:
+        for symbol, df in data_dict.items():
+            close = df["close"].astype(float)
+            if len(close) >= REGIME_SMA_PERIOD:
+                sma_val = close.rolling(REGIME_SMA_PERIOD).mean().iloc[-1]
+                bear_regime[symbol] = bool(close.iloc[-1] < sma_val)
+            else:
+                bear_regime[symbol] = False  # 判定不能時はフィルタを掛けない
+        bears = [s for s, b in bear_regime.items() if b]
+        logger.info(f"🌧 下落レジーム銘柄: {bears if bears else 'なし'}")
+    return bear_regime
+
+
+def _compute_signals(bot_name: str, bot, data_dict: dict) -> dict:
+    """
+    1bot分のシグナルを計算する。例外は結果として返す (ワーカーを落とさない)。
+    所要時間は結果に載せて返す (プロセス実行でも親側で bot.signal として記録するため)。
+    """
+    start = time.perf_counter()
+    try:
+        outcome = {"status": "OK", "signals": bot.get_signals(data_dict)}
+    except Exception as e:
+        logger.error(f"  ❌ [{bot_name}] シグナル計算エラー: {e}")
+        logger.debug(traceback.format_exc())
+        outcome = {"status": "ERROR", "error": str(e)}
+    outcome["elapsed"] = time.perf_counter() - start
+    return outcome
+
+
+def _compute_signals_in_process(bot_name: str, bot, data_dict: dict) -> dict:
+    """プロセス実行用: ワーカー内の取引所 I/O 統計も結果に載せて親へ返す。"""
+    API_STATS.reset()  # fork で引き継いだ親の統計・前回の bot 分を除く
+    outcome = _compute_signals(bot_name, bot, data_dict)
+    outcome["api_stats"] = API_STATS.export()
+    return outcome
+
+
+def compute_all_signals(bots: dict, data_dict: dict,
+                        executor: str = BOT_EXECUTOR, workers: int = BOT_WORKERS) -> dict:
+    """
+    全botのシグナルを並列に計算する。
+
+    Args:
+        bots: {bot_name: BaseBot インスタンス} (この順で結果を返す)
+        data_dict: {symbol: DataFrame} 全bot共有・読み取り専用
+        executor: "thread" / "process" / "serial"
+        workers: 並列数
+
+    Returns:
+        {bot_name: {"status": "OK", "signals": {...}} | {"status": "ERROR", "error": str}}
+    """
+    if executor == "serial" or workers <= 1 or len(bots) <= 1:
+        results = {name: _compute_signals(name, bot, data_dict) for name, bot in bots.items()}
+        for name, outcome in results.items():
+            METRICS.record("bot.signal", outcome["elapsed"], name)
+        return results
+
+    if executor == "process":
+        pool_class, target = ProcessPoolExecutor, _compute_signals_in_process
+    else:
+        pool_class, target = ThreadPoolExecutor, _compute_signals
+    with pool_class(max_workers=min(workers, len(bots))) as pool:
+        futures = {
+            name: pool.submit(target, name, bot, data_dict)
+            for name, bot in bots.items()
+        }
+        results = {}
+        for name, future in futures.items():  # 登録順に回収 (完了順に依存しない)
+            try:
+                results[name] = future.result()
+                METRICS.record("bot.signal", results[name]["elapsed"], name)
+                API_STATS.merge(results[name].pop("api_stats", {}))
+            except Exception as e:
+                # プロセス実行時の pickle 失敗やワーカー異常終了
+                logger.error(f"  ❌ [{name}] ワーカー実行エラー: {e}")
+                results[name] = {"status": "ERROR", "error": str(e)}
+    return results
+
+
+def apply_regime_cap(symbol: str, signal: dict, bear_regime: dict) -> dict:
+    """下落レジーム中はロングを制限する（現金退避）。bot実装には触れない。"""
+    if REGIME_FILTER_ENABLED and bear_regime.get(symbol) \
+            and signal.get("target_position", 0.0) > REGIME_BEAR_MAX_POSITION:
+        signal = dict(signal)
+        signal["target_position"] = REGIME_BEAR_MAX_POSITION
+        signal["reason"] = f"[下落レジーム退避] {signal.get('reason', '')}"
+    return signal
+
+
+def apply_bot_signals(bot_name: str, signals: dict, current_prices: dict,
+                      all_prices_usd: dict, bear_regime: dict, checkpoint=None) -> tuple:
+    """
+    1bot分のシグナルを Simulator に適用し、スナップショットを保存する (単一ライター側で呼ぶ)。
+    checkpoint 指定時は、同じ実行で完了済みの調整・スナップショットを飛ばす。
+
+    Returns:
+        (list, dict): 各銘柄の apply_signal 結果, 保存したスナップショット
+    """
+    applied_stage = f"trades_applied/{bot_name}"
+    snapshot_stage = f"snapshot_saved/{bot_name}"
+    sim = None
+
+    if checkpoint is not None and checkpoint.done(applied_stage):
+        bot_results = checkpoint.load(applied_stage) or []
+        logger.info(f"  ♻️ [{bot_name}] ポジション調整は適用済みのためスキップ")
+    else:
+        with span("sim.load", bot_name):
+            sim = Simulator(bot_name)
+        bot_results = []
+        for symbol, signal in signals.items():
+            if symbol not in current_prices:
+                continue
+            signal = apply_regime_cap(symbol, signal, bear_regime)
+            price = current_prices[symbol]["price"]
+            with span("sim.apply_signal", bot_name):
+                result = sim.apply_signal(symbol, signal, price, all_prices_usd)
+            bot_results.append(result)
+
+            if result.get("executed"):
+                logger.info(
+                    f"  ✅ [{bot_name}] {result['action']} {symbol}: "
+                    f"pos {result.get('prev_pos', 0):.2f}→{result.get('target_pos', 0):.2f}"
+                )
+        if checkpoint is not None:
+            checkpoint.mark(applied_stage, bot_results)
+
+    # スナップショット保存
+    if checkpoint is not None and checkpoint.done(snapshot_stage):
+        return bot_results, checkpoint.load(snapshot_stage)
+    if sim is None:
+        with span("sim.load", bot_name):
+            sim = Simulator(bot_name)
+    with span("sim.snapshot", bot_name):
+        snapshot = sim.save_snapshot(
+            all_prices_usd, run_id=checkpoint.run_id if checkpoint is not None else None)
+    if checkpoint is not None:
+        checkpoint.mark(snapshot_stage, snapshot)
+    return bot_results, snapshot
+
+
+def run_cycle(exchange, bots: dict, init_errors: dict = None, bar_cache=None,
+              executor: str = BOT_EXECUTOR, checkpoint=None):
+    """
+    1サイクル (価格取得 → 指標 → シグナル → ポジション調整 → スナップショット) を実行する。
+
+    Args:
+        bots: build_bots() の結果 (常駐実行ではサイクル間で使い回す)
+        init_errors: 初期化に失敗したbot (結果にそのまま載せる)
+        checkpoint: src.checkpoint.RunCheckpoint。指定時は段階ごとに完了を記録し、
+                    同じ run_id の再実行では完了済みの段階を飛ばす (全段階が完了済みなら
+                    前回の結果を返し、checkpoint.replayed を True にする)
+
+    Returns:
+        dict: {bot_name: 結果} / データ取得に失敗した場合は None
+    """
+    if checkpoint is not None and checkpoint.done("completed"):
+        results = checkpoint.load("completed")
+        if results is not None:
+            logger.info(f"♻️ 実行 {checkpoint.run_id} は完了済みです (売買をスキップ)")
+            checkpoint.replayed = True
+            return results
+
+    market = checkpoint.load("data_fetched") if checkpoint is not None else None
+    if market is not None:
+        current_prices, data_dict = market
+        note_market_data(data_dict, SIGNAL_TIMEFRAME)
+        logger.info("♻️ 市場データをチェックポイントから復元しました")
+    else:
+        with span("stage.market_data"):
+            current_prices, data_dict = collect_market_data(exchange, bar_cache)
+        if not current_prices or not data_dict:
+            return None
+        if checkpoint is not None:
+            checkpoint.mark("data_fetched", (current_prices, data_dict))
+
+    with span("stage.regime"):
+        bear_regime = detect_bear_regime(data_dict)
+
+    # ── 各Botシグナル計算 (並列) ──
+    logger.info(f"🤖 {len(bots)}bot のシグナルを計算中... (実行方式: {executor})")
+
+    # 全銘柄のUSD価格dict (循環ブレーカー判定で全ポジション評価に使用)
+    all_prices_usd = {s: d["price"] for s, d in current_prices.items()}
+
+    results = dict(init_errors or {})
+    computed = checkpoint.load("signals_computed") if checkpoint is not None else None
+    if computed is None or not set(bots) <= set(computed):
+        with span("stage.signals"):
+            computed = compute_all_signals(bots, data_dict, executor=executor)
+        if checkpoint is not None:
+            checkpoint.mark("signals_computed", computed)
+    else:
+        logger.info("♻️ シグナルをチェックポイントから復元しました")
+
+    # ── ポジション調整 (単一ライターで登録順に直列適用) ──
+    with span("stage.apply"):
+        for bot_name in bots:
+            outcome = computed[bot_name]
+            if outcome["status"] != "OK":
+                results[bot_name] = outcome
+                continue
+            try:
+                signals = outcome["signals"]
+                bot_results, snapshot = apply_bot_signals(
+                    bot_name, signals, current_prices, all_prices_usd, bear_regime, checkpoint)
+                results[bot_name] = {
+                    "signals": signals,
+                    "trades": bot_results,
+                    "snapshot": snapshot,
+                    "status": "OK",
+                }
+
+            except Exception as e:
+                logger.error(f"  ❌ [{bot_name}] エラー: {e}")
+                logger.debug(traceback.format_exc())
+                results[bot_name] = {"status": "ERROR", "error": str(e)}
+
+    if checkpoint is not None:
+        checkpoint.mark("completed", results)
+        checkpoint.prune()
+    return results
+
+
+def log_summary(results: dict):
+    """実行サマリーをログ出力する。"""
+    logger.info("=" * 60)
+    logger.info("📋 実行サマリー:")
+    ok_count = sum(1 for r in results.values() if r["status"] == "OK")
+    err_count = sum(1 for r in results.values() if r["status"] == "ERROR")
+    trade_count = sum(
+        sum(1 for t in r.get("trades", []) if t.get("executed"))
+        for r in results.values()
+    )
+    logger.info(f"  Bot正常: {ok_count}/{len(results)}, エラー: {err_count}, 約定数: {trade_count}")
+    logger.info("=" * 60)
+
+
+def report_run_metrics(run_id: str):
+    """
+    この実行のスパン集計を run_metrics に保存し、主要区間の所要時間と
+    直近 RUN_METRICS_HISTORY_RUNS 実行の p50/p95 (区間合計の推移) をログに出す。
+    """
+    rows = METRICS.summary(RUN_METRICS_LABELED_PREFIXES)
+    if not rows:
+        return
+    save_run_metrics(run_id, rows)
+
+    logger.info("⏱ 区間別所要時間 (今回 / 直近p50 / 直近p95, ms):")
+    for row in rows:
+        if row["label"] or not row["name"].startswith(("run.", "stage.", "task.")):
+            continue
+        history = sorted(get_run_metric_totals(row["name"], limit=RUN_METRICS_HISTORY_RUNS))
+        logger.info(
+            f"  {row['name']:<26} {row['total_ms']:>9.1f} / "
+            f"{percentile(history, 0.50):>9.1f} / {percentile(history, 0.95):>9.1f}"
+        )
+    # 集計区間 (今回のスパン単位の p50/p95): bot別シグナル・API・DB
+    for row in rows:
+        if row["label"] or not row["name"].startswith(("bot.", "api.", "db.", "sim.")):
+            continue
+        logger.info(
+            f"  {row['name']:<26} n={row['count']:<4} p50={row['p50_ms']:.1f} "
+            f"p95={row['p95_ms']:.1f} max={row['max_ms']:.1f} 合計={row['total_ms']:.1f}"
+        )
+    slowest = sorted((r for r in rows if r["name"] == "bot.signal" and r["label"]),
+                     key=lambda r: -r["total_ms"])[:3]
+    if slowest:
+        logger.info("  シグナル計算の遅いbot: " + ", ".join(
+            f"{r['label']}={r['total_ms']:.0f}ms" for r in slowest))
+    report_api_metrics(run_id)
+    report_query_metrics(run_id)
+
+
+def report_api_metrics(run_id: str):
+    """この実行の取引所 I/O 統計を api_metrics に保存し、通信時間の多い順にログに出す。"""
+    rows = API_STATS.summary()
+    if not rows:
+        return
+    save_api_metrics(run_id, rows)
+
+    wall_ms = sum(r["total_ms"] for r in rows) or 1.0
+    logger.info("🌐 取引所I/O (エンドポイント別, ms):")
+    for row in sorted(rows, key=lambda r: -r["total_ms"]):
+        errors = ", ".join(f"{cls}={n}" for cls, n in sorted(row["error_classes"].items()))
+        logger.info(
+            f"  {row['endpoint']:<44} n={row['requests']:<4} "
+            f"p50={row['p50_ms']:.0f} p95={row['p95_ms']:.0f} max={row['max_ms']:.0f} "
+            f"合計={row['total_ms']:.0f} ({row['total_ms'] / wall_ms:.0%}) "
+            f"{row['bytes'] / 1024:.1f}KiB 待機={row['throttle_ms']:.0f} "
+            f"リトライ={row['retries']}" + (f" エラー: {errors}" if errors else "")
+        )
+
+
+def report_query_metrics(run_id: str, top: int = 5):
+    """この実行の SQLite ステートメント統計を query_metrics に保存し、重い順と全件走査をログに出す。"""
+    rows = QUERY_STATS.summary()
+    if not rows:
+        return
+    save_query_metrics(run_id, rows)
+
+    total_ms = sum(r["total_ms"] for r in rows)
+    logger.info(f"🗄 SQLite: {sum(r['count'] for r in rows)}文, 合計 {total_ms:.0f}ms "
+                f"(遅いクエリ {sum(r['slow'] for r in rows)}件)")
+    for row in rows[:top]:
+        logger.info(
+            f"  {row['call_site']:<36} n={row['count']:<5} 行={row['rows']:<6} "
+            f"合計={row['total_ms']:.1f} p95={row['p95_ms']:.1f} max={row['max_ms']:.1f}"
+            + (f" 全件走査: {row['full_scan']}" if row["full_scan"] else "")
+        )
+
+
+# ────────────────────────────────────────────
+#  スケジューラへの登録 (売買 = 必須, 重い処理 = 任意)
+# ────────────────────────────────────────────
+
+RESEARCH_DB_PATH = PROJECT_ROOT / "data" / "research.db"
+RESEARCH_REFRESH_HOURS = 24
+
+
+_retrain_proc = None  # 常駐モードでバックグラウンド起動した再学習ジョブ
+
+
+def start_background_retrain() -> str:
+    """
+    再学習ジョブ (scripts/retrain_ml.py) を別プロセスで起動し、完了を待たずに戻る。
+    学習したモデルは版付きで公開され、bot は次の推論で最新版に読み替える。
+    前回起動したジョブが動いていれば何もしない (別プロセス間の排他はジョブ側のロック)。
+    """
+    global _retrain_proc
+    if _retrain_proc is not None and _retrain_proc.poll() is None:
+        return f"実行中 (pid={_retrain_proc.pid})"
+    _retrain_proc = subprocess.Popen(
+        [sys.executable, str(PROJECT_ROOT / "scripts" / "retrain_ml.py")],
+        start_new_session=True,  # 親への SIGINT/SIGTERM で学習途中のまま落とさない
+    )
+    return f"起動 (pid={_retrain_proc.pid})"
+
+
+def export_dashboard():
+    from src.export_dashboard import export_dashboard_data
+    export_dashboard_data()
+
+
+def fetch_research_data(scheduler):
+    """data/research.db が RESEARCH_REFRESH_HOURS より古ければ取得スクリプトを残り時間内で実行する。"""
+    if RESEARCH_DB_PATH.exists() and \
+            time.time() - RESEARCH_DB_PATH.stat().st_mtime < RESEARCH_REFRESH_HOURS * 3600:
+        return "最新のため省略"
+    timeout = max(1.0, scheduler.remaining() - scheduler.reserve_seconds)
+    subprocess.run(
+        [sys.executable, str(PROJECT_ROOT / "scripts" / "fetch_research_data.py")],
+        check=True, timeout=timeout,
+    )
+    return "更新"
+
+
+def schedule_cycle(scheduler, exchange, bots: dict, init_errors: dict = None, bar_cache=None,
+                   optional_tasks=None, checkpoint=None):
+    """
+    1サイクル分のタスクをスケジューラに登録する。
+
+    - trading (必須): run_cycle + サマリー出力。結果は outcomes["trading"]["result"]
+    - ml_retrain / dashboard_export / research_fetch (任意, ENABLED_OPTIONAL_TASKS):
+      売買の後、残り時間が予算に足りる場合のみ実行 (ml_retrain は再学習ジョブの起動のみ)
+    """
+    def trade():
+        results = run_cycle(exchange, bots, init_errors, bar_cache, checkpoint=checkpoint)
+        if results is not None:
+            log_summary(results)
+        return results
+
+    scheduler.add("trading", trade, priority=0, budget_seconds=TRADING_BUDGET_SECONDS, required=True)
+
+    enabled = ENABLED_OPTIONAL_TASKS if optional_tasks is None else optional_tasks
+    for name in enabled:
+        cfg = OPTIONAL_TASKS.get(name)
+        if cfg is None:
+            logger.warning(f"未定義の任意タスク: {name}")
+            continue
+        if name == "ml_retrain":
+            if not any(b.retrain_due() for b in bots.values() if hasattr(b, "retrain_due")):
+                continue
+            fn = start_background_retrain
+        elif name == "dashboard_export":
+            fn = export_dashboard
+        elif name == "research_fetch":
+            fn = lambda: fetch_research_data(scheduler)
+        else:
+            continue
+        scheduler.add(name, fn, priority=cfg["priority"], budget_seconds=cfg["budget_seconds"])
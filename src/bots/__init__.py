@@ -1 +1,32 @@
-"""src/bots パッケージ初期化"""
+"""
+src/bots パッケージ初期化 + botレジストリ
+
+bot モジュールは get_bot_class() で初めて参照されたときに import する。
+無効化したbotのモジュールとその重い依存 (bot #09 の lightgbm 等) を
+起動時に読み込まないため (Actions では1日96回コールドスタートする)。
+"""
+import importlib
+
+# config名 → (モジュール, クラス名)
+BOT_REGISTRY = {
+    "01_donchian": ("src.bots.bot_01_donchian", "BotDonchian"),
+    "02_ema_adx": ("src.bots.bot_02_ema_adx", "BotEmaAdx"),
+    "03_bb_zscore": ("src.bots.bot_03_bb_zscore", "BotBBZscore"),
+    "04_vwap": ("src.bots.bot_04_vwap", "BotVWAP"),
+    "05_squeeze": ("src.bots.bot_05_squeeze", "BotSqueeze"),
+    "06_vol_momentum": ("src.bots.bot_06_vol_momentum", "BotVolMomentum"),
+    "07_pair_trade": ("src.bots.bot_07_pair_trade", "BotPairTrade"),
+    "08_regime": ("src.bots.bot_08_regime", "BotRegime"),
+    "09_ml_gate": ("src.bots.bot_09_ml_gate", "BotMLGate"),
+    "10_deriv": ("src.bots.bot_10_deriv", "BotDerivatives"),
+}
+
+_classes = {}
+
+
+def get_bot_class(bot_name: str):
+    """bot名に対応するクラスを返す (初回のみモジュールを import)。"""
+    if bot_name not in _classes:
+        module_name, class_name = BOT_REGISTRY[bot_name]
+        _classes[bot_name] = getattr(importlib.import_module(module_name), class_name)
+    return _classes[bot_name]
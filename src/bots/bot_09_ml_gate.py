@@ -3,17 +3,34 @@ Bot #09: ML ゲート (LightGBM フィルタ)
 テクニカル指標を特徴量としてLightGBMで将来リターンを予測。
 予測が正のときロング、負のときクローズ。
 
-初回は過去データで事前学習、以降は24時間ごとに再学習。
+初回は過去データで事前学習、以降は24時間ごとに再学習 (既定は公開中のモデルからの継続学習で、
+定期的に全期間からフル再学習する。retrain の docstring 参照)。
+学習は売買判断の経路では行わない。再学習ジョブ (scripts/retrain_ml.py) が別プロセスで
+retrain_due() の銘柄を学習し、モデルを版付きで公開する (src/model_registry.py):
+
+  models/ml_gate_<銘柄>_<足>.<版>.txt   学習済みモデル (LightGBM ネイティブ形式, 版ごとに別ファイル)
+  models/ml_gate_<銘柄>_<足>.<版>.json  メタデータ (特徴量スキーマ・学習期間・検証誤差・sha256)
+  models/ml_gate_<銘柄>_<足>.json       公開中の版のメタデータ (os.replace で原子的に更新)
+
+推論は公開中の最新版を NumPy の推論器 (src/tree_predictor.py, lightgbm 不要) で行い、
+初回の推論で読み込んでプロセス内にキャッシュする。公開が
+更新されていれば次の推論で読み替える (学習中・書き込み途中のモデルを読むことはない)。
+シグナル計算 (get_signals) は全銘柄の特徴量を (足 × 銘柄) の表で一括計算し、
+同じモデルの銘柄をまとめて推論する。
+
+学習用の特徴量は DB の特徴量ストア (ml_features, 銘柄 × 足 × 特徴量セット版 × 足の時刻) に
+確定足ごとに追記し、学習はそこから読む (毎回全期間の特徴量を計算し直さない)。
 """
 import logging
-import os
-import pickle
+import importlib.util
 import pandas as pd
 import numpy as np
 from datetime import datetime, timezone
 from pathlib import Path
 
 from src.strategy import BaseBot
+from src.metrics import span
+from src.model_registry import ModelRegistry, feature_schema_hash
 from src.indicators import (
     rsi, ema, bollinger_bands, atr, adx,
     volatility, volume_weighted_momentum, obv, sma,
@@ -21,12 +38,94 @@ from src.indicators import (
 
 logger = logging.getLogger(__name__)
 
-try:
-    import lightgbm as lgb
-    HAS_LGB = True
-except ImportError:
-    HAS_LGB = False
-    logger.warning("LightGBM がインストールされていません。Bot #09 は無効です。")
+# 固定のパラメータ。学習率・木の形などは bot 設定の lgb_params で上書きする
+# (scripts/tune_ml.py のパラメータ探索が更新する)
+LGB_PARAMS = {
+    "objective": "regression",
+    "metric": "mse",
+    "learning_rate": 0.05,
+    "num_leaves": 31,
+    "max_depth": 6,
+    "min_child_samples": 20,
+    "verbose": -1,
+    "force_row_wise": True,
+}
+# 特徴量の計算に足す助走 (EMA48・ADX 等の特徴量が安定するまでの本数)。
+# 推論は末尾 FEATURE_WARMUP_BARS + 1 本、特徴量ストアの追記は保存済みの足のこの本数前から計算する
+FEATURE_WARMUP_BARS = 150
+# 特徴量ストア (ml_features) の版。_build_features の特徴量を変えたら上げる
+# (旧版の行は読まれなくなり、次の再学習で新しい版が初回分から作られる)
+FEATURE_SET_VERSION = 2  # 2: obv_slope を平均出来高で正規化 (計算開始位置に依存しない)
+FEATURE_COLUMNS = (
+    "rsi_14", "ema_12", "ema_48", "bb_bandwidth", "bb_zscore", "atr_pct", "adx", "di_diff",
+    "volatility", "obv_slope", "vol_zscore", "ret_1", "ret_6", "ret_12",
+)
+# 公開したモデルのメタデータに記録し、読込時に照合する
+FEATURE_SCHEMA = feature_schema_hash(FEATURE_COLUMNS, FEATURE_SET_VERSION)
+
+_lgb = None  # lightgbm モジュール (未 import: None / 未インストール: False)
+
+
+def _lightgbm():
+    """
+    lightgbm を初回利用時に import して返す (学習時のみ)。未インストールなら None。
+    import に約1秒かかる (sklearn も連鎖して読まれる) ため、モジュール読込時には行わない。
+    推論は src/tree_predictor.py で行うため、売買の経路では呼ばない。
+    """
+    global _lgb
+    if _lgb is None:
+        try:
+            import lightgbm
+            _lgb = lightgbm
+        except ImportError:
+            _lgb = False
+            logger.warning("LightGBM がインストールされていません。Bot #09 のモデルは学習できません。")
+    return _lgb or None
+
+
+def fit_model(X: pd.DataFrame, y: pd.Series, params: dict = None,
+              num_boost_round: int = 200, init_model=None):
+    """
+    前方 80% で学習し、後方 20% で早期終了する。init_model があればその続きから木を足す。
+    params は LGB_PARAMS への上書き (ウォークフォワード評価・パラメータ探索からも呼ぶ)。
+    """
+    lgb = _lightgbm()
+    split = int(len(X) * 0.8)
+    train_set = lgb.Dataset(X.iloc[:split], label=y.iloc[:split])
+    val_set = lgb.Dataset(X.iloc[split:], label=y.iloc[split:], reference=train_set)
+    return lgb.train(
+        {**LGB_PARAMS, **(params or {})}, train_set,
+        valid_sets=[val_set],
+        num_boost_round=num_boost_round,
+        init_model=init_model,
+        callbacks=[lgb.early_stopping(20, verbose=False)],
+    )
+
+
+def prediction_to_signal(prediction: float) -> dict:
+    """予測リターン → シグナル (target_position / confidence / reason)。"""
+    if prediction > 0.002:
+        pos = min(0.8, prediction * 100)  # 2%以上の上昇予測で最大0.8
+        return {
+            "target_position": pos,
+            "confidence": min(0.8, abs(prediction) * 50),
+            "reason": f"ML予測: +{prediction:.4f} → ロング (pos={pos:.2f})",
+            "stop_loss": None,
+        }
+    elif prediction < -0.001:
+        return {
+            "target_position": 0.0,
+            "confidence": min(0.6, abs(prediction) * 50),
+            "reason": f"ML予測: {prediction:.4f} → クローズ",
+            "stop_loss": None,
+        }
+    else:
+        return {
+            "target_position": 0.1,
+            "confidence": 0.2,
+            "reason": f"ML予測中立: {prediction:.4f}",
+            "stop_loss": None,
+        }
 
 
 class BotMLGate(BaseBot):
@@ -36,34 +135,64 @@ class BotMLGate(BaseBot):
         super().__init__(bot_config)
         p = self.params
         self.model_dir = Path(p.get("model_dir", "models"))
-        self.model_dir.mkdir(parents=True, exist_ok=True)
-        self.models = {}  # {symbol: lgb.Booster}
+        self.lgb_params = {**LGB_PARAMS, **p.get("lgb_params", {})}
+        self.registry = ModelRegistry(self.model_dir)
+        self.models = {}  # {symbol: TreePredictor} 公開中の版 (初回の推論・判定時に遅延読込)
+        self.model_versions = {}  # {symbol: 読み込んだ版}
         self.last_train_time = {}
-        self._load_models()
 
-    def _model_path(self, symbol: str) -> Path:
+    def _model_stem(self, symbol: str) -> str:
         # ファイル名にシグナル足を含める: 足の変更時に旧足で学習したモデルを
-        # 誤って使い続けないため（該当パスが無ければ初回実行で即再学習される）
+        # 誤って使い続けないため（該当ファイルが無ければ再学習ジョブで即学習される）
         from src.config import SIGNAL_TIMEFRAME
         safe_name = symbol.replace("/", "_")
-        return self.model_dir / f"ml_gate_{safe_name}_{SIGNAL_TIMEFRAME}.pkl"
+        return f"ml_gate_{safe_name}_{SIGNAL_TIMEFRAME}"
 
-    def _load_models(self):
-        """保存済みモデルをロードする。"""
-        for symbol in self.symbols:
-            path = self._model_path(symbol)
-            if path.exists():
-                try:
-                    with open(path, "rb") as f:
-                        self.models[symbol] = pickle.load(f)
-                    logger.info(f"[{self.name}] {symbol} モデルをロード")
-                except Exception as e:
-                    logger.warning(f"[{self.name}] モデルロード失敗 ({symbol}): {e}")
+    def _read_manifest(self, symbol: str):
+        return self.registry.current(self._model_stem(symbol))
 
-    def _build_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """特徴量DataFrame を構築する。"""
+    def _refresh_model(self, symbol: str):
+        """
+        公開中の最新版を self.models に反映する。読込・検証はレジストリがプロセス内で
+        キャッシュし、公開ファイルが変わらない限り stat 1回で済む。
+        特徴量スキーマが現在の FEATURE_COLUMNS と合わないモデルは使わない (再学習待ち)。
+        """
+        entry = self.registry.get(self._model_stem(symbol), schema=FEATURE_SCHEMA)
+        if entry is None:
+            self.models.pop(symbol, None)
+            self.model_versions.pop(symbol, None)
+            return
+        predictor, meta = entry
+        self.models[symbol] = predictor
+        self.model_versions[symbol] = meta["version"]
+        self.last_train_time[symbol] = datetime.fromisoformat(meta["trained_at"])
+
+    def publish(self, symbol: str, model, meta: dict, check_data=None) -> str:
+        """
+        モデルを新しい版として公開し、版を返す (src/model_registry.py)。
+        check_data で NumPy 推論器との一致を確認し、古い版と版管理導入前の pickle は削除する。
+        特徴量スキーマは meta の feature_set_version (既定は現在の版) から作る
+        (旧い特徴量セットのモデルは、現在の特徴量では推論に使われない)。
+        """
+        from src.config import SIGNAL_TIMEFRAME
+        safe_name = symbol.replace("/", "_")
+        schema = feature_schema_hash(FEATURE_COLUMNS, meta.get("feature_set_version", FEATURE_SET_VERSION))
+        published = self.registry.publish(self._model_stem(symbol), model, dict(
+            meta, symbol=symbol, timeframe=SIGNAL_TIMEFRAME,
+            features=list(FEATURE_COLUMNS), feature_schema=schema,
+        ), check_data=check_data)
+        # 足をファイル名に含める前の旧形式 (ml_gate_BTC_USD.pkl)
+        self.registry.prune(self._model_stem(symbol), legacy=[f"ml_gate_{safe_name}.pkl"])
+        return published["version"]
+
+    def _compute_features(self, df) -> dict:
+        """
+        特徴量ごとの計算結果 {名前: 系列}。df の各列 (open/high/low/close/volume) が Series なら
+        Series を、(足 × 銘柄) の DataFrame なら同じ形の DataFrame を返す (複数銘柄の一括計算)。
+        指標は全て列ごとの計算なので、どちらでも銘柄ごとの値は同じになる。
+        """
         close = df["close"].astype(float)
-        features = pd.DataFrame(index=df.index)
+        features = {}
 
         # 基本
         features["rsi_14"] = rsi(close, 14)
@@ -87,13 +216,14 @@ class BotMLGate(BaseBot):
         # Volatility
         features["volatility"] = volatility(close, 24)
 
-        # OBV slope
+        # OBV slope。OBV は累積で水準が計算開始位置に依存するため、EMA との差を
+        # 平均出来高で割る (EMA との差は開始位置に依存しない → 末尾だけの計算・追記でも同じ値)
+        vol = df["volume"].astype(float)
         obv_vals = obv(df)
         obv_ema = ema(obv_vals, 12)
-        features["obv_slope"] = (obv_vals - obv_ema) / obv_ema.abs().replace(0, np.nan)
+        features["obv_slope"] = (obv_vals - obv_ema) / sma(vol, 12).replace(0, np.nan)
 
         # Volume z-score
-        vol = df["volume"].astype(float)
         vol_mean = sma(vol, 48)
         vol_std = vol.rolling(window=48).std()
         features["vol_zscore"] = (vol - vol_mean) / vol_std.replace(0, np.nan)
@@ -105,88 +235,299 @@ class BotMLGate(BaseBot):
 
         return features
 
-    def train(self, df: pd.DataFrame, symbol: str):
-        """モデルを再学習する。"""
-        if not HAS_LGB:
-            return
+    def _build_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        """特徴量DataFrame を構築する。"""
+        features = self._compute_features(df)
+        return pd.DataFrame({c: features[c] for c in FEATURE_COLUMNS}, index=df.index)
 
-        p = self.params
-        horizon = p["prediction_horizon"]
+    def _latest_features(self, tails: dict) -> pd.DataFrame:
+        """
+        銘柄ごとの末尾の足の特徴量 (index: 銘柄)。末尾の本数が同じ銘柄は OHLCV を
+        (足 × 銘柄) の表に並べ、1回の計算で全銘柄分を求める。
 
+        Args:
+            tails: {symbol: 助走分の末尾の OHLCV}
+        """
+        by_length = {}
+        for symbol, df in tails.items():
+            by_length.setdefault(len(df), []).append(symbol)
+        parts = []
+        for symbols in by_length.values():
+            panel = {
+                col: pd.DataFrame({s: tails[s][col].to_numpy(dtype=float) for s in symbols})
+                for col in ("high", "low", "close", "volume")
+            }
+            features = self._compute_features(panel)
+            parts.append(pd.DataFrame({c: features[c].iloc[-1] for c in FEATURE_COLUMNS}))
+        if not parts:
+            return pd.DataFrame(columns=list(FEATURE_COLUMNS))
+        return pd.concat(parts).loc[list(tails)]
+
+    def _bars_per_signal(self) -> int:
+        """シグナル足1本あたりの prices (5分足) の行数。"""
+        import ccxt
+        from src.config import SIGNAL_TIMEFRAME, INTERVAL_MINUTES
+        return max(1, ccxt.Exchange.parse_timeframe(SIGNAL_TIMEFRAME) // (INTERVAL_MINUTES * 60))
+
+    def update_feature_store(self, symbol: str) -> int:
+        """
+        特徴量ストアに保存済みの最新の足より後に確定した足の特徴量を計算して追記する。
+        計算に読む prices は保存済みの最新足の FEATURE_WARMUP_BARS 本前からで、
+        初回 (未保存) のみ train_window_bars 分を読む。
+
+        Returns:
+            int: 追記した足の本数
+        """
+        import ccxt
+        from src.config import SIGNAL_TIMEFRAME
+        from src.database import get_latest_ml_feature_ts, save_ml_features
+        tf_sec = ccxt.Exchange.parse_timeframe(SIGNAL_TIMEFRAME)
+        latest = get_latest_ml_feature_ts(symbol, SIGNAL_TIMEFRAME, FEATURE_SET_VERSION)
+        limit = self.params["train_window_bars"]
+        if latest is not None:
+            gap = (datetime.now(timezone.utc) - datetime.fromisoformat(latest)).total_seconds() / tf_sec
+            limit = min(limit, (int(gap) + 1 + FEATURE_WARMUP_BARS) * self._bars_per_signal())
+        df = self._load_training_df(symbol, limit)
+        if df is None:
+            return 0
+
+        features = self._build_features(df)
+        ts = df["timestamp"]
+        # 確定足のみ (足の最後の5分足まで DB にある足)。形成中の足は次回に回す
+        keep = (ts + pd.Timedelta(seconds=tf_sec) <= df.attrs["data_end"]) & features.notna().all(axis=1)
+        if latest is not None:
+            keep &= ts > pd.Timestamp(latest)
+        rows = [
+            (t.isoformat(), float(close), values)
+            for t, close, values in zip(ts[keep], df.loc[keep, "close"],
+                                        features[keep].to_dict("records"))
+        ]
+        if not rows:
+            return 0
+        added = save_ml_features(symbol, SIGNAL_TIMEFRAME, FEATURE_SET_VERSION, rows)
+        logger.info(f"[{self.name}][{symbol}] 特徴量ストアに追記: {added}本 (〜{rows[-1][0]})")
+        return added
+
+    def _store_training_data(self, symbol: str, bars: int):
+        """特徴量ストアの直近 bars 本から X とターゲット y (N本先リターン) を作る。"""
+        from src.config import SIGNAL_TIMEFRAME
+        from src.database import get_ml_features
+        rows = get_ml_features(symbol, SIGNAL_TIMEFRAME, FEATURE_SET_VERSION, bars)
+        index = pd.to_datetime([r["bar_ts"] for r in rows], utc=True)
+        X = pd.DataFrame([r["features"] for r in rows], index=index)
+        close = pd.Series([r["close"] for r in rows], index=index, dtype=float)
+        horizon = self.params["prediction_horizon"]
+        y = close.pct_change(horizon).shift(-horizon)
+        valid = y.notna()
+        return X[valid], y[valid]
+
+    def _training_data(self, df: pd.DataFrame):
+        """特徴量 X とターゲット y (N本先リターン) の有効行。index は足の開始時刻。"""
+        horizon = self.params["prediction_horizon"]
         features = self._build_features(df)
-        # ターゲット: N本先リターン
         target = df["close"].astype(float).pct_change(horizon).shift(-horizon)
 
         # 有効行のみ
         valid = features.dropna().index.intersection(target.dropna().index)
-        if len(valid) < p["min_train_samples"]:
-            logger.warning(f"[{self.name}][{symbol}] 学習データ不足: {len(valid)} < {p['min_train_samples']}")
-            return
-
         X = features.loc[valid]
         y = target.loc[valid]
+        if "timestamp" in df.columns:
+            X.index = y.index = pd.DatetimeIndex(df.loc[valid, "timestamp"])
+        return X, y
 
-        # 学習/検証分割
+    @staticmethod
+    def _val_mse(model, X: pd.DataFrame, y: pd.Series) -> float:
+        """時系列後方 20% (検証区間) の二乗誤差平均。"""
         split = int(len(X) * 0.8)
-        X_train, X_val = X.iloc[:split], X.iloc[split:]
-        y_train, y_val = y.iloc[:split], y.iloc[split:]
-
-        train_set = lgb.Dataset(X_train, label=y_train)
-        val_set = lgb.Dataset(X_val, label=y_val, reference=train_set)
-
-        params = {
-            "objective": "regression",
-            "metric": "mse",
-            "learning_rate": 0.05,
-            "num_leaves": 31,
-            "max_depth": 6,
-            "min_child_samples": 20,
-            "verbose": -1,
-            "force_row_wise": True,
-        }
+        return float(np.mean((model.predict(X.iloc[split:]) - y.iloc[split:].to_numpy()) ** 2))
 
-        model = lgb.train(
-            params, train_set,
-            valid_sets=[val_set],
-            num_boost_round=200,
-            callbacks=[lgb.early_stopping(20, verbose=False)],
-        )
+    def _fit(self, X: pd.DataFrame, y: pd.Series, num_boost_round: int = 200, init_model=None):
+        """前方 80% で学習し、後方 20% で早期終了する。init_model があればその続きから木を足す。"""
+        return fit_model(X, y, self.lgb_params, num_boost_round=num_boost_round, init_model=init_model)
 
-        self.models[symbol] = model
-        self.last_train_time[symbol] = datetime.now(timezone.utc)
+    def _install(self, symbol: str, model, meta: dict, X: pd.DataFrame):
+        version = self.publish(symbol, model, meta, check_data=X)
+        self._refresh_model(symbol)
+        return version
 
-        # 保存
-        with open(self._model_path(symbol), "wb") as f:
-            pickle.dump(model, f)
+    def train(self, df: pd.DataFrame, symbol: str):
+        """OHLCV の df から特徴量を作ってモデルを作り直す (フル再学習)。"""
+        if _lightgbm() is None:
+            return
+        X, y = self._training_data(df)
+        self._train_full(symbol, X, y)
 
-        logger.info(f"[{self.name}][{symbol}] モデル学習完了 (データ={len(valid)}件)")
+    def _train_full(self, symbol: str, X: pd.DataFrame, y: pd.Series):
+        p = self.params
+        if len(X) < p["min_train_samples"]:
+            logger.warning(f"[{self.name}][{symbol}] 学習データ不足: {len(X)} < {p['min_train_samples']}")
+            return
+
+        model = self._fit(X, y)
+        now = datetime.now(timezone.utc).isoformat()
+        X_train = X.iloc[:int(len(X) * 0.8)]
+        version = self._install(symbol, model, {
+            "mode": "full",
+            "feature_set_version": FEATURE_SET_VERSION,
+            "rows": int(len(X)),
+            "num_trees": model.num_trees(),
+            "best_iteration": int(model.best_iteration or model.current_iteration()),
+            "val_mse": self._val_mse(model, X, y),
+            "lgb_params": self.lgb_params,
+            "base_trained_at": now,
+            "train_start": X.index[0].isoformat() if isinstance(X.index, pd.DatetimeIndex) else None,
+            "last_bar_ts": X.index[-1].isoformat() if isinstance(X.index, pd.DatetimeIndex) else None,
+            # ドリフト判定の基準 (継続学習では更新せず、フル再学習時の分布と比べ続ける)
+            "feature_stats": {c: [float(X_train[c].mean()), float(X_train[c].std())] for c in X.columns},
+        }, X)
+        logger.info(f"[{self.name}][{symbol}] モデル学習完了 (フル, データ={len(X)}件, 版={version})")
+
+    def _full_rebuild_reason(self, symbol: str, manifest) -> str:
+        """継続学習できない (フル再学習が必要な) 理由。継続学習できるなら None。"""
+        p = self.params
+        if p.get("retrain_mode", "full") != "incremental":
+            return "retrain_mode=full"
+        if symbol not in self.models or not manifest or not manifest.get("last_bar_ts") \
+                or not manifest.get("base_trained_at"):
+            return "継続元のモデルなし"
+        if manifest.get("feature_set_version") != FEATURE_SET_VERSION:
+            return f"特徴量セットの変更 (v{manifest.get('feature_set_version')} → v{FEATURE_SET_VERSION})"
+        hours = (datetime.now(timezone.utc)
+                 - datetime.fromisoformat(manifest["base_trained_at"])).total_seconds() / 3600
+        if hours >= p["full_rebuild_interval_hours"]:
+            return f"定期フル再学習 (前回から{hours:.0f}時間)"
+        # パラメータを記録する前のモデルは LGB_PARAMS で学習したもの
+        if manifest.get("lgb_params", LGB_PARAMS) != self.lgb_params:
+            return "LightGBM のパラメータ変更"
+        if manifest.get("num_trees", 0) + p["incremental_rounds"] > p["max_model_trees"]:
+            return f"木の本数が上限に到達 ({manifest.get('num_trees')}本)"
+        return None
+
+    def _drift_reason(self, manifest: dict, model, X_new: pd.DataFrame, y_new: pd.Series) -> str:
+        """新しい確定足で分布・精度の劣化を調べ、フル再学習すべき理由を返す (問題なければ None)。"""
+        p = self.params
+        shifts = {
+            c: abs(float(X_new[c].mean()) - mean) / std
+            for c, (mean, std) in (manifest.get("feature_stats") or {}).items()
+            if c in X_new.columns and std and std > 0
+        }
+        if shifts:
+            name, z = max(shifts.items(), key=lambda kv: kv[1])
+            if z > p["drift_zscore_threshold"]:
+                return f"特徴量ドリフト ({name}: 平均が{z:.1f}σ移動)"
+        ref = manifest.get("val_mse")
+        mse = float(np.mean((model.predict(X_new) - y_new.to_numpy()) ** 2))
+        if ref and mse > ref * p["drift_mse_ratio"]:
+            return f"予測誤差の悪化 (新しい足 MSE {mse:.2e} > 学習時 {ref:.2e} × {p['drift_mse_ratio']})"
+        return None
+
+    def _train_incremental(self, symbol: str, manifest: dict):
+        """
+        公開中のモデルから、新しく確定した足を含む直近 incremental_window_bars 本で
+        ブースティングを続ける (init_model)。特徴量ストアから読むため、読込・学習量は
+        窓の長さで決まり、全履歴に依存しない。
+
+        Returns:
+            (True, None): 公開した / (False, 理由): 更新なし / (None, 理由): フル再学習が必要
+        """
+        lgb = _lightgbm()
+        p = self.params
+        window = p["incremental_window_bars"]
+        X, y = self._store_training_data(symbol, window + p["prediction_horizon"])
+        if X.empty:
+            return False, "学習データなし"
+
+        new = X.index > pd.Timestamp(manifest["last_bar_ts"])
+        n_new = int(new.sum())
+        if n_new < p["incremental_min_new_bars"]:
+            return False, f"新しい確定足が不足 ({n_new}本)"
+        if n_new >= min(len(X), window):
+            return None, f"前回の学習から窓 ({window}本) 以上空いた"
+        reason = self._drift_reason(manifest, self.models[symbol], X[new], y[new])
+        if reason:
+            return None, reason
+
+        X, y = X.iloc[-window:], y.iloc[-window:]
+        # 公開済みの本体は best_iteration までの木 (早期終了以降の木は含まない)
+        init = lgb.Booster(model_str=self.registry.read_model(manifest))
+        model = self._fit(X, y, num_boost_round=p["incremental_rounds"], init_model=init)
+        mse, base_mse = self._val_mse(model, X, y), self._val_mse(init, X, y)
+        if mse > base_mse * (1 + p["incremental_tolerance"]):
+            return None, f"継続学習で検証誤差が悪化 ({base_mse:.2e} → {mse:.2e})"
+
+        version = self._install(symbol, model, dict(
+            manifest,
+            mode="incremental",
+            rows=int(len(X)),
+            new_bars=n_new,
+            num_trees=model.num_trees(),
+            best_iteration=int(model.best_iteration or model.current_iteration()),
+            val_mse=mse,
+            train_start=X.index[0].isoformat(),
+            last_bar_ts=X.index[-1].isoformat(),
+        ), X)
+        logger.info(f"[{self.name}][{symbol}] モデル学習完了 (継続, 新しい足={n_new}本, "
+                    f"木={init.num_trees()}→{model.num_trees()}, 版={version})")
+        return True, None
 
     def _needs_retrain(self, symbol: str) -> bool:
-        """再学習が必要か判定する。"""
-        if symbol not in self.models:
+        """
+        再学習が必要か判定する (公開済みモデルの学習時刻から retrain_interval_hours 経過、
+        または旧い特徴量セットで学習したモデル)。
+        """
+        self._refresh_model(symbol)
+        if symbol not in self.models or symbol not in self.last_train_time:
+            return True
+        manifest = self._read_manifest(symbol) or {}
+        if manifest.get("feature_set_version") != FEATURE_SET_VERSION:
             return True
-        # モデルの最終更新時刻でも判定 (プロセス再起動時に last_train_time が空になるため)
-        if symbol not in self.last_train_time:
-            path = self._model_path(symbol)
-            if path.exists():
-                mtime = datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.utc)
-                self.last_train_time[symbol] = mtime
-            else:
-                return True
-
         hours_since = (datetime.now(timezone.utc) - self.last_train_time[symbol]).total_seconds() / 3600
         return hours_since >= self.params["retrain_interval_hours"]
 
+    def retrain_due(self) -> list:
+        """再学習期限を過ぎた (またはモデル未作成の) 銘柄を返す。"""
+        # 売買プロセスからも呼ばれるため lightgbm は import せず有無だけ確認する
+        if importlib.util.find_spec("lightgbm") is None:
+            return []
+        return [s for s in self.symbols if self._needs_retrain(s)]
+
+    def retrain(self, symbol: str) -> bool:
+        """
+        特徴量ストアを確定足まで追記し、そこから symbol のモデルを再学習する。学習できたら True。
+        retrain_mode=incremental なら公開中のモデルからの継続学習を試み、継続元が無い・
+        定期フル再学習の時期・ドリフト検知・継続で悪化した場合は全期間から作り直す。
+        """
+        self.update_feature_store(symbol)
+        self._refresh_model(symbol)
+        manifest = self._read_manifest(symbol)
+        reason = self._full_rebuild_reason(symbol, manifest)
+        if reason is None:
+            ok, reason = self._train_incremental(symbol, manifest)
+            if ok is not None:
+                if not ok:
+                    logger.info(f"[{self.name}][{symbol}] 継続学習なし: {reason}")
+                return ok
+        logger.info(f"[{self.name}][{symbol}] フル再学習: {reason}")
+
+        # 学習は特徴量ストアの直近 train_window_bars (5分足換算) 分から (推論用dfは500本程度)
+        X, y = self._store_training_data(symbol, self.params["train_window_bars"] // self._bars_per_signal())
+        if len(X) < self.params["min_train_samples"]:
+            logger.warning(f"[{self.name}][{symbol}] 学習データ不足 (特徴量ストア={len(X)}本)")
+            return False
+        before = self.last_train_time.get(symbol)
+        self._train_full(symbol, X, y)
+        return self.last_train_time.get(symbol) != before
+
     def _load_training_df(self, symbol: str, limit: int):
         """DBから学習用データを取得し、シグナル足にリサンプリングしてDataFrame化する。
 
         pricesテーブルは5分足粒度のため、推論に使う足(SIGNAL_TIMEFRAME)と
         揃えないと学習と推論で特徴量の意味がズレる。
+        df.attrs["data_end"] は DB にある最後の5分足の終了時刻 (足の確定判定用)。
         """
         try:
-            from src.config import SIGNAL_TIMEFRAME
+            from src.config import SIGNAL_TIMEFRAME, INTERVAL_MINUTES
             from src.database import get_recent_prices
-            from src.indicators import add_core_indicators
             rows = get_recent_prices(symbol, limit=limit)
             if not rows:
                 return None
@@ -195,6 +536,7 @@ class BotMLGate(BaseBot):
                 if col in df.columns:
                     df[col] = df[col].astype(float)
             df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, format="mixed")
+            data_end = df["timestamp"].max() + pd.Timedelta(minutes=INTERVAL_MINUTES)
             df = (
                 df.set_index("timestamp").sort_index()
                 .resample(SIGNAL_TIMEFRAME)
@@ -205,35 +547,79 @@ class BotMLGate(BaseBot):
             )
             if df.empty:
                 return None
-            df = add_core_indicators(df)
+            df.attrs["data_end"] = data_end
             return df
         except Exception as e:
             logger.warning(f"[{self.name}][{symbol}] 学習データDBロード失敗: {e}")
             return None
 
-    def compute_signal(self, df: pd.DataFrame, symbol: str) -> dict:
-        if not HAS_LGB:
-            return self._hold_signal("LightGBM未インストール")
-
-        # 再学習チェック
-        if self._needs_retrain(symbol):
-            train_window = self.params["train_window_bars"]
-            # 学習用dfは十分な長さが必要なのでDBから取得 (引数のdfはrun_bots由来で500本程度)
-            train_df = self._load_training_df(symbol, train_window)
-            if train_df is None or len(train_df) < self.params["min_train_samples"]:
-                return self._hold_signal(
-                    f"学習データ不足 (DB={0 if train_df is None else len(train_df)}本)"
-                )
-            self.train(train_df, symbol)
+    def get_signals(self, data_dict: dict) -> dict:
+        """
+        全対象銘柄のシグナルを一括で計算する (BaseBot.get_signals の一括版。判定は compute_signal と同じ)。
+        特徴量は全銘柄を1回の計算で求め (_latest_features)、予測は同じモデルを使う銘柄を
+        まとめて1回の predict で行う。銘柄が増えても指標計算・推論の呼び出し回数は増えない。
+        """
+        signals, tails = {}, {}
+        for symbol in self.symbols:
+            df = data_dict.get(symbol)
+            if symbol not in data_dict:
+                signals[symbol] = self._hold_signal("データなし")
+            elif df is None or len(df) < 50:  # 最低50本必要
+                signals[symbol] = self._hold_signal("データ不足")
+            else:
+                self._refresh_model(symbol)
+                if symbol not in self.models:
+                    signals[symbol] = self._hold_signal("モデル未学習 (再学習ジョブ待ち)")
+                else:
+                    tails[symbol] = df.iloc[-(FEATURE_WARMUP_BARS + 1):]
+
+        if tails:
+            with span("bot.compute_signal", self.name):
+                signals.update(self._predict_signals(tails))
+        return {symbol: signals[symbol] for symbol in self.symbols}
+
+    def _predict_signals(self, tails: dict) -> dict:
+        try:
+            features = self._latest_features(tails)
+        except Exception as e:
+            logger.error(f"[{self.name}] 特徴量の一括計算エラー: {e}")
+            return {symbol: self._hold_signal(f"エラー: {e}") for symbol in tails}
+
+        signals, groups = {}, {}
+        complete = features.notna().all(axis=1)
+        for symbol in tails:
+            if not complete[symbol]:
+                signals[symbol] = self._hold_signal("特徴量計算不可")
+                continue
+            model = self.models[symbol]
+            groups.setdefault(id(model), (model, []))[1].append(symbol)
+
+        for model, symbols in groups.values():
+            try:
+                predictions = model.predict(features.loc[symbols])
+            except Exception as e:
+                logger.warning(f"[{self.name}][{','.join(symbols)}] 予測エラー: {e}")
+                signals.update({s: self._hold_signal(f"予測エラー: {e}") for s in symbols})
+                continue
+            for symbol, prediction in zip(symbols, predictions):
+                signal = prediction_to_signal(prediction)
+                signal["target_position"] = max(0.0, min(1.0, signal["target_position"]))
+                signals[symbol] = signal
+        return signals
 
+    def compute_signal(self, df: pd.DataFrame, symbol: str) -> dict:
+        # 推論は NumPy 推論器 (src/tree_predictor.py) で行い、lightgbm は読まない。
+        # 売買判断の経路では学習しない。期限切れでも公開済みの最新版で推論し、
+        # 再学習は別プロセスの再学習ジョブ (scripts/retrain_ml.py) が行う
+        self._refresh_model(symbol)
         if symbol not in self.models:
-            return self._hold_signal("モデル未学習")
+            return self._hold_signal("モデル未学習 (再学習ジョブ待ち)")
 
-        # 予測
-        features = self._build_features(df)
-        last_features = features.iloc[[-1]].dropna(axis=1)
+        # 予測。必要なのは最新の1行なので、指標が収束する助走分の末尾だけで計算する
+        features = self._build_features(df.iloc[-(FEATURE_WARMUP_BARS + 1):])
+        last_features = features.iloc[[-1]]
 
-        if last_features.empty:
+        if last_features.isna().any(axis=None):
             return self._hold_signal("特徴量計算不可")
 
         try:
@@ -243,25 +629,4 @@ class BotMLGate(BaseBot):
             return self._hold_signal(f"予測エラー: {e}")
 
         # 予測値 → ポジション
-        if prediction > 0.002:
-            pos = min(0.8, prediction * 100)  # 2%以上の上昇予測で最大0.8
-            return {
-                "target_position": pos,
-                "confidence": min(0.8, abs(prediction) * 50),
-                "reason": f"ML予測: +{prediction:.4f} → ロング (pos={pos:.2f})",
-                "stop_loss": None,
-            }
-        elif prediction < -0.001:
-            return {
-                "target_position": 0.0,
-                "confidence": min(0.6, abs(prediction) * 50),
-                "reason": f"ML予測: {prediction:.4f} → クローズ",
-                "stop_loss": None,
-            }
-        else:
-            return {
-                "target_position": 0.1,
-                "confidence": 0.2,
-                "reason": f"ML予測中立: {prediction:.4f}",
-                "stop_loss": None,
-            }
+        return prediction_to_signal(prediction)
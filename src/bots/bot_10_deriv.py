@@ -11,7 +11,7 @@ import logging
 import pandas as pd
 
 from src.strategy import BaseBot
-from src.data_collector import fetch_funding_rate, fetch_open_interest
+from src.data_collector import fetch_funding_rate, fetch_open_interest, create_futures_exchange
 from src.database import get_latest_derivative, save_derivative_data
 
 logger = logging.getLogger(__name__)
@@ -20,11 +20,27 @@ logger = logging.getLogger(__name__)
 class BotDerivatives(BaseBot):
     """デリバティブ情報併用戦略"""
 
+    def __init__(self, bot_config: dict):
+        super().__init__(bot_config)
+        self._exchange_futures = None
+
+    def __getstate__(self):
+        # プロセス実行時の受け渡しでは取引所クライアントを持ち越さない (ワーカー側で作り直す)
+        state = self.__dict__.copy()
+        state["_exchange_futures"] = None
+        return state
+
+    def _futures_exchange(self):
+        """先物クライアントを初回だけ生成して使い回す (常駐時はサイクルをまたいで保持)。"""
+        if self._exchange_futures is None:
+            self._exchange_futures = create_futures_exchange()
+        return self._exchange_futures
+
     def compute_signal(self, df: pd.DataFrame, symbol: str) -> dict:
         p = self.params
 
         # Funding rate / OI を取得
-        funding_data = fetch_funding_rate(symbol=symbol)
+        funding_data = fetch_funding_rate(self._futures_exchange(), symbol=symbol)
         oi_data = fetch_open_interest(symbol=symbol)
 
         # デリバ両方NGならベースラインのロング (0.3) にフォールバック
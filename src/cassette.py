@@ -0,0 +1,259 @@
+"""
+仮想通貨自動売買Bot - 取引所通信の記録/再生 (カセット)
+ccxt の HTTP 層 (exchange.fetch) と生REST (requests.get) の下に挟まるトランスポート。
+
+- record: 実通信しつつ、リクエスト/レスポンス(例外含む)を gzip JSON Lines に追記
+- replay: 実通信せずカセットから応答する。同一リクエストは記録順に返し、
+          使い切った後は最後の応答を返し続ける（同じ入力で何度でも再実行できる）。
+          完全一致が無ければ、時刻依存のクエリ (since) だけを除いたキーの記録で代替する
+          (pair 等は残すので別銘柄の記録は返さない)。各記録は一度しか消費しない
+
+カセットは最初に使うとき (create_exchange 等) に読み込む。再生モードでカセットが無ければその時点でエラー。
+
+カセットは追記型のため、記録中にプロセスが落ちても記録済みの分は残る。
+"""
+import gzip
+import json
+import time
+import logging
+import threading
+from collections import defaultdict, deque
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import ccxt
+import requests
+
+from src.config import (
+    EXCHANGE_CASSETTE_MODE, EXCHANGE_CASSETTE_PATH, EXCHANGE_CASSETTE_LATENCY_MS,
+)
+
+logger = logging.getLogger(__name__)
+
+# 再生時に復元するレスポンスヘッダ (Retry-After 等の制御系のみ。容量節約)
+_KEPT_HEADERS = ("Retry-After", "Content-Type")
+# 再生時のフォールバックで無視するクエリ (実行時刻で変わる取得開始時刻)
+_TIME_PARAMS = frozenset({"since"})
+
+
+class CassetteMiss(ccxt.ExchangeError):
+    """再生モードでカセットに該当リクエストがない。リトライしても解決しないため非リトライ扱い。"""
+
+
+class ReplayResponse:
+    """再生用の requests.Response 互換オブジェクト (利用箇所で使う属性のみ)。"""
+
+    def __init__(self, url: str, status: int, headers: dict, text: str):
+        self.url = url
+        self.status_code = status
+        self.headers = requests.structures.CaseInsensitiveDict(headers)
+        self.text = text
+        self.content = text.encode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} (replay): {self.url}", response=self)
+
+
+def _request_key(method: str, url: str, body=None) -> str:
+    key = f"{method.upper()} {url}"
+    if body:
+        key += f" {body}"
+    return key
+
+
+def _loose_key(key: str) -> str:
+    """リクエストキーから時刻依存のクエリ (_TIME_PARAMS) だけを除いたもの。"""
+    method, rest = key.split(" ", 1)
+    url, sep, body = rest.partition(" ")
+    parts = urlsplit(url)
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                       if k not in _TIME_PARAMS])
+    return f"{method} {urlunsplit(parts._replace(query=query))}{sep}{body}"
+
+
+def _rebuild_error(name: str, message: str) -> Exception:
+    cls = getattr(ccxt, name, None) or getattr(requests.exceptions, name, None)
+    if isinstance(cls, type) and issubclass(cls, Exception):
+        return cls(message)
+    return RuntimeError(f"{name}: {message}")
+
+
+class Cassette:
+    """取引所通信の記録/再生を行うトランスポート。"""
+
+    def __init__(self, path, mode: str, latency_ms: float = 0.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"未対応のカセットモード: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.latency = latency_ms / 1000
+        self._lock = threading.Lock()
+        # replay: 記録は1本のリストに置き、キュー (記録の位置) から消費済みを飛ばして取り出す
+        self._records = []
+        self._used = []
+        self._entries = defaultdict(deque)   # key → 記録の位置
+        self._loose = defaultdict(deque)     # 時刻依存クエリ抜きのキー → 記録の位置 (フォールバック)
+        self._final = {}                     # key → そのキーの最後の記録 (使い切った後に返し続ける)
+        self._final_loose = {}
+        if mode == "replay":
+            self._load()
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        logger.info(f"取引所カセット: mode={mode}, path={self.path}")
+
+    @classmethod
+    def from_config(cls):
+        """config の設定からカセットを生成する。無効 (off) なら None。"""
+        if EXCHANGE_CASSETTE_MODE in ("", "off"):
+            return None
+        return cls(EXCHANGE_CASSETTE_PATH, EXCHANGE_CASSETTE_MODE, EXCHANGE_CASSETTE_LATENCY_MS)
+
+    # ── 記録 ──
+
+    def _append(self, entry: dict):
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+
+    # ── 再生 ──
+
+    def _load(self):
+        if not self.path.exists():
+            raise FileNotFoundError(
+                f"再生モード (EXCHANGE_CASSETTE_MODE=replay) のカセットがありません: {self.path} "
+                f"(EXCHANGE_CASSETTE_PATH で指定するか、record モードで記録してください)")
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                i = len(self._records)
+                self._records.append(entry)
+                self._used.append(False)
+                loose = _loose_key(entry["k"])
+                self._entries[entry["k"]].append(i)
+                self._loose[loose].append(i)
+                self._final[entry["k"]] = i
+                self._final_loose[loose] = i
+        logger.info(f"取引所カセットを読込: {len(self._records)}件 ({len(self._entries)}種類のリクエスト)")
+
+    def _take(self, queue):
+        """queue から未消費の記録を1つ取り出して消費済みにする。無ければ None。"""
+        while queue:
+            i = queue.popleft()
+            if not self._used[i]:
+                self._used[i] = True
+                return i
+        return None
+
+    def _next(self, key: str) -> dict:
+        loose = _loose_key(key)
+        with self._lock:
+            i = self._take(self._entries.get(key))
+            if i is None:
+                # since だけが違うなら、同じ銘柄・パラメータの記録で代替
+                i = self._take(self._loose.get(loose))
+                if i is not None:
+                    logger.debug(f"カセット: since 違いを同一リクエストの記録で代替 ({key})")
+            if i is None:
+                i = self._final.get(key, self._final_loose.get(loose))
+        entry = self._records[i] if i is not None else None
+        if entry is None:
+            raise CassetteMiss(f"カセットに記録のないリクエスト: {key}")
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if "e" in entry:
+            raise _rebuild_error(entry["e"], entry.get("m", ""))
+        return entry
+
+    # ── ccxt HTTP 層 ──
+
+    def wrap_exchange(self, exchange):
+        """exchange.fetch を記録/再生トランスポートに差し替える。"""
+        original_fetch = exchange.fetch
+        cassette = self
+
+        def fetch(url, method="GET", headers=None, body=None):
+            key = _request_key(method, url, body)
+            if cassette.mode == "replay":
+                entry = cassette._next(key)
+                exchange.last_response_headers = entry.get("h", {})
+                exchange.last_http_response = entry.get("b")
+                return json.loads(entry["b"]) if entry.get("b") else None
+            try:
+                result = original_fetch(url, method, headers, body)
+            except Exception as e:
+                cassette._append({"k": key, "e": type(e).__name__, "m": str(e)})
+                raise
+            resp_headers = getattr(exchange, "last_response_headers", None) or {}
+            cassette._append({
+                "k": key, "s": 200,
+                "h": {h: resp_headers[h] for h in _KEPT_HEADERS if h in resp_headers},
+                "b": json.dumps(result, separators=(",", ":")),
+            })
+            return result
+
+        exchange.fetch = fetch
+        return exchange
+
+    # ── 生REST ──
+
+    def http_get(self, url: str, params=None, **kwargs):
+        """requests.get 互換。record は実通信+記録、replay は ReplayResponse を返す。"""
+        full_url = requests.Request("GET", url, params=params).prepare().url
+        key = _request_key("GET", full_url)
+        if self.mode == "replay":
+            entry = self._next(key)
+            return ReplayResponse(full_url, entry.get("s", 200), entry.get("h", {}), entry.get("b", ""))
+        try:
+            resp = requests.get(url, params=params, **kwargs)
+        except Exception as e:
+            self._append({"k": key, "e": type(e).__name__, "m": str(e)})
+            raise
+        self._append({
+            "k": key, "s": resp.status_code,
+            "h": {h: resp.headers[h] for h in _KEPT_HEADERS if h in resp.headers},
+            "b": resp.text,
+        })
+        return resp
+
+
+_active = None
+_active_lock = threading.Lock()
+
+
+def active():
+    """設定で有効なカセット (無効なら None)。最初の呼び出しで生成・読込する。"""
+    global _active
+    if EXCHANGE_CASSETTE_MODE in ("", "off"):
+        return None
+    with _active_lock:
+        if _active is None:
+            _active = Cassette.from_config()
+    return _active
+
+
+def replaying() -> bool:
+    """再生モードか (カセットを読み込まずに判定する)。"""
+    return EXCHANGE_CASSETTE_MODE == "replay"
+
+
+def http_get(url: str, **kwargs):
+    """生REST呼び出しの入口。カセット有効時はカセット経由にする。"""
+    cassette = active()
+    if cassette is not None:
+        return cassette.http_get(url, **kwargs)
+    return requests.get(url, **kwargs)
+
+
+def install(exchange):
+    """カセット有効時に ccxt インスタンスの HTTP 層へ差し込む (無効時は何もしない)。"""
+    cassette = active()
+    if cassette is not None:
+        cassette.wrap_exchange(exchange)
+    return exchange
@@ -0,0 +1,104 @@
+"""
+仮想通貨自動売買Bot - 実行チェックポイント (冪等な再実行)
+1回の実行を足の時刻から決まる run_id で識別し、段階の完了を run_checkpoints に記録する。
+同じ run_id で再実行 (ジョブのタイムアウト・再試行・常駐プロセスの再起動) した場合は、
+完了済みの段階を飛ばして続きから再開する。
+
+段階:
+  data_fetched              現在価格 + OHLCV (指標付き) を取得済み
+  signals_computed          全botのシグナル計算済み
+  trades_applied/<bot>      その bot のポジション調整済み
+  snapshot_saved/<bot>      その bot の残高スナップショット保存済み
+  completed                 全段階完了
+
+- 完了の記録は DB (run_checkpoints, DBと一緒にコミットされる)。再開に必要な中身
+  (市場データ・シグナル・約定結果) は CACHE_DIR/runs/<run_id>/ に pickle で置き、
+  無ければその段階をやり直す (データ取得・シグナル計算は DB を変更しないため安全)
+- 残高スナップショットは balances(bot_name, run_id) の一意制約でも二重保存を防ぐ
+- GitHub Actions (collect_and_trade.yml) では、失敗・タイムアウトしても DB のコミットを
+  実行し (if: always())、CACHE_DIR/runs/ は失敗時だけ actions/cache に保存して次の実行で
+  復元する。これで常駐プロセス・ローカル実行と同じく、次の実行が同じ足なら続きから再開できる
+"""
+import pickle
+import shutil
+import logging
+from datetime import datetime, timezone
+
+from src.config import CACHE_DIR, RUN_CHECKPOINT_KEEP_PAYLOADS
+from src.database import get_run_checkpoints, save_run_checkpoint
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_DIR = CACHE_DIR / "runs"
+
+
+def slot_run_id(timeframe_sec: int, now: datetime = None) -> str:
+    """
+    now に最も近い足の境界時刻 (UTC ISO) を run_id とする。
+
+    cron は境界の2分前に起動し、足確定を待つ場合は境界の直後に売買するため、
+    切り捨てではなく最寄りの境界に丸める (どちらの場合も同じ足の run_id になる)。
+    """
+    now = now or datetime.now(timezone.utc)
+    ts = round(now.timestamp() / timeframe_sec) * timeframe_sec
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+def _safe_name(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+
+
+class RunCheckpoint:
+    """1実行 (run_id) の段階完了の記録と、再開用の中身の保存/読込。"""
+
+    def __init__(self, run_id: str, payload_dir=None):
+        self.run_id = run_id
+        self.dir = (payload_dir or PAYLOAD_DIR) / _safe_name(run_id)
+        self.completed = get_run_checkpoints(run_id)  # {stage: completed_at}
+        # 完了済みの実行の結果をそのまま返した (run_cycle が設定する)。
+        # この場合は売買も計測もしていないため、計測の保存・メトリクス出力をしない
+        self.replayed = False
+        if self.completed:
+            logger.info(f"♻️ 実行 {run_id} を再開します (完了済み: {len(self.completed)}段階)")
+
+    def done(self, stage: str) -> bool:
+        return stage in self.completed
+
+    def _path(self, stage: str):
+        return self.dir / f"{_safe_name(stage)}.pkl"
+
+    def mark(self, stage: str, payload=None):
+        """stage の完了を記録する。payload は再開時に load() で読み戻せる。"""
+        if payload is not None:
+            try:
+                self.dir.mkdir(parents=True, exist_ok=True)
+                tmp = self._path(stage).with_suffix(".tmp")
+                with open(tmp, "wb") as f:
+                    pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+                tmp.replace(self._path(stage))
+            except Exception as e:
+                # 中身を残せなくても完了の記録は行う (再開時はその段階をやり直す)
+                logger.warning(f"チェックポイント保存失敗 ({stage}): {e}")
+        self.completed[stage] = save_run_checkpoint(self.run_id, stage)
+
+    def load(self, stage: str):
+        """完了済みの stage の中身を返す。未完了・中身なし・読込失敗は None。"""
+        if not self.done(stage):
+            return None
+        try:
+            with open(self._path(stage), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"チェックポイント読込失敗 ({stage}): {e}")
+            return None
+
+    def prune(self, keep: int = RUN_CHECKPOINT_KEEP_PAYLOADS):
+        """古い実行の中身を削除する (新しい順に keep 件を残す。完了の記録は DB 側で期限削除)。"""
+        if not self.dir.parent.exists():
+            return
+        runs = sorted((p for p in self.dir.parent.iterdir() if p.is_dir()), reverse=True)
+        for old in runs[keep:]:
+            if old != self.dir:
+                shutil.rmtree(old, ignore_errors=True)
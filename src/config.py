@@ -4,21 +4,30 @@
 """
 import os
 import pathlib
-from dotenv import load_dotenv
 
-load_dotenv()
+# .env はローカル実行用 (Actions はシークレットを環境変数で渡す)。
+# 無いときは python-dotenv 自体を import しない (起動時間短縮)
+_ENV_FILE = pathlib.Path(__file__).resolve().parent.parent / ".env"
+if _ENV_FILE.exists():
+    from dotenv import load_dotenv
+    load_dotenv(_ENV_FILE)
 
 # ============================================================
 # 対象銘柄
 # ============================================================
-SYMBOLS = ["BTC/USD", "ETH/USD", "SOL/USD"]
+# 環境変数 SYMBOLS (カンマ区切り) で上書き可能 (モック取引所での銘柄数スケーリング試験用)
+SYMBOLS = [s for s in os.getenv("SYMBOLS", "BTC/USD,ETH/USD,SOL/USD").split(",") if s]
 USD_JPY_TICKER = "USD/JPY"
 FIXED_USD_JPY_RATE = 150.0  # PnL計算用の固定レート（為替変動係数を排除するため）
 
 # ============================================================
 # 取引所設定
 # ============================================================
-EXCHANGE_ID = "kraken"
+EXCHANGE_ID = os.getenv("EXCHANGE_ID", "kraken")
+# API接続先の上書き (例: http://127.0.0.1:8765)。空なら本番。
+# ローカルのモック取引所 scripts/mock_exchange_server.py に向けて負荷試験するため
+EXCHANGE_API_URL = os.getenv("EXCHANGE_API_URL", "")
+FUTURES_API_URL = os.getenv("FUTURES_API_URL", "")
 
 # ============================================================
 # 運用パラメータ
@@ -36,6 +45,11 @@ INTERVAL = "5m"          # 価格記録の足 (prices テーブルの粒度。
 INTERVAL_MINUTES = 5
 HISTORICAL_DAYS = 30
 
+# 過去データのバックフィル: 期間をウィンドウに分割して並列取得し、
+# ウィンドウ完了ごとにDBへチェックポイントする（再実行時は未完了ウィンドウのみ取得）
+BACKFILL_WINDOW_HOURS = 24       # 1ウィンドウの期間 (5分足で288本 ≒ 1ページに収まる)
+BACKFILL_WORKERS = 4             # 同時に取得するウィンドウ数 (共有レートリミッタ配下)
+
 # シグナル計算の足 (2026-07-05 構成見直し①: 取引頻度の削減)
 # 5分足シグナルでは1取引の期待値幅(実測グロス約1.9円/取引)が往復コスト(約20円/取引)の
 # 1/10しかなくコスト負けが構造化していたため、判定を1時間足に変更して保有時間を伸ばす
@@ -48,6 +62,24 @@ MAX_RETRIES = 3
 RETRY_BASE_DELAY = 1
 ANOMALY_THRESHOLD = 0.5
 
+# 外部API呼び出しのレート制限 (エンドポイント系統ごとのトークンバケット)。
+# 現物・先物・生RESTの全リクエストが共有し、並列取得時のバースト/429を防ぐ。
+#   capacity: バースト許容トークン数, rate: 毎秒の補充トークン数
+# 補充速度の倍率 (RATE_LIMIT_SCALE)。モック取引所での負荷試験時のみ引き上げる
+_RATE_LIMIT_SCALE = float(os.getenv("RATE_LIMIT_SCALE", "1"))
+RATE_LIMIT_BUCKETS = {
+    "spot_public": {"capacity": 3, "rate": 1.0 * _RATE_LIMIT_SCALE},     # api.kraken.com 公開API (≈1req/s)
+    "futures_public": {"capacity": 5, "rate": 2.0 * _RATE_LIMIT_SCALE},  # futures.kraken.com 公開API
+    "yahoo_public": {"capacity": 1, "rate": 1.0 * _RATE_LIMIT_SCALE},    # Yahoo Finance (リサーチ用日足)
+}
+# URLパスの部分一致 → 消費トークン数 (未登録は1)。重いエンドポイントほど大きくする
+RATE_LIMIT_WEIGHTS = {
+    "/OHLC": 2,
+    "/AssetPairs": 3,
+    "/Assets": 2,
+    "/instruments": 3,
+}
+
 # ============================================================
 # リスク管理（共通ルール）
 # ============================================================
@@ -70,6 +102,14 @@ REGIME_FILTER_ENABLED = True
 REGIME_SMA_PERIOD = 200            # 1時間足200本 ≈ 8.3日
 REGIME_BEAR_MAX_POSITION = 0.0     # 下落レジーム中は現金退避
 
+# ============================================================
+# bot実行エンジン
+# ============================================================
+# シグナル計算の並列実行方式: thread / process / serial。
+# 書き込み (Simulator) は方式によらず BOT_NAMES 順に単一ライターで直列実行する
+BOT_EXECUTOR = os.getenv("BOT_EXECUTOR", "thread")
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "4"))
+
 # ============================================================
 # 通知設定 (Discord Webhook)
 # ============================================================
@@ -82,6 +122,98 @@ DAILY_REPORT_HOUR = 21
 PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
 DB_PATH = PROJECT_ROOT / "data" / "trading_bot.db"
 
+# ============================================================
+# ローカルキャッシュ
+# ============================================================
+CACHE_DIR = PROJECT_ROOT / "data" / "cache"
+# ccxt のマーケット情報キャッシュ有効期限。Actions の毎回コールドスタートで
+# load_markets (Kraken現物は AssetPairs+Assets の2リクエスト) を省くため
+MARKET_CACHE_TTL_HOURS = 24
+
+# 取引所通信の記録/再生 (カセット)。オフラインでの再現実行・ベンチマーク用
+#   off: 通常通信 / record: 全リクエスト・レスポンスを記録 / replay: カセットから応答
+EXCHANGE_CASSETTE_MODE = os.getenv("EXCHANGE_CASSETTE_MODE", "off")
+EXCHANGE_CASSETTE_PATH = os.getenv(
+    "EXCHANGE_CASSETTE_PATH", str(PROJECT_ROOT / "data" / "cassettes" / "exchange.jsonl.gz"))
+EXCHANGE_CASSETTE_LATENCY_MS = float(os.getenv("EXCHANGE_CASSETTE_LATENCY_MS", "0"))  # 再生時の擬似遅延
+
+# ============================================================
+# 実行スケジューラ (src/scheduler.py)
+# ============================================================
+# 1回の実行予算。collect_and_trade.yml の timeout-minutes: 8 から
+# チェックアウト・依存インストール・DBコミットの所要 (約2.5分) を差し引いた値
+RUN_DEADLINE_SECONDS = float(os.getenv("RUN_DEADLINE_SECONDS", "330"))
+SCHEDULER_RESERVE_SECONDS = 30      # 任意タスクの実行判定で常に残しておく予備
+TRADING_BUDGET_SECONDS = 60         # 売買サイクル (必須) の想定所要
+BAR_CLOSE_GRACE_SECONDS = float(os.getenv("BAR_CLOSE_GRACE_SECONDS", "20"))  # 足確定後、取引所側の集計を待つ猶予
+# シグナル足の確定がこの秒数以内に迫っていれば、確定直後まで待ってから売買する
+BAR_ALIGN_MAX_WAIT_SECONDS = float(os.getenv("BAR_ALIGN_MAX_WAIT_SECONDS", "150"))
+
+# 売買後に残り時間で実行する任意タスク (priority が小さいほど先)。
+# 予算 (想定所要秒数) + 予備が残っていなければ見送り、次回の実行に回す
+OPTIONAL_TASKS = {
+    "ml_retrain": {"priority": 10, "budget_seconds": 5},         # bot #09 の再学習ジョブを起動
+    "dashboard_export": {"priority": 20, "budget_seconds": 20},  # docs/dashboard.json 出力
+    "research_fetch": {"priority": 30, "budget_seconds": 240},   # data/research.db 更新 (1日1回)
+}
+# 有効にする任意タスク (カンマ区切り)。既定は再学習のみ (他は専用ワークフローで実行中)。
+# ml_retrain は再学習ジョブ (scripts/retrain_ml.py) をバックグラウンドで起動するだけで待たない
+ENABLED_OPTIONAL_TASKS = [
+    t.strip() for t in os.getenv("OPTIONAL_TASKS", "ml_retrain").split(",") if t.strip()
+]
+
+# ============================================================
+# 実行時間計測 (src/metrics.py → run_metrics テーブル)
+# ============================================================
+RUN_METRICS_RETENTION_DAYS = 7           # これより古い実行の計測行は保存時に削除
+RUN_METRICS_LABELED_PREFIXES = ("bot.",)  # ラベル (bot名) 別にも保存するスパン名
+RUN_METRICS_HISTORY_RUNS = 96            # ログに出す p50/p95 推移の対象実行数 (≈1日)
+# 取引所 I/O のエンドポイント別レイテンシ・ヒストグラムの上限値 (ms, 累積バケット)
+API_LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# SQLite スロークエリログ (src/query_log.py → query_metrics テーブル)。0 で計測しない
+DB_QUERY_LOG = os.getenv("DB_QUERY_LOG", "1") not in ("", "0")
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "50"))  # 超えたステートメントを警告ログに出す
+# 実行ごとの Prometheus テキスト出力先 (src/metrics_exporter.py)。空文字で出力しない。
+# node_exporter の textfile collector に読ませる場合はそのディレクトリ内の *.prom を指定する
+_METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE", str(PROJECT_ROOT / "data" / "metrics" / "trading_bot.prom"))
+METRICS_TEXTFILE_PATH = pathlib.Path(_METRICS_TEXTFILE) if _METRICS_TEXTFILE else None
+
+# ============================================================
+# 実行チェックポイント (src/checkpoint.py)
+# ============================================================
+# run_id の刻み (= cron の実行間隔)。最寄りの境界時刻が run_id になり、
+# 同じ run_id の再実行は完了済みの段階を飛ばして再開する
+RUN_TIMEFRAME = os.getenv("RUN_TIMEFRAME", "15m")
+RUN_CHECKPOINT_RETENTION_DAYS = 7   # run_checkpoints の保持日数
+RUN_CHECKPOINT_KEEP_PAYLOADS = 4    # 再開用の中身 (data/cache/runs/) を残す実行数
+
+# ============================================================
+# ML モデルの再学習・公開 (bot #09, scripts/retrain_ml.py)
+# ============================================================
+# 再学習は売買と別プロセス (常駐モードはバックグラウンド起動, Actions は ml_retrain.yml) で行い、
+# 版付きファイル + マニフェストの os.replace で公開する。推論側は公開済みの最新版を読むだけ
+ML_MODEL_KEEP_VERSIONS = 3            # 銘柄ごとに残す公開済みモデルの世代数 (読込中の旧版を消さないため2以上)
+ML_RETRAIN_LOCK_STALE_SECONDS = 3600  # 再学習ロックがこれより古ければ異常終了の残骸とみなす
+# ウォークフォワード評価 (src/walk_forward.py, scripts/ml_walk_forward.py)。
+# 各 fold の学習を別プロセスで並列に行う。0 なら CPU コア数
+ML_WALK_FORWARD_WORKERS = int(os.getenv("ML_WALK_FORWARD_WORKERS", "0"))
+ML_WALK_FORWARD_DIR = CACHE_DIR / "ml_walk_forward"  # 予測系列 (CSV) の出力先
+ML_TUNING_CACHE_DIR = CACHE_DIR / "ml_tuning"        # パラメータ探索の評価結果 (fold ごとの JSON)
+# 約定規則 (閾値・最低保有期間) のパラメータ研究 (src/execution_kernel.py, scripts/sweep_execution.py)
+EXECUTION_TARGETS_PATH = CACHE_DIR / "execution_targets.npz"  # 全botの足ごとの target_position
+
+# ============================================================
+# 常駐モード (scripts/run_bots_daemon.py)
+# ============================================================
+# Actions の cron (15分ごと) と同じ刻みで足確定時刻に同期して1サイクル実行する
+DAEMON_TIMEFRAME = os.getenv("DAEMON_TIMEFRAME", "15m")
+DAEMON_GRACE_SECONDS = float(os.getenv("DAEMON_GRACE_SECONDS", str(BAR_CLOSE_GRACE_SECONDS)))
+DAEMON_STATE_PATH = PROJECT_ROOT / "data" / "daemon_state.json"
+# 再起動なしで反映するbot設定の上書き (SIGHUP または更新時刻の変化で再読込)
+#   {"disabled": ["09_ml_gate"], "bots": {"03_bb_zscore": {"params": {...}, "symbols": [...]}}}
+DAEMON_OVERRIDES_PATH = pathlib.Path(
+    os.getenv("DAEMON_OVERRIDES_PATH", str(PROJECT_ROOT / "data" / "bot_overrides.json")))
+
 # ============================================================
 # 10 Bot 定義
 # ============================================================
@@ -194,6 +326,24 @@ BOT_CONFIGS = {
             "min_train_samples": 600,       # 1時間足リサンプリング後の最低学習サンプル数
             "prediction_horizon": 6,        # 予測先行き本数 (1時間足×6 = 6時間)
             "model_dir": "models",
+            # 継続学習: 公開中のモデルから直近の窓で木を追加する (init_model)。
+            # 定期・ドリフト検知・木の上限・継続で悪化した場合は全期間からフル再学習
+            "retrain_mode": "incremental",      # "full" で毎回フル再学習
+            "incremental_window_bars": 240,     # 継続学習に使う直近のシグナル足本数 (新しい足を含む)
+            "incremental_min_new_bars": 6,      # 前回学習以降の確定足がこれ未満なら継続学習しない
+            "incremental_rounds": 50,           # 1回の継続学習で足す木の上限
+            "incremental_tolerance": 0.05,      # 検証誤差が継続元より5%超悪化したらフル再学習
+            "full_rebuild_interval_hours": 168, # フル再学習の間隔 (1週間)
+            "max_model_trees": 1000,            # 木がこれを超える継続学習はせずフル再学習
+            "drift_zscore_threshold": 2.0,      # 新しい足の特徴量平均が基準から何σ動いたらフル再学習
+            "drift_mse_ratio": 2.0,             # 新しい足での誤差が学習時検証誤差の何倍でフル再学習
+            # LightGBM のパラメータ (LGB_PARAMS を上書き)。scripts/tune_ml.py --write が探索結果で書き換える
+            "lgb_params": {
+                "learning_rate": 0.05,
+                "num_leaves": 31,
+                "max_depth": 6,
+                "min_child_samples": 20,
+            },
         },
     },
     "10_deriv": {
@@ -210,4 +360,10 @@ BOT_CONFIGS = {
     },
 }
 
+# 負荷試験用: BOT_SYMBOLS=all で全bot (銘柄固定のペアトレ除く) の対象を SYMBOLS 全体に広げる
+if os.getenv("BOT_SYMBOLS") == "all":
+    for _name, _cfg in BOT_CONFIGS.items():
+        if _name != "07_pair_trade":
+            _cfg["symbols"] = list(SYMBOLS)
+
 BOT_NAMES = list(BOT_CONFIGS.keys())
@@ -1,45 +1,356 @@
 """
 仮想通貨自動売買Bot - データ収集モジュール
 Kraken公開APIからの価格データ取得 + Futures API（funding/OI）対応。
+
+外部APIへのリクエストはすべて共有レートリミッタ (RATE_LIMITER) を経由し、
+その下のトランスポートで記録/再生 (src/cassette.py) を差し込める。
 """
+import os
+import json
 import time
+import random
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
 import ccxt
+import requests
 import pandas as pd
 from datetime import datetime, timezone
 
 from src.config import (
-    EXCHANGE_ID, SYMBOLS, INTERVAL, INTERVAL_MINUTES,
+    EXCHANGE_ID, EXCHANGE_API_URL, FUTURES_API_URL, SYMBOLS, INTERVAL, INTERVAL_MINUTES,
     MAX_RETRIES, RETRY_BASE_DELAY, ANOMALY_THRESHOLD,
+    HISTORICAL_DAYS, BACKFILL_WINDOW_HOURS, BACKFILL_WORKERS,
+    RATE_LIMIT_BUCKETS, RATE_LIMIT_WEIGHTS,
+    CACHE_DIR, MARKET_CACHE_TTL_HOURS,
 )
+from src.database import save_backfill_window, get_backfill_checkpoints, save_prices_bulk
+from src import cassette
+from src.metrics import timed, API_STATS
 
 logger = logging.getLogger(__name__)
 
 
+# ────────────────────────────────────────────
+#  レート制限スケジューラ
+# ────────────────────────────────────────────
+
+class TokenBucket:
+    """
+    スレッドセーフな重み付きトークンバケット。
+
+    トークンは予約制: acquire() はロック内で残量を差し引き（負も可）、
+    不足分が補充されるまでロック外で待機する。Retry-After 受信時は
+    block_for() で補充開始時刻そのものを後ろ倒しにする。
+    """
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = capacity
+        self._updated = time.monotonic()  # _tokens が有効な時刻 (ブロック中は未来)
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(self.capacity,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def acquire(self, weight: float = 1.0) -> float:
+        """weight 分のトークンを取得する。戻り値は待機秒数。"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= weight
+            wait = (self._updated - now) + max(0.0, -self._tokens) / self.rate
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def block_for(self, seconds: float):
+        """seconds 秒間、全利用者の送信を止める (Retry-After 対応)。"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            until = now + seconds
+            if until > self._updated:
+                self._updated = until
+                self._tokens = min(self._tokens, 0.0)
+
+
+class RetryableHTTPError(Exception):
+    """リトライ対象のHTTP応答 (429 / 5xx)。Retry-After を保持する。"""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# リトライ対象の例外 (ccxt.NetworkError は RateLimitExceeded/DDoSProtection/
+# ExchangeNotAvailable/RequestTimeout を含む)
+RETRYABLE_ERRORS = (
+    ccxt.NetworkError,
+    requests.ConnectionError,
+    requests.Timeout,
+    RetryableHTTPError,
+)
+
+
+def _parse_retry_after(value) -> float:
+    """Retry-After ヘッダ (秒数 or HTTP-date) を秒数に変換する。解釈不能なら None。"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        dt = parsedate_to_datetime(str(value))
+        return max(0.0, (dt - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitScheduler:
+    """
+    外部API呼び出しの中央レート制限スケジューラ。
+
+    - bind(): ccxt インスタンスの HTTP 層 (exchange.fetch) を差し替え、
+      ccxt 内部の暗黙リクエスト (load_markets 等) も含めて全送信をバケット経由にする
+    - http_get(): 生REST呼び出し用。429/5xx は RetryableHTTPError に変換
+    - call(): ジッタ付き指数バックオフでのリトライ。Retry-After 受信時は
+      該当系統のバケットを止めるため、並列中の他スレッドも一斉に待機する
+    - 送信ごとにエンドポイント別のレイテンシ・応答サイズ・例外クラスを
+      API_STATS (src/metrics.py) に記録する。リトライは直前に送ったエンドポイントに数える
+    - カセット再生中 (src/cassette.py) はバケットで待たない (Retry-After の一時停止も同様)
+    """
+
+    def __init__(self, buckets: dict, weights: dict = None, stats=API_STATS):
+        self.buckets = {
+            family: TokenBucket(cfg["capacity"], cfg["rate"])
+            for family, cfg in buckets.items()
+        }
+        self.weights = dict(weights or {})
+        self.stats = stats
+        self._local = threading.local()  # スレッドごとの直前の送信先 (リトライの計上先)
+
+    def _weight(self, url: str) -> float:
+        path = str(url).split("?", 1)[0]
+        for fragment, weight in self.weights.items():
+            if fragment in path:
+                return weight
+        return 1
+
+    def acquire(self, family: str, url: str = "") -> float:
+        if cassette.replaying():
+            # 再生は実通信しないので取引所の制限は掛けない (遅延はカセットの擬似遅延だけにする)
+            return 0.0
+        return self.buckets[family].acquire(self._weight(url))
+
+    def _endpoint(self, family: str, url: str) -> str:
+        endpoint = f"{family} {urlsplit(str(url)).path}"
+        self._local.endpoint = endpoint
+        return endpoint
+
+    def block(self, family: str, seconds: float):
+        if seconds and seconds > 0 and not cassette.replaying():
+            logger.warning(f"[{family}] Retry-After={seconds:.1f}秒: 送信を一時停止します")
+            self.buckets[family].block_for(seconds)
+
+    def bind(self, exchange, family: str):
+        """ccxt インスタンスの全HTTPリクエストを family のバケット経由にする。"""
+        original_fetch = exchange.fetch
+        scheduler = self
+
+        def fetch(url, method="GET", headers=None, body=None):
+            endpoint = scheduler._endpoint(family, url)
+            throttle = scheduler.acquire(family, url)
+            start = time.perf_counter()
+            try:
+                result = original_fetch(url, method, headers, body)
+            except Exception as e:
+                scheduler.stats.record_request(endpoint, time.perf_counter() - start,
+                                               error=type(e).__name__, throttle=throttle)
+                if isinstance(e, ccxt.NetworkError):
+                    resp_headers = getattr(exchange, "last_response_headers", None) or {}
+                    scheduler.block(family, _parse_retry_after(resp_headers.get("Retry-After")))
+                raise
+            # 応答本文 (ccxt が保持する直近の生レスポンス) の長さをサイズとする
+            nbytes = len(getattr(exchange, "last_http_response", None) or "")
+            scheduler.stats.record_request(endpoint, time.perf_counter() - start, nbytes,
+                                           throttle=throttle)
+            return result
+
+        exchange.fetch = fetch
+        exchange.rate_limit_family = family
+        return exchange
+
+    def http_get(self, family: str, url: str, **kwargs):
+        """バケット経由で requests.get する。429/5xx は RetryableHTTPError を送出。"""
+        endpoint = self._endpoint(family, url)
+        throttle = self.acquire(family, url)
+        start = time.perf_counter()
+        try:
+            resp = cassette.http_get(url, **kwargs)
+        except Exception as e:
+            self.stats.record_request(endpoint, time.perf_counter() - start,
+                                      error=type(e).__name__, throttle=throttle)
+            raise
+        elapsed = time.perf_counter() - start
+        error = f"HTTP{resp.status_code}" if resp.status_code >= 400 else None
+        self.stats.record_request(endpoint, elapsed, len(resp.content or b""), error, throttle)
+        if resp.status_code == 429 or resp.status_code >= 500:
+            retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+            self.block(family, retry_after)
+            raise RetryableHTTPError(f"HTTP {resp.status_code}: {url}", retry_after)
+        resp.raise_for_status()
+        return resp
+
+    def call(self, fn, *args, label: str = "", retries: int = MAX_RETRIES, **kwargs):
+        """
+        fn をリトライ付きで実行する。リトライ対象外の例外と、
+        最終試行の例外はそのまま呼び出し元へ送出する。
+        """
+        for attempt in range(retries):
+            try:
+                return fn(*args, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt + 1 >= retries:
+                    raise
+                self.stats.record_retry(getattr(self._local, "endpoint", label or "unknown"))
+                # フルジッタ: 同時失敗したスレッドのリトライ時刻を分散させる
+                delay = random.uniform(0.5, 1.5) * RETRY_BASE_DELAY * (2 ** attempt)
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after:
+                    delay = max(delay, retry_after)
+                logger.warning(
+                    f"{label}失敗 (試行{attempt + 1}/{retries}): {e}. "
+                    f"{delay:.1f}秒後にリトライ..."
+                )
+                time.sleep(delay)
+
+
+RATE_LIMITER = RateLimitScheduler(RATE_LIMIT_BUCKETS, RATE_LIMIT_WEIGHTS)
+
+
+# ────────────────────────────────────────────
+#  マーケット情報キャッシュ
+# ────────────────────────────────────────────
+
+# fetch_markets が markets 以外に書き込む options キー (キャッシュ復元時に併せて戻す)
+_MARKET_CACHE_OPTION_KEYS = ("marketsByAltname",)
+
+
+def _market_cache_path(exchange):
+    default_type = exchange.options.get("defaultType", "spot")
+    name = f"markets_{exchange.id}_{default_type}"
+    override = getattr(exchange, "api_url_override", "")
+    if override:
+        # 接続先を上書きしている場合 (モック取引所) は本番のキャッシュと混ぜない
+        name += "_" + urlsplit(override).netloc.replace(":", "_")
+    return CACHE_DIR / f"{name}.json"
+
+
+def _load_markets_cached(exchange, ttl_hours=MARKET_CACHE_TTL_HOURS):
+    """
+    マーケット情報をキャッシュファイルから注入する。期限切れ/未作成なら
+    load_markets して書き出す。失敗時は ccxt の遅延ロード (初回API呼び出し時) に任せる。
+    """
+    if cassette.active() is not None:
+        # 記録/再生中はマーケット情報もカセットに含める (実行環境のキャッシュ有無で入力を変えない)
+        return exchange
+
+    path = _market_cache_path(exchange)
+    try:
+        if path.exists() and time.time() - path.stat().st_mtime < ttl_hours * 3600:
+            with open(path, encoding="utf-8") as f:
+                cached = json.load(f)
+            exchange.set_markets(cached["markets"], cached.get("currencies"))
+            exchange.options.update(cached.get("options", {}))
+            return exchange
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"[{exchange.id}] マーケットキャッシュ読込失敗 (再取得します): {e}")
+
+    try:
+        RATE_LIMITER.call(exchange.load_markets, label=f"[{exchange.id}] マーケット情報取得")
+    except Exception as e:
+        logger.warning(f"[{exchange.id}] マーケット情報取得失敗 (初回呼び出し時に再試行): {e}")
+        return exchange
+
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "markets": exchange.markets,
+            "currencies": exchange.currencies,
+            "options": {k: exchange.options[k]
+                        for k in _MARKET_CACHE_OPTION_KEYS if k in exchange.options},
+        }
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, default=str)
+        os.replace(tmp, path)  # 並行実行中の読み手に書きかけを見せない
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"[{exchange.id}] マーケットキャッシュ書込失敗: {e}")
+    return exchange
+
+
+def _override_api_urls(exchange, base_url):
+    """exchange.urls["api"] の全エンドポイントのスキーム+ホストを base_url に置き換える。"""
+    if not base_url:
+        return exchange
+    base = base_url.rstrip("/")
+    api = exchange.urls.get("api")
+    if isinstance(api, dict):
+        exchange.urls["api"] = {
+            key: base + urlsplit(url).path if isinstance(url, str) else url
+            for key, url in api.items()
+        }
+    elif isinstance(api, str):
+        exchange.urls["api"] = base + urlsplit(api).path
+    exchange.api_url_override = base
+    return exchange
+
+
+def _futures_rest_base():
+    return (FUTURES_API_URL or "https://futures.kraken.com").rstrip("/")
+
+
 def create_exchange():
-    """CCXT取引所インスタンスを生成する（現物用）。"""
+    """CCXT取引所インスタンスを生成する（現物用）。マーケット情報はキャッシュから注入。"""
     exchange_class = getattr(ccxt, EXCHANGE_ID)
+    # レート制限は RATE_LIMITER に一元化する (ccxt 内蔵スロットルとの二重待機を避ける)
     exchange = exchange_class({
-        "enableRateLimit": True,
+        "enableRateLimit": False,
     })
-    return exchange
+    _override_api_urls(exchange, EXCHANGE_API_URL)
+    cassette.install(exchange)
+    RATE_LIMITER.bind(exchange, "spot_public")
+    return _load_markets_cached(exchange)
 
 
 def create_futures_exchange():
-    """CCXT先物取引所インスタンスを生成する（funding/OI取得用）。"""
+    """CCXT先物取引所インスタンスを生成する（funding/OI取得用）。マーケット情報はキャッシュから注入。"""
     try:
         exchange = ccxt.krakenfutures({
-            "enableRateLimit": True,
+            "enableRateLimit": False,
         })
-        return exchange
+        _override_api_urls(exchange, FUTURES_API_URL)
+        cassette.install(exchange)
+        RATE_LIMITER.bind(exchange, "futures_public")
     except Exception:
         # fallback: 同一取引所で future オプション
         exchange_class = getattr(ccxt, EXCHANGE_ID)
         exchange = exchange_class({
-            "enableRateLimit": True,
+            "enableRateLimit": False,
             "options": {"defaultType": "future"},
         })
-        return exchange
+        _override_api_urls(exchange, EXCHANGE_API_URL)
+        cassette.install(exchange)
+        RATE_LIMITER.bind(exchange, "spot_public")
+    return _load_markets_cached(exchange)
 
 
 def fetch_current_prices(exchange=None):
@@ -60,6 +371,7 @@ def fetch_current_prices(exchange=None):
     return results
 
 
+@timed("api.usd_jpy")
 def fetch_usd_jpy_rate(exchange=None):
     """
     Krakenから現在のUSD/JPYレートを取得する。
@@ -71,7 +383,8 @@ def fetch_usd_jpy_rate(exchange=None):
         exchange = create_exchange()
 
     try:
-        ticker = exchange.fetch_ticker(USD_JPY_TICKER)
+        ticker = RATE_LIMITER.call(
+            exchange.fetch_ticker, USD_JPY_TICKER, label="[USD/JPY] レート取得")
         price = ticker["last"]
         if price and price > 0:
             return price
@@ -81,6 +394,7 @@ def fetch_usd_jpy_rate(exchange=None):
     return USD_JPY_RATE  # フォールバック
 
 
+@timed("api.ohlcv")
 def fetch_ohlcv(exchange, symbol, timeframe="5m", since=None, limit=500):
     """
     指定銘柄のOHLCVデータを取得する。
@@ -88,32 +402,102 @@ def fetch_ohlcv(exchange, symbol, timeframe="5m", since=None, limit=500):
     Returns:
         pd.DataFrame: OHLCV データフレーム
     """
-    for attempt in range(MAX_RETRIES):
-        try:
-            ohlcv = exchange.fetch_ohlcv(
-                symbol, timeframe=timeframe, since=since, limit=limit
-            )
-            df = pd.DataFrame(
-                ohlcv,
-                columns=["timestamp", "open", "high", "low", "close", "volume"],
-            )
-            df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True)
-            df["symbol"] = symbol
-            return df
+    try:
+        ohlcv = RATE_LIMITER.call(
+            exchange.fetch_ohlcv, symbol, timeframe=timeframe, since=since, limit=limit,
+            label=f"[{symbol}] OHLCV取得",
+        )
+    except RETRYABLE_ERRORS:
+        logger.error(f"[{symbol}] OHLCV取得に{MAX_RETRIES}回失敗しました。")
+        return None
+    except ccxt.ExchangeError as e:
+        logger.error(f"[{symbol}] 取引所エラー: {e}")
+        return None
 
-        except (ccxt.NetworkError, ccxt.ExchangeNotAvailable) as e:
-            delay = RETRY_BASE_DELAY * (2 ** attempt)
-            logger.warning(
-                f"[{symbol}] OHLCV取得失敗 (試行{attempt + 1}/{MAX_RETRIES}): {e}. "
-                f"{delay}秒後にリトライ..."
-            )
-            time.sleep(delay)
-        except ccxt.ExchangeError as e:
-            logger.error(f"[{symbol}] 取引所エラー: {e}")
-            return None
+    df = pd.DataFrame(
+        ohlcv,
+        columns=["timestamp", "open", "high", "low", "close", "volume"],
+    )
+    df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True)
+    df["symbol"] = symbol
+    return df
 
-    logger.error(f"[{symbol}] OHLCV取得に{MAX_RETRIES}回失敗しました。")
-    return None
+
+class BarCache:
+    """
+    (銘柄, 足) ごとの生OHLCVをメモリに保持し、2回目以降は差分だけ取得する (常駐プロセス用)。
+
+    直近の足は形成中の可能性があるため、キャッシュ末尾の足から取り直して上書きする。
+    指標列は持たない (呼び出し側で毎回 add_core_indicators を掛ける)。
+
+    since 指定の取得は since から先頭 limit 本しか返らないため、キャッシュ末尾から現在まで
+    limit 本以上空いている (停止が長かった) ときはキャッシュを捨てて直近 limit 本を取り直す。
+    load() で読み戻したキャッシュも max_bars 本分より古いものは捨てる。
+    """
+
+    def __init__(self, max_bars: int = 500):
+        self.max_bars = max_bars
+        self._frames = {}
+
+    @staticmethod
+    def _bars_since(frame: pd.DataFrame, timeframe: str) -> float:
+        """frame の最後の足から現在までの足数。"""
+        elapsed = datetime.now(timezone.utc) - frame["timestamp"].iloc[-1].to_pydatetime()
+        return elapsed.total_seconds() / ccxt.Exchange.parse_timeframe(timeframe)
+
+    def fetch(self, exchange, symbol, timeframe="5m", limit=500):
+        key = (symbol, timeframe)
+        cached = self._frames.get(key)
+        if cached is not None and not cached.empty and self._bars_since(cached, timeframe) >= limit:
+            logger.info(f"[{symbol}] バーキャッシュが {limit} 本以上古いため取り直します ({timeframe})")
+            cached = None
+        if cached is None or cached.empty:
+            df = fetch_ohlcv(exchange, symbol, timeframe=timeframe, limit=limit)
+        else:
+            since = int(cached["timestamp"].iloc[-1].timestamp() * 1000)
+            new = fetch_ohlcv(exchange, symbol, timeframe=timeframe, since=since, limit=limit)
+            if new is None or new.empty:
+                return cached.copy()
+            df = pd.concat(
+                [cached[cached["timestamp"] < new["timestamp"].iloc[0]], new],
+                ignore_index=True,
+            )
+        if df is None or df.empty:
+            return df
+        df = df.drop_duplicates("timestamp", keep="last").tail(self.max_bars).reset_index(drop=True)
+        self._frames[key] = df
+        return df.copy()
+
+    def clear(self):
+        self._frames.clear()
+
+    def save(self, path):
+        """キャッシュ内容を pickle で書き出す (一時ファイル経由で置き換え)。"""
+        path = str(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        pd.to_pickle(self._frames, tmp)
+        os.replace(tmp, path)
+
+    def load(self, path) -> bool:
+        """save() の内容を読み戻す。ファイルが無い・壊れている場合は False。"""
+        try:
+            frames = pd.read_pickle(str(path))
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"バーキャッシュ読込失敗 (破棄して再取得します): {e}")
+            self._frames = {}
+            return False
+        # 停止中に max_bars 本以上進んだ (symbol, 足) は使い物にならないので捨てる
+        self._frames = {
+            key: frame for key, frame in frames.items()
+            if not frame.empty and self._bars_since(frame, key[1]) < self.max_bars
+        }
+        dropped = len(frames) - len(self._frames)
+        if dropped:
+            logger.info(f"バーキャッシュ: 古い {dropped} 件を破棄 ({self.max_bars} 本以上前)")
+        return True
 
 
 def fetch_historical_data(exchange, symbol, days=30, timeframe="5m"):
@@ -142,8 +526,6 @@ def fetch_historical_data(exchange, symbol, days=30, timeframe="5m"):
         if last_ts >= int(datetime.now(timezone.utc).timestamp() * 1000):
             break
 
-        time.sleep(exchange.rateLimit / 1000)
-
     if all_data:
         result = pd.concat(all_data, ignore_index=True)
         result = result.drop_duplicates(subset=["timestamp", "symbol"])
@@ -155,6 +537,131 @@ def fetch_historical_data(exchange, symbol, days=30, timeframe="5m"):
     return pd.DataFrame()
 
 
+# ────────────────────────────────────────────
+#  バックフィル (ウィンドウ分割・並列・再開可能)
+# ────────────────────────────────────────────
+
+def _to_epoch_ms(timestamps: pd.Series) -> pd.Series:
+    """tz-aware の timestamp 列をエポックミリ秒に変換する。"""
+    return (timestamps - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(milliseconds=1)
+
+
+def _ms_to_iso(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).isoformat()
+
+
+def _fetch_window(exchange, symbol, timeframe, start_ms, end_ms):
+    """
+    [start_ms, end_ms) の1ウィンドウをページングで取得する。
+
+    Returns:
+        pd.DataFrame: ウィンドウ内のOHLCV (0件なら空)。取得失敗時は None
+    """
+    tf_ms = exchange.parse_timeframe(timeframe) * 1000
+    frames = []
+    since = start_ms
+    while since < end_ms:
+        df = fetch_ohlcv(exchange, symbol, timeframe=timeframe, since=since, limit=1000)
+        if df is None:
+            return None
+        if df.empty:
+            break
+        ts_ms = _to_epoch_ms(df["timestamp"])
+        frames.append(df[(ts_ms >= start_ms) & (ts_ms < end_ms)])
+        last_ts = int(ts_ms.max())
+        if last_ts < since or last_ts >= end_ms - tf_ms:
+            break
+        since = last_ts + 1
+
+    if not frames:
+        return pd.DataFrame()
+    result = pd.concat(frames, ignore_index=True)
+    return result.drop_duplicates(subset=["timestamp", "symbol"]).sort_values("timestamp")
+
+
+def backfill_historical_data(exchange, symbol, days=HISTORICAL_DAYS, timeframe="5m",
+                             window_hours=BACKFILL_WINDOW_HOURS, workers=BACKFILL_WORKERS):
+    """
+    過去データをウィンドウ分割・並列取得し、ウィンドウ完了ごとにDBへ保存する。
+
+    - 送信ペースは共有レートリミッタ (RATE_LIMITER) が全ワーカー横断で制御する
+    - ウィンドウ境界はエポック基準で固定するため、再実行しても同じウィンドウに分割される
+    - 完了済みウィンドウ (backfill_checkpoints) はスキップ → クラッシュ後も続きから再開
+    - 終端が現在時刻を越えるウィンドウは未確定足を含むため、価格は保存するが完了扱いにしない
+    - 取引所が古い期間を返さない場合 (Kraken OHLCは直近720本程度まで) は0件で完了扱いとし、
+      以後の再実行で無駄に取りに行かない。0件で完了扱いにするのは、この実行で取得できた
+      最古の足より前に終わるウィンドウだけ (取得範囲内の0件は一時的な欠落として再実行で取り直す)
+
+    Returns:
+        int: 保存した行数
+    """
+    window_ms = int(window_hours * 3600 * 1000)
+    now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+    start_ms = now_ms - int(pd.Timedelta(days=days).total_seconds() * 1000)
+    first = (start_ms // window_ms) * window_ms
+
+    done = get_backfill_checkpoints(symbol, timeframe)
+    windows = [
+        (s, s + window_ms)
+        for s in range(first, now_ms, window_ms)
+        if _ms_to_iso(s) not in done
+    ]
+    total_windows = (now_ms - first + window_ms - 1) // window_ms
+    logger.info(
+        f"[{symbol}] 過去{days}日分をバックフィル: {len(windows)}/{total_windows}ウィンドウ "
+        f"(完了済み{total_windows - len(windows)}件をスキップ, 並列数={workers})"
+    )
+    if not windows:
+        return 0
+
+    saved = 0
+    failed = 0
+    empty = []  # 0件だった確定済みウィンドウ (最古の足が分かってから完了扱いを判断する)
+    oldest_ms = None  # この実行で取引所が返した最古の足
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_fetch_window, exchange, symbol, timeframe, s, e): (s, e)
+            for s, e in windows
+        }
+        for future in as_completed(futures):
+            s, e = futures[future]
+            try:
+                df = future.result()
+            except Exception as ex:
+                logger.warning(f"[{symbol}] ウィンドウ {_ms_to_iso(s)} 取得エラー: {ex}")
+                df = None
+            if df is None:
+                failed += 1
+                continue
+            if not df.empty:
+                first_ms = int(_to_epoch_ms(df["timestamp"]).min())
+                oldest_ms = first_ms if oldest_ms is None else min(oldest_ms, first_ms)
+            if e <= now_ms and df.empty:
+                empty.append((s, e))
+            elif e <= now_ms:
+                if save_backfill_window(df, symbol, timeframe, _ms_to_iso(s), _ms_to_iso(e)):
+                    saved += len(df)
+                else:
+                    failed += 1
+            elif not df.empty:
+                save_prices_bulk(df)
+                saved += len(df)
+
+    unconfirmed = 0
+    for s, e in empty:
+        if oldest_ms is None or e > oldest_ms:
+            unconfirmed += 1  # 取得範囲内の0件: 完了扱いにせず再実行で取り直す
+        elif not save_backfill_window(None, symbol, timeframe, _ms_to_iso(s), _ms_to_iso(e)):
+            failed += 1
+
+    logger.info(
+        f"[{symbol}] バックフィル完了: {saved}件保存, 失敗ウィンドウ{failed}件"
+        + (f", 0件で未確定のウィンドウ{unconfirmed}件" if unconfirmed else "")
+        + (" (再実行で続きから再開)" if failed or unconfirmed else "")
+    )
+    return saved
+
+
 # ────────────────────────────────────────────
 #  デリバティブ情報取得 (Bot #10用)
 # ────────────────────────────────────────────
@@ -172,6 +679,7 @@ def _to_perpetual_symbol(symbol: str) -> str:
     return symbol
 
 
+@timed("api.funding_rate")
 def fetch_funding_rate(exchange_futures=None, symbol="BTC/USD"):
     """
     Funding rate を取得する (Kraken Futures)。
@@ -188,7 +696,10 @@ def fetch_funding_rate(exchange_futures=None, symbol="BTC/USD"):
     perp_symbol = _to_perpetual_symbol(symbol)
 
     try:
-        funding = exchange_futures.fetch_funding_rate(perp_symbol)
+        funding = RATE_LIMITER.call(
+            exchange_futures.fetch_funding_rate, perp_symbol,
+            label=f"[{symbol}→{perp_symbol}] Funding rate取得",
+        )
         return {
             "funding_rate": funding.get("fundingRate", 0) or 0,
             "timestamp": funding.get("timestamp", datetime.now(timezone.utc).isoformat()),
@@ -199,6 +710,7 @@ def fetch_funding_rate(exchange_futures=None, symbol="BTC/USD"):
         return None
 
 
+@timed("api.open_interest")
 def fetch_open_interest(exchange_futures=None, symbol="BTC/USD"):
     """
     Open Interest (未決済建玉) を取得する。
@@ -215,16 +727,16 @@ def fetch_open_interest(exchange_futures=None, symbol="BTC/USD"):
     Returns:
         dict: {"open_interest": float, "timestamp": str} or None
     """
-    import requests
-
     base = symbol.split("/")[0].split(":")[0].upper()
     base = {"BTC": "XBT"}.get(base, base)
     instrument = f"PF_{base}USD"  # 例: PF_XBTUSD (linear multi-collateral perp)
 
     try:
-        resp = requests.get(
-            "https://futures.kraken.com/derivatives/api/v3/tickers", timeout=10)
-        resp.raise_for_status()
+        resp = RATE_LIMITER.call(
+            RATE_LIMITER.http_get, "futures_public",
+            f"{_futures_rest_base()}/derivatives/api/v3/tickers", timeout=10,
+            label=f"[{symbol}→{instrument}] Open Interest取得",
+        )
         for t in resp.json().get("tickers", []):
             if str(t.get("symbol", "")).upper() == instrument:
                 amount = float(t.get("openInterest") or 0)
@@ -248,40 +760,33 @@ def fetch_open_interest(exchange_futures=None, symbol="BTC/USD"):
 #  内部ヘルパー
 # ────────────────────────────────────────────
 
+@timed("api.ticker")
 def _fetch_ticker_with_retry(exchange, symbol):
-    """指数バックオフ方式でticker取得をリトライする。"""
-    for attempt in range(MAX_RETRIES):
-        try:
-            ticker = exchange.fetch_ticker(symbol)
-            price = ticker["last"]
-
-            if price is None or price <= 0:
-                logger.warning(f"[{symbol}] 無効な価格: {price}")
-                return None
-
-            return {
-                "price": price,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "volume": ticker.get("quoteVolume", 0),
-                "bid": ticker.get("bid", 0),
-                "ask": ticker.get("ask", 0),
-                "high": ticker.get("high", 0),
-                "low": ticker.get("low", 0),
-            }
-
-        except (ccxt.NetworkError, ccxt.ExchangeNotAvailable) as e:
-            delay = RETRY_BASE_DELAY * (2 ** attempt)
-            logger.warning(
-                f"[{symbol}] 価格取得失敗 (試行{attempt + 1}/{MAX_RETRIES}): {e}. "
-                f"{delay}秒後にリトライ..."
-            )
-            time.sleep(delay)
-        except ccxt.ExchangeError as e:
-            logger.error(f"[{symbol}] 取引所エラー: {e}")
-            return None
+    """ジッタ付き指数バックオフでticker取得をリトライする。"""
+    try:
+        ticker = RATE_LIMITER.call(
+            exchange.fetch_ticker, symbol, label=f"[{symbol}] 価格取得")
+    except RETRYABLE_ERRORS:
+        logger.error(f"[{symbol}] 価格取得に{MAX_RETRIES}回失敗しました。")
+        return None
+    except ccxt.ExchangeError as e:
+        logger.error(f"[{symbol}] 取引所エラー: {e}")
+        return None
+
+    price = ticker["last"]
+    if price is None or price <= 0:
+        logger.warning(f"[{symbol}] 無効な価格: {price}")
+        return None
 
-    logger.error(f"[{symbol}] 価格取得に{MAX_RETRIES}回失敗しました。")
-    return None
+    return {
+        "price": price,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "volume": ticker.get("quoteVolume", 0),
+        "bid": ticker.get("bid", 0),
+        "ask": ticker.get("ask", 0),
+        "high": ticker.get("high", 0),
+        "low": ticker.get("low", 0),
+    }
 
 
 def validate_price_change(current_price, previous_price):
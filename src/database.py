@@ -2,24 +2,35 @@
 仮想通貨自動売買Bot - データベースモジュール
 10bot・target_position アーキテクチャ対応版
 """
+import json
 import sqlite3
+import hashlib
 import logging
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 
-from src.config import DB_PATH, INITIAL_BALANCE, BOT_NAMES
+from src.config import (
+    DB_PATH, INITIAL_BALANCE, BOT_NAMES, RUN_METRICS_RETENTION_DAYS, DB_QUERY_LOG,
+    RUN_CHECKPOINT_RETENTION_DAYS,
+)
+from src.metrics import timed
+from src.query_log import InstrumentedConnection
 
 logger = logging.getLogger(__name__)
 
 
+@timed("db.connect")
 def get_connection():
     """SQLiteデータベース接続を取得する。"""
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(DB_PATH))
+    # DB_QUERY_LOG 有効時はステートメントごとの所要時間・呼び出し元を記録する (src/query_log.py)
+    factory = InstrumentedConnection if DB_QUERY_LOG else sqlite3.Connection
+    conn = sqlite3.connect(str(DB_PATH), factory=factory)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
     return conn
 
 
+@timed("db.init_database")
 def init_database():
     """テーブルを初期化する（存在しない場合のみ作成）。"""
     conn = get_connection()
@@ -73,9 +84,18 @@ def init_database():
             daily_pnl REAL DEFAULT 0,
             total_pnl REAL DEFAULT 0,
             trade_count INTEGER DEFAULT 0,
-            is_active INTEGER DEFAULT 1
+            is_active INTEGER DEFAULT 1,
+            run_id TEXT
         )
     """)
+    # 既存DBへの列追加 (run_id 導入前に作成されたテーブル)
+    columns = {r["name"] for r in cursor.execute("PRAGMA table_info(balances)").fetchall()}
+    if "run_id" not in columns:
+        cursor.execute("ALTER TABLE balances ADD COLUMN run_id TEXT")
+    # 1実行 × bot で1行 (run_id が NULL の旧データは対象外)
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_balances_run ON balances(bot_name, run_id)"
+    )
 
     # ボット状態テーブル
     cursor.execute("""
@@ -99,6 +119,112 @@ def init_database():
         )
     """)
 
+    # バックフィル進捗テーブル (完了ウィンドウのチェックポイント)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+            symbol TEXT NOT NULL,
+            timeframe TEXT NOT NULL,
+            window_start TEXT NOT NULL,
+            window_end TEXT NOT NULL,
+            rows INTEGER DEFAULT 0,
+            completed_at TEXT NOT NULL,
+            PRIMARY KEY(symbol, timeframe, window_start)
+        )
+    """)
+
+    # 実行時間計測テーブル (1実行 × スパン名 × ラベルで1行に集計済み)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS run_metrics (
+            run_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            label TEXT NOT NULL DEFAULT '',
+            count INTEGER NOT NULL,
+            total_ms REAL NOT NULL,
+            p50_ms REAL,
+            p95_ms REAL,
+            max_ms REAL,
+            PRIMARY KEY(run_id, name, label)
+        )
+    """)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_run_metrics_name ON run_metrics(name, label, run_id)"
+    )
+
+    # 取引所 I/O 統計 (1実行 × エンドポイントで1行。histogram / error_classes は JSON)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS api_metrics (
+            run_id TEXT NOT NULL,
+            endpoint TEXT NOT NULL,
+            requests INTEGER NOT NULL,
+            errors INTEGER NOT NULL DEFAULT 0,
+            retries INTEGER NOT NULL DEFAULT 0,
+            bytes INTEGER NOT NULL DEFAULT 0,
+            throttle_ms REAL NOT NULL DEFAULT 0,
+            total_ms REAL NOT NULL,
+            p50_ms REAL,
+            p95_ms REAL,
+            max_ms REAL,
+            histogram TEXT,
+            error_classes TEXT,
+            PRIMARY KEY(run_id, endpoint)
+        )
+    """)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_api_metrics_endpoint ON api_metrics(endpoint, run_id)"
+    )
+
+    # 実行チェックポイント (src/checkpoint.py。1実行 × 段階で1行)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS run_checkpoints (
+            run_id TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            completed_at TEXT NOT NULL,
+            PRIMARY KEY(run_id, stage)
+        )
+    """)
+
+    # SQLite ステートメント統計 (1実行 × 呼び出し元 × SQL で1行)。
+    # DB は定期的にコミットされるため、SQL 本文は query_texts に1回だけ置き、ここはハッシュで持つ。
+    # SQL 本文を持っていた旧形式の表は作り直す (診断用の短期集計のため移行しない)
+    columns = {r["name"] for r in cursor.execute("PRAGMA table_info(query_metrics)").fetchall()}
+    if "sql" in columns:
+        cursor.execute("DROP TABLE query_metrics")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS query_texts (
+            sql_hash TEXT PRIMARY KEY,
+            sql TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS query_metrics (
+            run_id TEXT NOT NULL,
+            call_site TEXT NOT NULL,
+            sql_hash TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            rows INTEGER NOT NULL DEFAULT 0,
+            total_ms REAL NOT NULL,
+            p95_ms REAL,
+            max_ms REAL,
+            slow INTEGER NOT NULL DEFAULT 0,
+            full_scan TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY(run_id, call_site, sql_hash)
+        )
+    """)
+
+    # bot #09 の特徴量ストア (確定足ごとに1行。features は {特徴量名: 値} の JSON)。
+    # 主キーは (銘柄, 足, 特徴量セット版) で絞って bar_ts 順に読む並び
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ml_features (
+            symbol TEXT NOT NULL,
+            timeframe TEXT NOT NULL,
+            feature_set_version INTEGER NOT NULL,
+            bar_ts TEXT NOT NULL,
+            close REAL NOT NULL,
+            features TEXT NOT NULL,
+            PRIMARY KEY(symbol, timeframe, feature_set_version, bar_ts)
+        )
+    """)
+
     conn.commit()
 
     # 初期状態がなければ挿入 (10bot分)
@@ -123,6 +249,7 @@ def init_database():
 #  価格データ
 # ────────────────────────────────────────────
 
+@timed("db.save_price")
 def save_price(timestamp, symbol, open_p, high, low, close, volume):
     """価格データを1件保存する。"""
     conn = get_connection()
@@ -140,6 +267,7 @@ def save_price(timestamp, symbol, open_p, high, low, close, volume):
         conn.close()
 
 
+@timed("db.save_prices_bulk")
 def save_prices_bulk(df):
     """DataFrameから価格データを一括保存する。"""
     conn = get_connection()
@@ -167,6 +295,67 @@ def save_prices_bulk(df):
         conn.close()
 
 
+@timed("db.save_backfill_window")
+def save_backfill_window(df, symbol, timeframe, window_start, window_end):
+    """
+    バックフィル1ウィンドウ分の価格データとチェックポイントを同一トランザクションで保存する。
+
+    価格だけ保存されてチェックポイントが残らない（またはその逆）状態を作らないため、
+    どちらかが失敗した場合はロールバックする。
+
+    Returns:
+        bool: 保存に成功したか
+    """
+    conn = get_connection()
+    try:
+        rows = [
+            (
+                ts.isoformat() if hasattr(ts, "isoformat") else str(ts),
+                symbol, o, h, l, c, v,
+            )
+            for ts, o, h, l, c, v in zip(
+                df["timestamp"], df["open"], df["high"], df["low"],
+                df["close"], df["volume"],
+            )
+        ] if df is not None and not df.empty else []
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO prices "
+                "(timestamp, symbol, open, high, low, close, volume) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO backfill_checkpoints "
+                "(symbol, timeframe, window_start, window_end, rows, completed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (symbol, timeframe, window_start, window_end, len(rows),
+                 datetime.now(timezone.utc).isoformat()),
+            )
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"[{symbol}] バックフィル保存エラー ({window_start}): {e}")
+        return False
+    finally:
+        conn.close()
+
+
+@timed("db.get_backfill_checkpoints")
+def get_backfill_checkpoints(symbol, timeframe):
+    """完了済みバックフィルウィンドウの開始時刻(ISO文字列)の集合を返す。"""
+    conn = get_connection()
+    try:
+        cursor = conn.execute(
+            "SELECT window_start FROM backfill_checkpoints "
+            "WHERE symbol = ? AND timeframe = ?",
+            (symbol, timeframe),
+        )
+        return {row["window_start"] for row in cursor.fetchall()}
+    finally:
+        conn.close()
+
+
+@timed("db.get_recent_prices")
 def get_recent_prices(symbol, limit=100):
     """指定銘柄の直近N件の価格データを取得する。"""
     conn = get_connection()
@@ -182,6 +371,7 @@ def get_recent_prices(symbol, limit=100):
         conn.close()
 
 
+@timed("db.get_latest_price")
 def get_latest_price(symbol):
     """指定銘柄の最新価格を取得する。"""
     conn = get_connection()
@@ -201,6 +391,7 @@ def get_latest_price(symbol):
 #  取引ログ
 # ────────────────────────────────────────────
 
+@timed("db.save_trade")
 def save_trade(timestamp, bot_name, symbol, action, price, effective_price,
                quantity, balance, position, target_position=0, prev_position=0,
                profit_loss=0, confidence=0, note=""):
@@ -228,20 +419,30 @@ def save_trade(timestamp, bot_name, symbol, action, price, effective_price,
 #  残高スナップショット
 # ────────────────────────────────────────────
 
+@timed("db.save_balance_snapshot")
 def save_balance_snapshot(timestamp, bot_name, balance, total_position_value,
-                          total_asset, daily_pnl, total_pnl, trade_count, is_active):
-    """残高スナップショットを保存する。"""
+                          total_asset, daily_pnl, total_pnl, trade_count, is_active,
+                          run_id=None):
+    """
+    残高スナップショットを保存する。
+
+    run_id 指定時は (bot_name, run_id) の一意制約により、同じ実行の2回目以降は
+    保存しない (再実行で balances が重複しない)。戻り値は保存したかどうか。
+    """
     conn = get_connection()
     try:
-        conn.execute(
-            "INSERT INTO balances "
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO balances "
             "(timestamp, bot_name, balance, total_position_value, total_asset, "
-            "daily_pnl, total_pnl, trade_count, is_active) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            "daily_pnl, total_pnl, trade_count, is_active, run_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
             (timestamp, bot_name, balance, total_position_value, total_asset,
-             daily_pnl, total_pnl, trade_count, is_active),
+             daily_pnl, total_pnl, trade_count, is_active, run_id),
         )
         conn.commit()
+        if cursor.rowcount == 0:
+            logger.info(f"[{bot_name}] 実行 {run_id} の残高スナップショットは保存済み")
+        return cursor.rowcount > 0
     except sqlite3.Error as e:
         logger.error(f"残高保存エラー: {e}")
     finally:
@@ -252,6 +453,7 @@ def save_balance_snapshot(timestamp, bot_name, balance, total_position_value,
 #  ボット状態
 # ────────────────────────────────────────────
 
+@timed("db.update_bot_state")
 def update_bot_state(bot_name, balance, is_active=True):
     """ボットの現在状態を更新する。"""
     conn = get_connection()
@@ -269,6 +471,7 @@ def update_bot_state(bot_name, balance, is_active=True):
         conn.close()
 
 
+@timed("db.get_bot_state")
 def get_bot_state(bot_name):
     """ボットの現在状態を取得する。"""
     conn = get_connection()
@@ -282,6 +485,7 @@ def get_bot_state(bot_name):
         conn.close()
 
 
+@timed("db.get_bot_trades")
 def get_bot_trades(bot_name, since=None):
     """指定ボットの取引履歴を取得する。"""
     conn = get_connection()
@@ -302,6 +506,7 @@ def get_bot_trades(bot_name, since=None):
         conn.close()
 
 
+@timed("db.get_daily_summary")
 def get_daily_summary(bot_name, date_str):
     """指定ボットの日次サマリーを取得する。"""
     conn = get_connection()
@@ -329,6 +534,7 @@ def get_daily_summary(bot_name, date_str):
         conn.close()
 
 
+@timed("db.get_last_trade_time")
 def get_last_trade_time(bot_name, symbol):
     """指定bot×銘柄の直近の約定時刻(BUY/SELL)を tz-aware datetime で返す。無ければ None。"""
     conn = get_connection()
@@ -351,6 +557,7 @@ def get_last_trade_time(bot_name, symbol):
     return None
 
 
+@timed("db.get_positions")
 def get_positions(bot_name):
     """指定ボットの現在ポジション（保有銘柄）を取得する。"""
     conn = get_connection()
@@ -376,6 +583,7 @@ def get_positions(bot_name):
 #  デリバティブ情報 (Bot #10用)
 # ────────────────────────────────────────────
 
+@timed("db.save_derivative_data")
 def save_derivative_data(timestamp, symbol, funding_rate, open_interest):
     """デリバティブ情報を保存する。"""
     conn = get_connection()
@@ -393,6 +601,7 @@ def save_derivative_data(timestamp, symbol, funding_rate, open_interest):
         conn.close()
 
 
+@timed("db.get_latest_derivative")
 def get_latest_derivative(symbol):
     """指定銘柄の最新デリバティブ情報を取得する。"""
     conn = get_connection()
@@ -408,6 +617,7 @@ def get_latest_derivative(symbol):
         conn.close()
 
 
+@timed("db.get_recent_trades_all")
 def get_recent_trades_all(since):
     """指定時刻以降の全Botの取引履歴を取得する。"""
     conn = get_connection()
@@ -419,3 +629,299 @@ def get_recent_trades_all(since):
         return [dict(r) for r in cursor.fetchall()]
     finally:
         conn.close()
+
+
+# ────────────────────────────────────────────
+#  実行時間計測 (src/metrics.py)
+# ────────────────────────────────────────────
+
+def save_run_metrics(run_id, rows):
+    """
+    MetricsRecorder.summary() の集計行を run_metrics に保存する。
+    同じ run_id の行が既にあれば (タイムアウト後の再開など) 試行をまたいで加算する:
+    回数・合計・最大は合算し、p50/p95 は回数の多い方の試行の値を残す。
+    RUN_METRICS_RETENTION_DAYS より古い実行の行は併せて削除する。
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=RUN_METRICS_RETENTION_DAYS)).isoformat()
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM run_metrics WHERE run_id < ?", (cutoff,))
+        conn.executemany(
+            "INSERT INTO run_metrics "
+            "(run_id, name, label, count, total_ms, p50_ms, p95_ms, max_ms) "
+            "VALUES (:run_id, :name, :label, :count, :total_ms, :p50_ms, :p95_ms, :max_ms) "
+            "ON CONFLICT(run_id, name, label) DO UPDATE SET "
+            " count = count + excluded.count, total_ms = total_ms + excluded.total_ms, "
+            " p50_ms = CASE WHEN excluded.count > count THEN excluded.p50_ms ELSE p50_ms END, "
+            " p95_ms = CASE WHEN excluded.count > count THEN excluded.p95_ms ELSE p95_ms END, "
+            " max_ms = MAX(max_ms, excluded.max_ms)",
+            [dict(r, run_id=run_id) for r in rows],
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"実行時間計測の保存エラー: {e}")
+    finally:
+        conn.close()
+
+
+def save_api_metrics(run_id, rows):
+    """
+    IOStats.summary() の集計行を api_metrics に保存する。同じ run_id の行は run_metrics と
+    同じく試行をまたいで加算する (histogram は累積バケットのためバケットごとに足す)。
+    保持期間は run_metrics と同じ。
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=RUN_METRICS_RETENTION_DAYS)).isoformat()
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM api_metrics WHERE run_id < ?", (cutoff,))
+        previous = {
+            r["endpoint"]: (json.loads(r["histogram"] or "{}"), json.loads(r["error_classes"] or "{}"))
+            for r in conn.execute(
+                "SELECT endpoint, histogram, error_classes FROM api_metrics WHERE run_id = ?",
+                (run_id,))
+        }
+        merged = []
+        for r in rows:
+            histogram, error_classes = previous.get(r["endpoint"], ({}, {}))
+            merged.append(dict(
+                r, run_id=run_id,
+                histogram=json.dumps(_add_counts(histogram, r["histogram"])),
+                error_classes=json.dumps(_add_counts(error_classes, r["error_classes"]))))
+        conn.executemany(
+            "INSERT INTO api_metrics "
+            "(run_id, endpoint, requests, errors, retries, bytes, throttle_ms, "
+            " total_ms, p50_ms, p95_ms, max_ms, histogram, error_classes) "
+            "VALUES (:run_id, :endpoint, :requests, :errors, :retries, :bytes, :throttle_ms, "
+            " :total_ms, :p50_ms, :p95_ms, :max_ms, :histogram, :error_classes) "
+            "ON CONFLICT(run_id, endpoint) DO UPDATE SET "
+            " requests = requests + excluded.requests, errors = errors + excluded.errors, "
+            " retries = retries + excluded.retries, bytes = bytes + excluded.bytes, "
+            " throttle_ms = throttle_ms + excluded.throttle_ms, "
+            " total_ms = total_ms + excluded.total_ms, "
+            " p50_ms = CASE WHEN excluded.requests > requests THEN excluded.p50_ms ELSE p50_ms END, "
+            " p95_ms = CASE WHEN excluded.requests > requests THEN excluded.p95_ms ELSE p95_ms END, "
+            " max_ms = MAX(max_ms, excluded.max_ms), "
+            " histogram = excluded.histogram, error_classes = excluded.error_classes",
+            merged,
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"取引所I/O統計の保存エラー: {e}")
+    finally:
+        conn.close()
+
+
+def _add_counts(base: dict, extra: dict) -> dict:
+    """{キー: 件数} の辞書をキーごとに足す。"""
+    out = dict(base)
+    for key, n in extra.items():
+        out[key] = out.get(key, 0) + n
+    return out
+
+
+def get_api_metrics(endpoint=None, limit=96):
+    """
+    api_metrics を新しい実行順に返す (endpoint 指定時はそのエンドポイントのみ)。
+    histogram / error_classes は dict に戻す。
+    """
+    conn = get_connection()
+    try:
+        if endpoint is None:
+            cursor = conn.execute(
+                "SELECT * FROM api_metrics WHERE run_id IN "
+                "(SELECT DISTINCT run_id FROM api_metrics ORDER BY run_id DESC LIMIT ?) "
+                "ORDER BY run_id DESC, endpoint", (limit,))
+        else:
+            cursor = conn.execute(
+                "SELECT * FROM api_metrics WHERE endpoint = ? ORDER BY run_id DESC LIMIT ?",
+                (endpoint, limit))
+        rows = []
+        for r in cursor.fetchall():
+            row = dict(r)
+            row["histogram"] = json.loads(row["histogram"] or "{}")
+            row["error_classes"] = json.loads(row["error_classes"] or "{}")
+            rows.append(row)
+        return rows
+    finally:
+        conn.close()
+
+
+def sql_hash(sql: str) -> str:
+    """query_texts のキー (正規化済み SQL の SHA-1 先頭16桁)。"""
+    return hashlib.sha1(sql.encode("utf-8")).hexdigest()[:16]
+
+
+def save_query_metrics(run_id, rows):
+    """
+    QueryStats.summary() の集計行を query_metrics に保存する (同じ run_id は run_metrics と同じく加算)。
+    SQL 本文は query_texts に初出時だけ追加する。保持期間は run_metrics と同じ
+    (どの実行からも参照されなくなった本文も消す)。
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=RUN_METRICS_RETENTION_DAYS)).isoformat()
+    rows = [dict(r, run_id=run_id, sql_hash=sql_hash(r["sql"])) for r in rows]
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM query_metrics WHERE run_id < ?", (cutoff,))
+        conn.execute("DELETE FROM query_texts WHERE sql_hash NOT IN "
+                     "(SELECT DISTINCT sql_hash FROM query_metrics)")
+        conn.executemany(
+            "INSERT OR IGNORE INTO query_texts (sql_hash, sql) VALUES (:sql_hash, :sql)", rows)
+        conn.executemany(
+            "INSERT INTO query_metrics "
+            "(run_id, call_site, sql_hash, count, rows, total_ms, p95_ms, max_ms, slow, full_scan) "
+            "VALUES (:run_id, :call_site, :sql_hash, :count, :rows, :total_ms, :p95_ms, :max_ms, "
+            " :slow, :full_scan) "
+            "ON CONFLICT(run_id, call_site, sql_hash) DO UPDATE SET "
+            " count = count + excluded.count, rows = rows + excluded.rows, "
+            " total_ms = total_ms + excluded.total_ms, "
+            " p95_ms = CASE WHEN excluded.count > count THEN excluded.p95_ms ELSE p95_ms END, "
+            " max_ms = MAX(max_ms, excluded.max_ms), slow = slow + excluded.slow, "
+            " full_scan = MAX(full_scan, excluded.full_scan)",
+            rows,
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"クエリ統計の保存エラー: {e}")
+    finally:
+        conn.close()
+
+
+def get_query_metrics_daily(days=7):
+    """
+    query_metrics を日 × 呼び出し元 × SQL で集計して返す (合計時間の多い順)。
+    p95_ms / max_ms は実行ごとの値の最大。
+    """
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    conn = get_connection()
+    try:
+        cursor = conn.execute(
+            "SELECT substr(m.run_id, 1, 10) AS day, m.call_site, "
+            "       COALESCE(t.sql, m.sql_hash) AS sql, "
+            "       COUNT(*) AS runs, SUM(m.count) AS count, SUM(m.rows) AS rows, "
+            "       SUM(m.total_ms) AS total_ms, MAX(m.p95_ms) AS p95_ms, MAX(m.max_ms) AS max_ms, "
+            "       SUM(m.slow) AS slow, MAX(m.full_scan) AS full_scan "
+            "FROM query_metrics m LEFT JOIN query_texts t ON t.sql_hash = m.sql_hash "
+            "WHERE m.run_id >= ? "
+            "GROUP BY day, m.call_site, m.sql_hash ORDER BY day DESC, total_ms DESC",
+            (since,),
+        )
+        return [dict(r) for r in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+# ────────────────────────────────────────────
+#  特徴量ストア (bot #09)
+# ────────────────────────────────────────────
+
+@timed("db.save_ml_features")
+def save_ml_features(symbol, timeframe, feature_set_version, rows):
+    """
+    確定足の特徴量を追記する (既存の足は上書きしない)。
+
+    Args:
+        rows: [(bar_ts ISO文字列, close, {特徴量名: 値}), ...]
+    Returns:
+        int: 追加した行数
+    """
+    conn = get_connection()
+    try:
+        with conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO ml_features "
+                "(symbol, timeframe, feature_set_version, bar_ts, close, features) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(symbol, timeframe, feature_set_version, ts, close, json.dumps(values))
+                 for ts, close, values in rows],
+            )
+            return conn.total_changes - before
+    except sqlite3.Error as e:
+        logger.error(f"[{symbol}] 特徴量ストア保存エラー: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+@timed("db.get_latest_ml_feature_ts")
+def get_latest_ml_feature_ts(symbol, timeframe, feature_set_version):
+    """特徴量ストアに保存済みの最新の足 (ISO文字列)。未保存なら None。"""
+    conn = get_connection()
+    try:
+        row = conn.execute(
+            "SELECT MAX(bar_ts) AS bar_ts FROM ml_features "
+            "WHERE symbol = ? AND timeframe = ? AND feature_set_version = ?",
+            (symbol, timeframe, feature_set_version),
+        ).fetchone()
+        return row["bar_ts"]
+    finally:
+        conn.close()
+
+
+@timed("db.get_ml_features")
+def get_ml_features(symbol, timeframe, feature_set_version, limit):
+    """
+    直近 limit 本の特徴量を古い順に返す。
+
+    Returns:
+        [{"bar_ts", "close", "features": {特徴量名: 値}}, ...]
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.execute(
+            "SELECT bar_ts, close, features FROM ml_features "
+            "WHERE symbol = ? AND timeframe = ? AND feature_set_version = ? "
+            "ORDER BY bar_ts DESC LIMIT ?",
+            (symbol, timeframe, feature_set_version, limit),
+        )
+        rows = cursor.fetchall()
+        return [{"bar_ts": r["bar_ts"], "close": r["close"], "features": json.loads(r["features"])}
+                for r in reversed(rows)]
+    finally:
+        conn.close()
+
+
+@timed("db.get_run_checkpoints")
+def get_run_checkpoints(run_id):
+    """run_id の完了済み段階を {stage: completed_at} で返す。"""
+    conn = get_connection()
+    try:
+        cursor = conn.execute(
+            "SELECT stage, completed_at FROM run_checkpoints WHERE run_id = ?", (run_id,))
+        return {r["stage"]: r["completed_at"] for r in cursor.fetchall()}
+    finally:
+        conn.close()
+
+
+@timed("db.save_run_checkpoint")
+def save_run_checkpoint(run_id, stage):
+    """段階の完了を記録して完了時刻を返す。保持期間を過ぎた実行の行は併せて削除する。"""
+    now = datetime.now(timezone.utc)
+    cutoff = (now - timedelta(days=RUN_CHECKPOINT_RETENTION_DAYS)).isoformat()
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM run_checkpoints WHERE run_id < ?", (cutoff,))
+        conn.execute(
+            "INSERT OR REPLACE INTO run_checkpoints (run_id, stage, completed_at) VALUES (?, ?, ?)",
+            (run_id, stage, now.isoformat()),
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"チェックポイント保存エラー: {e}")
+    finally:
+        conn.close()
+    return now.isoformat()
+
+
+def get_run_metric_totals(name, label="", limit=96):
+    """直近 limit 実行分の、指定スパンの実行ごと合計時間 (ms) を新しい順に返す。"""
+    conn = get_connection()
+    try:
+        cursor = conn.execute(
+            "SELECT total_ms FROM run_metrics WHERE name = ? AND label = ? "
+            "ORDER BY run_id DESC LIMIT ?",
+            (name, label, limit),
+        )
+        return [r["total_ms"] for r in cursor.fetchall()]
+    finally:
+        conn.close()
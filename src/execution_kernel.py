@@ -0,0 +1,198 @@
+"""
+仮想通貨自動売買Bot - 約定規則の一括シミュレーション (NumPy)
+全botの足ごとの target_position 配列から、Simulator と同じ約定規則で全期間を一度に計算する。
+閾値 (POSITION_CHANGE_THRESHOLD)・最低保有期間 (MIN_HOLD_MINUTES) のパラメータ研究用。
+
+規則 (Simulator.apply_signal と同じ。bot ごとに1口座で、足の中は銘柄の順に適用):
+  - target は 0〜1 に収め (BaseBot.get_signals)、下落レジームの銘柄は REGIME_BEAR_MAX_POSITION で頭打ち
+  - 停止中は損失率が RECOVERY_LOSS_RATE 未満に戻れば再稼働、戻らなければその銘柄は何もしない
+  - |target - 現在比率| < 閾値、または直近の約定から最低保有期間内なら約定しない
+  - 買い: 総資産 × 差分 (残高が上限)、売り: 保有数量 × min(1, 差分 / 現在比率)。コストは TOTAL_COST_RATE
+  - 約定を試みた後、損失率が CIRCUIT_BREAKER_THRESHOLD 以上なら停止
+  - 価格の無い銘柄・target が NaN の銘柄はその足では適用しない (総資産の評価からも除く)
+
+- 経路に依存しない処理 (収める・レジーム上限・円換算) は全期間を配列演算で先に済ませる
+- 経路に依存する状態 (残高・数量・直近約定時刻・停止) だけを足 × 銘柄のループで進め、
+  各ステップは全レーン (bot × パラメータの組) を配列演算でまとめて更新する
+  (Python のループ回数は足数 × 銘柄数で、bot 数・パラメータの組の数によらない)。
+  約定を試みるレーンが無いステップは判定だけで抜け、約定処理はそのレーンだけで行う
+- 総資産の加算順・式の順まで Simulator に合わせてあり、結果は Simulator + MemoryLedger と一致する
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from src.config import (
+    INITIAL_BALANCE, TOTAL_COST_RATE, USD_JPY_RATE, CIRCUIT_BREAKER_THRESHOLD,
+    POSITION_CHANGE_THRESHOLD, MIN_HOLD_MINUTES,
+    REGIME_FILTER_ENABLED, REGIME_BEAR_MAX_POSITION,
+)
+from src.simulator import RECOVERY_LOSS_RATE
+
+
+def prepare_targets(targets: np.ndarray, bear: np.ndarray = None) -> np.ndarray:
+    """
+    target を 0〜1 に収め、下落レジームの足・銘柄は REGIME_BEAR_MAX_POSITION で頭打ちにする
+    (bot_runner.apply_regime_cap と同じ)。NaN はそのまま残す。
+
+    Args:
+        targets: (足, bot, 銘柄)
+        bear: (足, 銘柄) の bool。None ならレジーム上限なし
+    """
+    out = np.clip(np.asarray(targets, dtype=np.float64), 0.0, 1.0)
+    if bear is not None and REGIME_FILTER_ENABLED:
+        out = np.where(np.asarray(bear, dtype=bool)[:, None, :],
+                       np.minimum(out, REGIME_BEAR_MAX_POSITION), out)
+    return out
+
+
+def simulate(targets: np.ndarray, prices: np.ndarray, timestamps: np.ndarray,
+             thresholds=None, min_hold_minutes=None, lane_bots: np.ndarray = None,
+             initial_balance: float = INITIAL_BALANCE, cost_rate: float = TOTAL_COST_RATE,
+             record_equity: bool = False) -> dict:
+    """
+    Simulator の規則で全レーンを一括シミュレーションする。
+
+    Args:
+        targets: (足, bot, 銘柄) の target_position (prepare_targets 済み。NaN はシグナルなし)
+        prices: (足, 銘柄) の USD 価格 (NaN は価格なし)
+        timestamps: (足,) の時刻 (DatetimeIndex / datetime64)
+        thresholds / min_hold_minutes: レーンごとの閾値・最低保有期間 (分)。既定は本番の設定値
+        lane_bots: レーンごとの bot 番号 (targets の2軸目)。既定は bot ごとに1レーン
+
+    Returns:
+        dict: balance / quantities (レーン, 銘柄) / trades (レーン, 銘柄) / cost / equity
+              (最終価格での総資産) / active / cb_trips、record_equity なら equity_curve (足, レーン)
+    """
+    targets = np.asarray(targets, dtype=np.float64)
+    n_bars, n_bots, n_symbols = targets.shape
+    lane_bots = np.arange(n_bots) if lane_bots is None else np.asarray(lane_bots)
+    n_lanes = len(lane_bots)
+    thr = np.broadcast_to(np.asarray(
+        POSITION_CHANGE_THRESHOLD if thresholds is None else thresholds, dtype=np.float64), n_lanes)
+    hold = np.broadcast_to(np.asarray(
+        MIN_HOLD_MINUTES if min_hold_minutes is None else min_hold_minutes, dtype=np.float64), n_lanes)
+    hold_ns = np.round(hold * 6e10).astype(np.int64)
+
+    prices = np.asarray(prices, dtype=np.float64)
+    price_jpy = prices * USD_JPY_RATE
+    valued = np.nan_to_num(prices, nan=0.0)  # 価格の無い銘柄は総資産に含めない
+    stamps = pd.DatetimeIndex(timestamps).as_unit("ns").asi8
+    # apply_signal を呼ぶ足・銘柄 (価格があり、どれかのレーンにシグナルがある)
+    callable_steps = (~np.isnan(prices) & (~np.isnan(targets[:, np.unique(lane_bots), :])).any(axis=1)).tolist()
+
+    balance = np.full(n_lanes, float(initial_balance))
+    qty = np.zeros((n_lanes, n_symbols))
+    # 総資産は Simulator と同じ順 (銘柄を初めて買った順) に足す (丸め誤差まで一致させる)。
+    # sum_order は qty を平らにした配列での、レーンごとの足す順の位置
+    rows = np.arange(n_lanes)[:, None] * n_symbols
+    sum_order = rows + np.arange(n_symbols)
+    bought_ever = np.zeros((n_lanes, n_symbols), dtype=bool)
+    first_buy = np.full((n_lanes, n_symbols), n_symbols)
+    hold_until = np.full((n_lanes, n_symbols), np.iinfo(np.int64).min)  # この時刻まで最低保有期間内
+    trades = np.zeros((n_lanes, n_symbols), dtype=np.int64)
+    cost = np.zeros(n_lanes)
+    active = np.ones(n_lanes, dtype=bool)
+    all_active = True
+    cb_trips = np.zeros(n_lanes, dtype=np.int64)
+    equity_curve = np.empty((n_bars, n_lanes)) if record_equity else None
+    buy_rate = 1 + cost_rate
+    sell_rate = 1 - cost_rate
+
+    def position_value(px):
+        return np.take(qty * px * USD_JPY_RATE, sum_order).sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for t in range(n_bars):
+            steps = callable_steps[t]
+            if True in steps:
+                lane_targets = targets[t][lane_bots]
+                px = valued[t]
+                now = stamps[t]
+            for s in range(n_symbols):
+                if not steps[s]:
+                    continue
+                p = price_jpy[t, s]
+                target = lane_targets[:, s]
+                total = balance + position_value(px)
+                if not all_active:
+                    # 停止中: 回復していれば再稼働 (この銘柄から適用)、していなければ何もしない
+                    loss = (initial_balance - total) / initial_balance
+                    active |= (target == target) & (loss < RECOVERY_LOSS_RATE)
+                    all_active = bool(active.all())
+
+                cur = np.where(total > 0, qty[:, s] * p / total, 0.0)
+                delta = target - cur
+                go = np.abs(delta) >= thr  # NaN (シグナルなし) は False
+                go &= now >= hold_until[:, s]
+                if not all_active:
+                    go &= active
+                if not go.any():
+                    continue
+
+                # 以降は約定を試みるレーンだけ
+                idx = np.flatnonzero(go)
+                d, c, held, bal = delta[idx], cur[idx], qty[idx, s], balance[idx]
+                amount = np.minimum(total[idx] * d, bal)
+                is_buy = d > 0
+                buy = is_buy & (amount > 0)
+                sell = ~is_buy & (held > 0)
+
+                bi = idx[buy]
+                bought = amount[buy] / (p * buy_rate)
+                balance[bi] = bal[buy] - amount[buy]
+                qty[bi, s] = held[buy] + bought
+                si = idx[sell]
+                cs = c[sell]
+                ratio = np.where(cs > 0, np.minimum(1.0, -d[sell] / cs), 1.0)
+                sold = held[sell] * ratio
+                balance[si] = bal[sell] + sold * (p * sell_rate)
+                qty[si, s] = held[sell] - sold
+                cost[bi] += bought * p * cost_rate
+                cost[si] += sold * p * cost_rate
+
+                executed = idx[buy | sell]
+                trades[executed, s] += 1
+                hold_until[executed, s] = now + hold_ns[executed]
+                new = bi[~bought_ever[bi, s]]
+                if new.size:
+                    bought_ever[new, s] = True
+                    first_buy[new, s] = bought_ever[new].sum(axis=1) - 1
+                    sum_order = rows + np.argsort(first_buy, axis=1, kind="stable")
+
+                # 約定を試みたレーンのサーキットブレーカー判定 (全銘柄の時価評価)
+                after = balance[idx] + position_value(px)[idx]
+                tripped = idx[(initial_balance - after) / initial_balance >= CIRCUIT_BREAKER_THRESHOLD]
+                if tripped.size:
+                    active[tripped] = False
+                    cb_trips[tripped] += 1
+                    all_active = False
+            if record_equity:
+                equity_curve[t] = balance + position_value(valued[t])
+
+    # 最終価格 (銘柄ごとに価格のある最後の足)
+    last_px = pd.DataFrame(prices).ffill().iloc[-1].fillna(0.0).to_numpy() \
+        if n_bars else np.zeros(n_symbols)
+    out = {
+        "balance": balance, "quantities": qty, "trades": trades, "cost": cost,
+        "equity": balance + position_value(last_px), "active": active, "cb_trips": cb_trips,
+        "lane_bots": lane_bots, "thresholds": np.array(thr), "min_hold_minutes": np.array(hold),
+    }
+    if record_equity:
+        out["equity_curve"] = equity_curve
+    return out
+
+
+def sweep(targets: np.ndarray, prices: np.ndarray, timestamps: np.ndarray,
+          thresholds, min_hold_minutes, **kwargs) -> dict:
+    """
+    閾値 × 最低保有期間の全組み合わせを、全 bot について1回の simulate で計算する。
+    レーンは (bot, 閾値, 最低保有期間) の順に並ぶ。
+    """
+    n_bots = np.asarray(targets).shape[1]
+    grid = list(itertools.product(range(n_bots), thresholds, min_hold_minutes))
+    return simulate(
+        targets, prices, timestamps,
+        thresholds=[g[1] for g in grid], min_hold_minutes=[g[2] for g in grid],
+        lane_bots=np.array([g[0] for g in grid], dtype=np.int64), **kwargs)
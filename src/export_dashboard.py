@@ -11,6 +11,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from src.database import get_daily_summary, get_bot_state, get_positions, get_recent_trades_all, get_connection
 from src.data_collector import fetch_current_prices, fetch_usd_jpy_rate
 from src.config import BOT_NAMES, INITIAL_BALANCE, FIXED_USD_JPY_RATE, PROJECT_ROOT
+from src.profiling import profile_run
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -126,4 +127,5 @@ def export_dashboard_data():
     logger.info(f"Dashboard data exported to {output_path}")
 
 if __name__ == "__main__":
-    export_dashboard_data()
+    with profile_run("export_dashboard"):
+        export_dashboard_data()
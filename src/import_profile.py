@@ -0,0 +1,93 @@
+"""
+仮想通貨自動売買Bot - 起動時 import コスト計測
+`python -X importtime` 相当の計測をプロセス内で行い、モジュールごとの
+self / cumulative 時間をログに出す。環境変数 IMPORT_PROFILE=1 で有効。
+
+エントリポイントの先頭 (src の他モジュールより前) で enable() し、
+終了時に report() を呼ぶ。遅延 import (src/bots レジストリ経由の bot や
+lightgbm) も実際に読み込まれた時点で計測される。
+
+標準ライブラリのみに依存する (計測対象を汚さないため)。
+"""
+import os
+import time
+import logging
+import threading
+import importlib._bootstrap as _bootstrap
+
+logger = logging.getLogger(__name__)
+
+_records = []  # [(module, self_us, cumulative_us, depth)] 完了順
+_local = threading.local()
+_original_find_and_load = None
+
+
+def is_requested() -> bool:
+    return os.getenv("IMPORT_PROFILE", "") not in ("", "0")
+
+
+def _timed_find_and_load(name, import_):
+    # import 文は sys.modules に無いモジュールについてのみ _find_and_load を呼ぶ。
+    # -X importtime と同じ位置で計測し、子モジュールの時間を差し引いて self を出す
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    depth = len(stack)
+    stack.append(0)
+    start = time.perf_counter_ns()
+    try:
+        return _original_find_and_load(name, import_)
+    finally:
+        cumulative = (time.perf_counter_ns() - start) // 1000
+        children = stack.pop()
+        if stack:
+            stack[-1] += cumulative
+        _records.append((name, cumulative - children, cumulative, depth))
+
+
+def enable():
+    """import の計測を開始する (多重呼び出しは無視)。"""
+    global _original_find_and_load
+    if _original_find_and_load is not None:
+        return
+    _original_find_and_load = _bootstrap._find_and_load
+    _bootstrap._find_and_load = _timed_find_and_load
+
+
+def disable():
+    global _original_find_and_load
+    if _original_find_and_load is not None:
+        _bootstrap._find_and_load = _original_find_and_load
+        _original_find_and_load = None
+
+
+def records() -> list:
+    return list(_records)
+
+
+def report(top: int = None, by_package: bool = True):
+    """
+    計測結果をログ出力する。
+
+    - 直接 import された (depth=0) モジュールの合計 = 計測した import 総時間
+    - cumulative 上位 top 件 (-X importtime と同じ self / cumulative [us] 表記)
+    - by_package: トップレベルパッケージ別の self 合計 (どの依存が重いか)
+    """
+    if top is None:
+        top = int(os.getenv("IMPORT_PROFILE_TOP", "25"))
+    total_us = sum(r[2] for r in _records if r[3] == 0)
+    logger.info(f"📦 import計測: {len(_records)}モジュール, 合計 {total_us / 1000:.1f}ms "
+                f"(この時点のプロセスCPU時間 {time.process_time() * 1000:.0f}ms)")
+    logger.info("   self [us] | cumulative | module")
+    for name, self_us, cum_us, depth in sorted(_records, key=lambda r: -r[2])[:top]:
+        logger.info(f"  {self_us:>9} | {cum_us:>10} | {'  ' * depth}{name}")
+
+    if by_package:
+        packages = {}
+        for name, self_us, _, _ in _records:
+            root = name.split(".")[0]
+            packages[root] = packages.get(root, 0) + self_us
+        ranked = sorted(packages.items(), key=lambda kv: -kv[1])[:top]
+        logger.info("   パッケージ別 self 合計: " + ", ".join(
+            f"{pkg}={us / 1000:.1f}ms" for pkg, us in ranked))
+
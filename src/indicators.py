@@ -74,6 +74,14 @@ def bollinger_bands(series: pd.Series, period: int = 20, std_dev: float = 2.0):
 #  ATR (Average True Range)
 # ────────────────────────────────────────────
 
+def _true_range(high, low, prev_close):
+    """
+    True Range。要素ごとの最大 (NaN は無視) なので、(足 × 銘柄) の DataFrame を渡せば
+    銘柄ごとの TR を同じ形で返す (bot #09 の複数銘柄一括の特徴量計算で使う)。
+    """
+    return np.fmax(np.fmax(high - low, (high - prev_close).abs()), (low - prev_close).abs())
+
+
 def atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
     """ATR を計算する (high, low, close が必要)。"""
     high = df["high"]
@@ -81,11 +89,7 @@ def atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
     close = df["close"]
     prev_close = close.shift(1)
 
-    tr = pd.concat([
-        high - low,
-        (high - prev_close).abs(),
-        (low - prev_close).abs(),
-    ], axis=1).max(axis=1)
+    tr = _true_range(high, low, prev_close)
 
     return tr.ewm(alpha=1 / period, min_periods=period).mean()
 
@@ -126,11 +130,7 @@ def adx(df: pd.DataFrame, period: int = 14):
     prev_close = close.shift(1)
 
     # True Range
-    tr = pd.concat([
-        high - low,
-        (high - prev_close).abs(),
-        (low - prev_close).abs(),
-    ], axis=1).max(axis=1)
+    tr = _true_range(high, low, prev_close)
 
     # Directional Movement
     plus_dm = (high - prev_high).clip(lower=0)
@@ -0,0 +1,208 @@
+"""
+仮想通貨自動売買Bot - 実行時間計測 (スパン)
+処理区間を with span("stage.fetch_ohlcv", "BTC/USD"): のように囲み、
+単調時計 (time.perf_counter) で所要時間を記録する。
+
+- 記録はプロセス内の METRICS に溜め、実行の最後に集計して run_metrics テーブルへ保存する
+  (スパン名ごとに 回数 / 合計 / p50 / p95 / 最大 の1行。生データは保存しない。
+   DBはリポジトリにコミットされるため、ラベル別の行は RUN_METRICS_LABELED_PREFIXES のみ)
+- スレッドセーフ。プロセス実行のワーカー内で記録したスパンは親に戻らないため、
+  bot のシグナル計算時間は bot_runner が結果と一緒に受け取って親側で記録する
+- 計測コストは1スパンあたり数マイクロ秒 (hot loop の内側には置かない)
+
+命名規約: run.* (実行全体) / stage.* (run_cycle の各段) / task.* (スケジューラのタスク)
+          api.* (取引所呼び出し) / db.* (DB関数) / bot.* (bot処理) / sim.* (Simulator)
+
+API_STATS は取引所 I/O の HTTP リクエスト単位の統計 (エンドポイント別のレイテンシ・
+ヒストグラム / 応答サイズ / リトライ / 例外クラス別エラー数 / レート制限待ち)。
+api.* スパンがリトライ・待機込みの関数単位なのに対し、こちらは1リクエストごとに数える。
+"""
+import time
+import bisect
+import threading
+import functools
+from contextlib import contextmanager, nullcontext
+
+from src.config import API_LATENCY_BUCKETS_MS
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """昇順リストの q 分位点 (0〜1, 線形補間)。"""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+class MetricsRecorder:
+    """スパンの所要時間をメモリに溜めて集計する。"""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self._samples = {}  # {(name, label): [seconds, ...]}
+        self._lock = threading.Lock()
+        # スパン開始時に呼ぶフック (src/profiling.py の区間指定プロファイル用)。
+        # name → コンテキストマネージャ or None。未設定時は属性参照1回のみ
+        self.span_hook = None
+
+    def record(self, name: str, seconds: float, label: str = ""):
+        with self._lock:
+            self._samples.setdefault((name, label), []).append(seconds)
+
+    @contextmanager
+    def span(self, name: str, label: str = ""):
+        scope = self.span_hook(name) if self.span_hook is not None else None
+        with scope if scope is not None else nullcontext():
+            start = self.clock()
+            try:
+                yield
+            finally:
+                self.record(name, self.clock() - start, label)
+
+    def reset(self):
+        with self._lock:
+            self._samples = {}
+
+    def summary(self, labeled_prefixes=None) -> list:
+        """
+        スパン名ごとの集計を返す (ミリ秒)。ラベルは合算して label="" の1行にする。
+        labeled_prefixes に前方一致する名前は、ラベル別の行も併せて返す
+        (例: "bot." → bot ごとのシグナル計算時間)。
+
+        Returns:
+            [{"name", "label", "count", "total_ms", "p50_ms", "p95_ms", "max_ms"}, ...]
+        """
+        with self._lock:
+            samples = {k: list(v) for k, v in self._samples.items()}
+
+        groups = {}
+        for (name, label), values in samples.items():
+            groups.setdefault((name, ""), []).extend(values)
+            if label and labeled_prefixes and name.startswith(tuple(labeled_prefixes)):
+                groups.setdefault((name, label), []).extend(values)
+
+        rows = []
+        for (name, label), values in sorted(groups.items()):
+            values.sort()
+            rows.append({
+                "name": name,
+                "label": label,
+                "count": len(values),
+                "total_ms": sum(values) * 1000,
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "max_ms": values[-1] * 1000,
+            })
+        return rows
+
+
+METRICS = MetricsRecorder()
+
+
+def span(name: str, label: str = ""):
+    """プロセス共有の METRICS にスパンを記録するコンテキストマネージャ。"""
+    return METRICS.span(name, label)
+
+
+class IOStats:
+    """
+    エンドポイント別の HTTP リクエスト統計 (src/data_collector.py の RateLimitScheduler が記録)。
+
+    エンドポイント名は "<レート制限系統> <URLパス>" (例: "spot_public /0/public/OHLC")。
+    """
+
+    def __init__(self, buckets_ms=API_LATENCY_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, endpoint: str) -> dict:
+        entry = self._stats.get(endpoint)
+        if entry is None:
+            entry = self._stats[endpoint] = {
+                "latencies": [], "bytes": 0, "retries": 0, "throttle": 0.0, "errors": {},
+            }
+        return entry
+
+    def record_request(self, endpoint: str, seconds: float, nbytes: int = 0,
+                       error: str = None, throttle: float = 0.0):
+        """1リクエストを記録する。error は例外クラス名 (成功時 None)、throttle はレート制限待ち秒数。"""
+        with self._lock:
+            entry = self._entry(endpoint)
+            entry["latencies"].append(seconds)
+            entry["bytes"] += nbytes
+            entry["throttle"] += throttle
+            if error:
+                entry["errors"][error] = entry["errors"].get(error, 0) + 1
+
+    def record_retry(self, endpoint: str):
+        with self._lock:
+            self._entry(endpoint)["retries"] += 1
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def export(self) -> dict:
+        """生データの複製 (プロセス実行のワーカーから親へ渡す用)。"""
+        with self._lock:
+            return {ep: dict(e, latencies=list(e["latencies"]), errors=dict(e["errors"]))
+                    for ep, e in self._stats.items()}
+
+    def merge(self, exported: dict):
+        with self._lock:
+            for endpoint, other in exported.items():
+                entry = self._entry(endpoint)
+                entry["latencies"].extend(other["latencies"])
+                entry["bytes"] += other["bytes"]
+                entry["retries"] += other["retries"]
+                entry["throttle"] += other["throttle"]
+                for cls, n in other["errors"].items():
+                    entry["errors"][cls] = entry["errors"].get(cls, 0) + n
+
+    def summary(self) -> list:
+        """
+        エンドポイントごとの集計を返す (ミリ秒)。histogram は累積バケット
+        {上限ms: 件数} (最後の "+Inf" は全件数)。
+
+        Returns:
+            [{"endpoint", "requests", "errors", "retries", "bytes", "throttle_ms",
+              "total_ms", "p50_ms", "p95_ms", "max_ms", "histogram", "error_classes"}, ...]
+        """
+        rows = []
+        for endpoint, e in sorted(self.export().items()):
+            values = sorted(e["latencies"])
+            histogram = {str(bound): bisect.bisect_right(values, bound / 1000)
+                         for bound in self.buckets_ms}
+            histogram["+Inf"] = len(values)
+            rows.append({
+                "endpoint": endpoint,
+                "requests": len(values),
+                "errors": sum(e["errors"].values()),
+                "retries": e["retries"],
+                "bytes": e["bytes"],
+                "throttle_ms": e["throttle"] * 1000,
+                "total_ms": sum(values) * 1000,
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "max_ms": values[-1] * 1000 if values else 0.0,
+                "histogram": histogram,
+                "error_classes": dict(e["errors"]),
+            })
+        return rows
+
+
+API_STATS = IOStats()
+
+
+def timed(name: str):
+    """関数全体をスパンで囲むデコレータ (label なし)。"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with METRICS.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,251 @@
+"""
+仮想通貨自動売買Bot - Prometheus / OpenMetrics テキストファイル出力
+実行ごとに bot とパイプラインの状態をテキスト形式で METRICS_TEXTFILE_PATH に書き出す。
+node_exporter の textfile collector (--collector.textfile.directory) で収集できる。
+
+- 書き出しは一時ファイル → os.replace で原子的に置き換える (収集途中の読みかけを防ぐ)
+- 値はこの実行のメモリ上の結果 (bot結果・METRICS・API_STATS) とファイルサイズから作り、
+  履歴テーブルは読まない (DBが育っても出力コストは一定)
+- *_total の累積カウンタは <出力先>.state.json に保持して実行をまたいで加算する
+- parse_textfile(): 出力ファイルを読み戻す簡易スクレイパ (検証用の代替)
+
+主なメトリクス (接頭辞 trading_bot_):
+  bot_up / bot_active / bot_equity_jpy / bot_balance_jpy / bot_position_value_jpy /
+  bot_position_quantity / bot_run_trades / bot_trades_total,
+  stage_seconds / api_requests_total / api_errors_total / api_latency_p95_seconds,
+  db_size_bytes / data_lag_seconds / timeframe_seconds /
+  last_run_timestamp_seconds / last_run_success
+"""
+import os
+import re
+import json
+import time
+import logging
+
+import ccxt
+
+from src.config import DB_PATH, METRICS_TEXTFILE_PATH
+from src.metrics import METRICS, API_STATS
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "trading_bot_"
+
+# collect_market_data が記録する銘柄ごとの最新足の開始時刻 (epoch秒) と足の長さ
+_market_bar_open = {}
+_timeframe_sec = 0
+
+
+def note_market_data(data_dict: dict, timeframe: str):
+    """シグナル足の最新バーの開始時刻を控える (データ鮮度 data_lag_seconds 用)。"""
+    global _timeframe_sec
+    _timeframe_sec = ccxt.Exchange.parse_timeframe(timeframe)
+    for symbol, df in data_dict.items():
+        if df is None or df.empty:
+            continue
+        _market_bar_open[symbol] = df["timestamp"].iloc[-1].timestamp()
+
+
+def _format(value) -> str:
+    value = float(value)
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+_ESCAPED = re.compile(r"\\(.)")
+_UNESCAPED = {"n": "\n"}
+
+
+def _unescape(value: str) -> str:
+    """_escape の逆変換。1回の走査で戻す (置換を重ねると \\ の直後の n を改行と誤読する)。"""
+    return _ESCAPED.sub(lambda m: _UNESCAPED.get(m.group(1), m.group(1)), value)
+
+
+class _Writer:
+    """メトリクスファミリーごとに HELP / TYPE 行とサンプル行を組み立てる。"""
+
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name: str, kind: str, help_text: str, samples):
+        samples = list(samples)
+        if not samples:
+            return
+        full = PREFIX + name
+        self.lines.append(f"# HELP {full} {help_text}")
+        self.lines.append(f"# TYPE {full} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            self.lines.append(f"{full}{{{label_text}}} {_format(value)}" if label_text
+                              else f"{full} {_format(value)}")
+
+    def text(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def _load_counters(path) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _add(counters: dict, family: str, key: str, amount: float):
+    bucket = counters.setdefault(family, {})
+    bucket[key] = bucket.get(key, 0) + amount
+
+
+def _db_size() -> int:
+    size = 0
+    for suffix in ("", "-wal"):
+        try:
+            size += os.path.getsize(f"{DB_PATH}{suffix}")
+        except OSError:
+            pass
+    return size
+
+
+def render(results, counters: dict, now: float = None) -> str:
+    """
+    実行結果からテキストを組み立てる。counters (累積カウンタ) はこの実行分を加算して更新する。
+
+    Args:
+        results: run_cycle の戻り値 ({bot_name: 結果}) / データ取得失敗時 None
+    """
+    now = now or time.time()
+    results = results or {}
+    w = _Writer()
+
+    snapshots = {name: r["snapshot"] for name, r in results.items() if r.get("snapshot")}
+    run_trades = {
+        name: sum(1 for t in r.get("trades", []) if t.get("executed"))
+        for name, r in results.items()
+    }
+    for name, n in run_trades.items():
+        _add(counters, "trades", name, n)
+
+    w.family("bot_up", "gauge", "1 if the bot computed and applied signals this run",
+             (({"bot": n}, r["status"] == "OK") for n, r in results.items()))
+    w.family("bot_active", "gauge", "0 while the circuit breaker has stopped the bot",
+             (({"bot": n}, s["is_active"]) for n, s in snapshots.items()))
+    w.family("bot_equity_jpy", "gauge", "Total virtual asset (cash + positions) in JPY",
+             (({"bot": n}, s["total_asset"]) for n, s in snapshots.items()))
+    w.family("bot_balance_jpy", "gauge", "Virtual cash balance in JPY",
+             (({"bot": n}, s["balance"]) for n, s in snapshots.items()))
+    w.family("bot_position_value_jpy", "gauge", "Marked-to-market position value in JPY",
+             (({"bot": n}, s["position_value"]) for n, s in snapshots.items()))
+    w.family("bot_position_quantity", "gauge", "Held quantity per symbol (coins)",
+             (({"bot": n, "symbol": sym}, qty)
+              for n, s in snapshots.items() for sym, qty in sorted(s["quantities"].items())))
+    w.family("bot_run_trades", "gauge", "Trades executed in the last run",
+             (({"bot": n}, v) for n, v in run_trades.items()))
+    w.family("bot_trades_total", "counter", "Trades executed since the exporter state was created",
+             (({"bot": n}, v) for n, v in sorted(counters.get("trades", {}).items())))
+
+    stage_rows = [r for r in METRICS.summary()
+                  if r["name"].startswith(("run.", "stage.", "task."))]
+    w.family("stage_seconds", "gauge", "Wall time of each pipeline stage in the last run",
+             (({"stage": r["name"]}, r["total_ms"] / 1000) for r in stage_rows))
+
+    api_rows = API_STATS.summary()
+    for r in api_rows:
+        _add(counters, "api_requests", r["endpoint"], r["requests"])
+        _add(counters, "api_retries", r["endpoint"], r["retries"])
+        for cls, n in r["error_classes"].items():
+            _add(counters, "api_errors", f"{r['endpoint']}|{cls}", n)
+    w.family("api_requests_total", "counter", "Exchange HTTP requests per endpoint",
+             (({"endpoint": k}, v) for k, v in sorted(counters.get("api_requests", {}).items())))
+    w.family("api_retries_total", "counter", "Exchange request retries per endpoint",
+             (({"endpoint": k}, v) for k, v in sorted(counters.get("api_retries", {}).items())))
+    w.family("api_errors_total", "counter", "Exchange request errors per endpoint and error class",
+             (({"endpoint": k.split("|", 1)[0], "error": k.split("|", 1)[1]}, v)
+              for k, v in sorted(counters.get("api_errors", {}).items())))
+    w.family("api_latency_p95_seconds", "gauge", "p95 request latency per endpoint in the last run",
+             (({"endpoint": r["endpoint"]}, r["p95_ms"] / 1000) for r in api_rows))
+
+    w.family("db_size_bytes", "gauge", "SQLite database size including the WAL file",
+             [({}, _db_size())])
+    # 取得した最新足 (形成中を含む) の開始からの経過秒。足の長さを超えたら更新が止まっている
+    w.family("data_lag_seconds", "gauge",
+             "Seconds since the latest fetched signal bar opened (stale when above timeframe_seconds)",
+             (({"symbol": sym}, max(0.0, now - opened))
+              for sym, opened in sorted(_market_bar_open.items())))
+    w.family("timeframe_seconds", "gauge", "Signal timeframe length",
+             [({}, _timeframe_sec)] if _timeframe_sec else [])
+    w.family("last_run_timestamp_seconds", "gauge", "Unix time of the last run", [({}, now)])
+    w.family("last_run_success", "gauge", "1 if the last run fetched market data",
+             [({}, bool(results))])
+    return w.text()
+
+
+def write_textfile(results, path=METRICS_TEXTFILE_PATH):
+    """実行結果をテキストファイルに原子的に書き出す。path が空なら何もしない。"""
+    if not path:
+        return
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        state_path = path.with_name(path.name + ".state.json")
+        counters = _load_counters(state_path)
+        text = render(results, counters)
+
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(text)
+        os.replace(tmp, path)
+        state_tmp = state_path.with_name(state_path.name + ".tmp")
+        state_tmp.write_text(json.dumps(counters, ensure_ascii=False))
+        os.replace(state_tmp, state_path)
+        logger.info(f"📈 メトリクス出力: {path}")
+    except Exception as e:
+        # 監視用の出力失敗で実行自体を失敗させない
+        logger.error(f"メトリクス出力エラー: {e}")
+
+
+def parse_textfile(path=METRICS_TEXTFILE_PATH) -> dict:
+    """
+    出力ファイルを読み戻す (node_exporter の代わりの簡易スクレイパ)。
+
+    Returns:
+        {(metric_name, ((label, value), ...)): float}
+    """
+    samples = {}
+    for line in path.read_text().splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, value = line.rsplit(" ", 1)
+        labels = ()
+        if "{" in series:
+            name, label_text = series[:-1].split("{", 1)
+            pairs = []
+            for part in _split_labels(label_text):
+                key, raw = part.split("=", 1)
+                pairs.append((key, _unescape(raw[1:-1])))
+            labels = tuple(pairs)
+        else:
+            name = series
+        samples[(name, labels)] = float(value)
+    return samples
+
+
+def _split_labels(text: str) -> list:
+    """ラベル部 (a="x",b="y") をカンマで分割する (値の中のカンマ・エスケープは無視)。"""
+    parts, current, quoted, escaped = [], "", False, False
+    for ch in text:
+        if escaped:
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == '"':
+            quoted = not quoted
+        elif ch == "," and not quoted:
+            parts.append(current)
+            current = ""
+            continue
+        current += ch
+    if current:
+        parts.append(current)
+    return parts
@@ -0,0 +1,233 @@
+"""
+仮想通貨自動売買Bot - Bot #09 (ML ゲート) の LightGBM パラメータ探索
+ウォークフォワードの fold (src/walk_forward.py) で候補パラメータを評価し、OOS 予測の
+二乗誤差 (全銘柄・全 fold の足をまとめた平均) が最小のものを選ぶ。
+評価 (候補 × 銘柄 × fold) はプロセスプールで並列に行う。
+
+- 方法: grid (全候補を全 fold で評価) / halving (successive halving: 間引いた少数の fold で
+  全候補を評価し、上位 1/eta だけを eta 倍の fold で評価し直すことを繰り返す)。
+  間引きは最新の fold から等間隔で、段が進むと前の段の fold を含む (評価を再利用できる)
+- 現在の設定 (bot の lgb_params) も必ず候補に入れる (選んだ結果が現状より悪くならない)
+- 評価結果は (銘柄のデータのハッシュ, 特徴量セット版, パラメータ, fold の範囲, 木の上限) を
+  キーに ML_TUNING_CACHE_DIR へ fold ごとの JSON で保存する。中断・再実行した探索や、
+  段・方法を変えた探索では学習済みの評価を読むだけで済む
+- 複数銘柄は特徴量行列を縦に連結して1つの共有メモリに置く (fold の範囲は銘柄の区間内に収まる)
+- export_to_config: 最良のパラメータを src/config.py の BOT_CONFIGS["09_ml_gate"]["params"]["lgb_params"]
+  に書き込む
+"""
+import os
+import re
+import json
+import math
+import hashlib
+import logging
+import itertools
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import ML_TUNING_CACHE_DIR
+from src.bots.bot_09_ml_gate import FEATURE_SET_VERSION, prediction_to_signal
+from src.walk_forward import make_dataset, plan_folds, run_tasks, evaluate
+
+logger = logging.getLogger(__name__)
+
+# 既定の探索範囲 (LGB_PARAMS への上書き。3×3×2×3×2 = 108 通り)
+DEFAULT_GRID = {
+    "learning_rate": [0.02, 0.05, 0.1],
+    "num_leaves": [7, 15, 31],
+    "max_depth": [3, 6],
+    "min_child_samples": [20, 50, 100],
+    "feature_fraction": [0.8, 1.0],
+}
+NUM_BOOST_ROUND = 200  # 本番のフル再学習と同じ木の上限 (早期終了あり)
+CONFIG_PATH = Path(__file__).resolve().parent / "config.py"
+
+
+def expand_grid(grid: dict, base: dict = None) -> list:
+    """グリッドの全組み合わせを base に上書きした候補のリスト。base 自身を先頭に含め、重複は除く。"""
+    base = dict(base or {})
+    keys = list(grid)
+    candidates, seen = [], set()
+    for values in [None, *itertools.product(*(grid[k] for k in keys))]:
+        params = base if values is None else {**base, **dict(zip(keys, values))}
+        key = json.dumps(params, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            candidates.append(params)
+    return candidates
+
+
+def data_hash(X: pd.DataFrame, y: np.ndarray) -> str:
+    """特徴量・ターゲット・足の時刻から作るデータのハッシュ (16桁)。"""
+    h = hashlib.sha256()
+    h.update(json.dumps(list(X.columns)).encode())
+    h.update(np.ascontiguousarray(X.index.as_unit("ns").asi8).tobytes())
+    h.update(np.ascontiguousarray(X.to_numpy(dtype=np.float64)).tobytes())
+    h.update(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+    return h.hexdigest()[:16]
+
+
+class EvaluationCache:
+    """(候補, fold) の評価結果を root/<キー>.json に保存する。"""
+
+    def __init__(self, root=ML_TUNING_CACHE_DIR):
+        self.root = Path(root)
+
+    @staticmethod
+    def key(data_key: str, params: dict, fold: dict, num_boost_round: int) -> str:
+        payload = json.dumps([data_key, FEATURE_SET_VERSION, params,
+                              list(fold["train"]), list(fold["test"]), num_boost_round],
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+    def get(self, key: str):
+        try:
+            return json.loads((self.root / f"{key}.json").read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"探索キャッシュの読込失敗 ({key}): {e}")
+            return None
+
+    def put(self, key: str, result: dict):
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / f"{key}.json"
+        tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(result))
+        os.replace(tmp, path)
+
+
+class SearchData:
+    """
+    銘柄ごとの特徴量・ターゲット・fold を1つの行列にまとめたもの。
+    folds は {symbol: [fold, ...]} で、行位置は連結後の行列の位置。
+    """
+
+    def __init__(self, bot, dfs: dict, recent_folds: int = None):
+        p = bot.params
+        train_bars = p["train_window_bars"] // bot._bars_per_signal()
+        blocks, ys = [], []
+        self.folds, self.data_keys = {}, {}
+        offset = 0
+        for symbol, df in dfs.items():
+            X, y, ready = make_dataset(bot, df)
+            folds = plan_folds(X.index, ready, p["retrain_interval_hours"], train_bars,
+                               p["min_train_samples"])
+            if recent_folds:
+                folds = folds[-recent_folds:]
+            if not folds:
+                logger.warning(f"[{symbol}] 学習データ不足のため探索対象外 ({len(X)}本)")
+                continue
+            self.data_keys[symbol] = data_hash(X, y)
+            # キャッシュのキーは銘柄内の位置、学習に渡すのは連結後の位置
+            self.folds[symbol] = [
+                dict(f, symbol=symbol, local=f,
+                     train=(f["train"][0] + offset, f["train"][1] + offset),
+                     test=(f["test"][0] + offset, f["test"][1] + offset))
+                for f in folds
+            ]
+            blocks.append(X)
+            ys.append(y)
+            offset += len(X)
+        self.X = pd.concat(blocks) if blocks else pd.DataFrame()
+        self.y = np.concatenate(ys) if ys else np.zeros(0)
+
+    def subset(self, step: int) -> list:
+        """各銘柄の fold を最新から step 個おきに間引いたもの (古い順)。"""
+        return [f for folds in self.folds.values() for f in folds[::-1][::step][::-1]]
+
+    def num_folds(self) -> int:
+        return max((len(f) for f in self.folds.values()), default=0)
+
+
+def evaluate_candidates(data: SearchData, candidates: list, folds: list, cache: EvaluationCache,
+                        workers: int = None, num_boost_round: int = NUM_BOOST_ROUND) -> list:
+    """
+    候補を folds で評価する。キャッシュに無い (候補, fold) だけを並列に学習する。
+
+    Returns:
+        [{"params", "folds", "mse", "hit_rate", "ic", "long_ratio", "rows", "cached"}, ...] (候補の順)
+    """
+    keys = [[cache.key(data.data_keys[f["symbol"]], params, f["local"], num_boost_round)
+             for f in folds] for params in candidates]
+    results = {k: cache.get(k) for row in keys for k in row}
+    pending = [(f, params, k) for params, row in zip(candidates, keys)
+               for f, k in zip(folds, row) if results[k] is None]
+    if pending:
+        logger.info(f"評価: {len(candidates)}候補 × {len(folds)} fold "
+                    f"(学習 {len(pending)} / キャッシュ {len(folds) * len(candidates) - len(pending)})")
+        outcomes = run_tasks(data.X, data.y, [(f, params) for f, params, _ in pending],
+                             num_boost_round, workers)
+        for (_, _, k), outcome in zip(pending, outcomes):
+            results[k] = {"prediction": outcome["prediction"].tolist(),
+                          "num_trees": outcome["num_trees"], "train_rows": outcome["train_rows"]}
+            cache.put(k, results[k])
+
+    fresh = {k for _, _, k in pending}
+    realized = np.concatenate([data.y[f["test"][0]:f["test"][1]] for f in folds])
+    scores = []
+    for params, row in zip(candidates, keys):
+        pred = np.concatenate([results[k]["prediction"] for k in row])
+        frame = pd.DataFrame({
+            "prediction": pred, "realized": realized,
+            "target_position": [prediction_to_signal(v)["target_position"] for v in pred],
+        })
+        scores.append(dict(evaluate(frame), params=params, folds=len(folds),
+                           cached=sum(k not in fresh for k in row)))
+    return scores
+
+
+def _rank(scores: list) -> list:
+    return sorted(scores, key=lambda s: math.inf if s["mse"] is None else s["mse"])
+
+
+def grid_search(data: SearchData, candidates: list, cache: EvaluationCache,
+                workers: int = None) -> list:
+    """全候補を全 fold で評価し、MSE の小さい順に返す。"""
+    return _rank(evaluate_candidates(data, candidates, data.subset(1), cache, workers))
+
+
+def successive_halving(data: SearchData, candidates: list, cache: EvaluationCache,
+                       eta: int = 3, workers: int = None) -> list:
+    """
+    successive halving。段 r では fold を eta^(R-r) 個おきに間引いて評価し、上位 1/eta を残す。
+    最終段は全 fold。戻り値は最終段の候補の MSE の小さい順 (最終段以外の候補は含まない)。
+    """
+    n_folds = data.num_folds()
+    # 段数: 候補が1つに絞れるまで、かつ最初の段でも各銘柄に1つ以上の fold が残るまで
+    rungs = 0
+    while eta ** (rungs + 1) <= n_folds and eta ** rungs < len(candidates):
+        rungs += 1
+    survivors = candidates
+    for r in range(rungs + 1):
+        step = eta ** (rungs - r)
+        ranked = _rank(evaluate_candidates(data, survivors, data.subset(step), cache, workers))
+        logger.info(f"段 {r}: {len(survivors)}候補 × fold {step}個おき → 最良 MSE {ranked[0]['mse']}")
+        if r == rungs:
+            return ranked
+        survivors = [s["params"] for s in ranked[:max(1, math.ceil(len(ranked) / eta))]]
+    return []
+
+
+def _literal(value) -> str:
+    return json.dumps(value) if isinstance(value, str) else repr(value)
+
+
+def export_to_config(params: dict, path=CONFIG_PATH):
+    """
+    params を BOT_CONFIGS["09_ml_gate"]["params"]["lgb_params"] として config.py に書き込む
+    (該当ブロックの中身だけを置き換え、前後の書式・コメントは保つ)。
+    """
+    path = Path(path)
+    text = path.read_text()
+    section = text.index('"09_ml_gate": {')
+    start = text.index('"lgb_params": {', section)
+    end = text.index("}", start)
+    indent = re.search(r"\n([ \t]*)$", text[:start]).group(1) + "    "
+    body = "".join(f'\n{indent}"{k}": {_literal(v)},' for k, v in params.items())
+    closing = text[text.rindex("\n", start, end):end]  # 閉じ括弧の行の字下げ
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text[:start] + '"lgb_params": {' + body + closing + text[end:])
+    os.replace(tmp, path)
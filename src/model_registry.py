@@ -0,0 +1,176 @@
+"""
+仮想通貨自動売買Bot - 学習済みモデルのレジストリ
+LightGBM の Booster を版付きのネイティブ形式 (テキスト) で保存・公開し、推論側で遅延読込する。
+推論側は src/tree_predictor.py の TreePredictor で読むため lightgbm を import しない
+(lightgbm を使うのは公開 = 学習側と、継続学習の init_model 読込のみ)。
+
+  <root>/<name>.<版>.txt    モデル本体 (Booster.save_model。pickle と違い読込時にコードを実行しない)
+  <root>/<name>.<版>.json   メタデータ (足・特徴量スキーマのハッシュ・学習期間・評価値・本体の sha256)
+  <root>/<name>.json        公開中の版のメタデータ (os.replace で原子的に差し替える)
+
+- 読込は get() の初回呼び出し時。プロセス内でキャッシュし、以降は公開ファイルの
+  更新時刻 (stat 1回) が変わったときだけ読み直す。bot を作り直してもキャッシュは残る
+- 読込時に sha256 と特徴量スキーマを検証し、合わなければ使わない
+- 公開時に TreePredictor と Booster.predict の一致を確認し (PARITY_TOLERANCE)、
+  一致しないモデルは公開しない
+- 公開のたびに古い版 (と版管理導入前の pickle) を削除し、keep 世代だけ残す
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from src.config import ML_MODEL_KEEP_VERSIONS
+from src.tree_predictor import TreePredictor
+
+logger = logging.getLogger(__name__)
+
+# 公開時の一致確認で許す TreePredictor と Booster.predict の差 (通常は完全一致)
+PARITY_TOLERANCE = 1e-12
+
+# {(root, name): (公開ファイルの更新時刻, TreePredictor or None, メタデータ or None)}
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def feature_schema_hash(feature_names, feature_set_version) -> str:
+    """特徴量の並びと特徴量セット版から作るスキーマのハッシュ (16桁)。"""
+    payload = json.dumps([feature_set_version, list(feature_names)])
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class ModelRegistry:
+    """root ディレクトリ内の版付きモデルの公開・読込・削除。"""
+
+    def __init__(self, root, keep: int = ML_MODEL_KEEP_VERSIONS):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.keep = max(keep, 1)
+
+    def _pointer(self, name: str) -> Path:
+        return self.root / f"{name}.json"
+
+    def current(self, name: str):
+        """公開中の版のメタデータ。未公開・読込失敗は None。"""
+        try:
+            return json.loads(self._pointer(name).read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"モデルのメタデータ読込失敗 ({name}): {e}")
+            return None
+
+    def publish(self, name: str, booster, meta: dict, check_data=None) -> dict:
+        """
+        Booster を新しい版として保存し、公開する。本体・メタデータを書き終えてから
+        公開ファイルを差し替えるため、読む側が書き込み途中の版を見ることはない。
+
+        check_data (特徴量の DataFrame / 配列) があれば、保存する内容を TreePredictor で
+        読んだ予測と Booster.predict の差を確かめ、PARITY_TOLERANCE を超えたら ValueError。
+
+        Returns:
+            dict: 公開した版のメタデータ (version / file / sha256 / trained_at を追加したもの)
+        """
+        # 早期終了した場合は best_iteration までの木を保存する
+        model_str = booster.model_to_string()
+        parity = {}
+        if check_data is not None:
+            import lightgbm
+            expected = lightgbm.Booster(model_str=model_str).predict(check_data)
+            diff = float(np.max(np.abs(TreePredictor(model_str).predict(check_data) - expected),
+                               initial=0.0))
+            if diff > PARITY_TOLERANCE:
+                raise ValueError(f"NumPy 推論器と Booster.predict が一致しません (最大差 {diff:.3e})")
+            parity = {"parity_rows": len(expected), "parity_max_abs_diff": diff}
+
+        trained_at = datetime.now(timezone.utc)
+        version = trained_at.strftime("%Y%m%dT%H%M%S%fZ")
+        model_file = f"{name}.{version}.txt"
+        text = model_str.encode()
+        _write_atomic(self.root / model_file, text)
+
+        meta = dict(meta, **parity, name=name, version=version, file=model_file,
+                    sha256=hashlib.sha256(text).hexdigest(),
+                    trained_at=trained_at.isoformat())
+        body = json.dumps(meta, ensure_ascii=False, indent=2).encode()
+        _write_atomic(self.root / f"{name}.{version}.json", body)
+        _write_atomic(self._pointer(name), body)
+        self.prune(name)
+        return meta
+
+    def get(self, name: str, schema: str = None):
+        """
+        公開中の版を (TreePredictor, メタデータ) で返す。未公開・検証失敗は None。
+
+        前回から公開ファイルが変わっていなければキャッシュを返す。新しい版の読込・検証に
+        失敗した場合は、それまで使っていた版を使い続ける。
+        """
+        pointer = self._pointer(name)
+        try:
+            mtime = pointer.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        key = (str(self.root.resolve()), name)
+        with _CACHE_LOCK:
+            cached = _CACHE.get(key)
+            if cached is None or cached[0] != mtime:
+                cached = self._reload(name, mtime, cached)
+                _CACHE[key] = cached
+        _, predictor, meta = cached
+        if predictor is None:
+            return None
+        if schema is not None and meta.get("feature_schema") != schema:
+            return None
+        return predictor, meta
+
+    def _reload(self, name: str, mtime: int, cached):
+        meta = self.current(name)
+        if meta is None:
+            return (mtime, None, None) if cached is None else (mtime, cached[1], cached[2])
+        if cached is not None and cached[2] and cached[2].get("version") == meta["version"]:
+            return mtime, cached[1], cached[2]
+        try:
+            predictor = TreePredictor(self.read_model(meta))
+        except Exception as e:
+            logger.warning(f"モデル読込失敗 ({name} 版 {meta.get('version')}): {e}")
+            return (mtime, None, None) if cached is None else (mtime, cached[1], cached[2])
+        logger.info(f"モデルをロード: {name} (版: {meta['version']}, 木={predictor.num_trees()})")
+        return mtime, predictor, meta
+
+    def read_model(self, meta: dict) -> str:
+        """版のモデル本体 (テキスト) を sha256 を検証して返す。"""
+        text = (self.root / meta["file"]).read_bytes()
+        digest = hashlib.sha256(text).hexdigest()
+        if digest != meta.get("sha256"):
+            raise ValueError(f"sha256 不一致 ({digest[:12]} != {str(meta.get('sha256'))[:12]})")
+        return text.decode()
+
+    def prune(self, name: str, legacy=()):
+        """
+        新しい順に keep 世代を残して古い版を削除する (公開中の版は必ず残す)。
+        版管理導入前の pickle (<name>.pkl, <name>.<版>.pkl) と legacy のファイル名も削除する。
+        """
+        current = (self.current(name) or {}).get("version")
+        versions = sorted(
+            {p.name[len(name) + 1:-4] for p in self.root.glob(f"{name}.*.txt")}, reverse=True)
+        for version in versions[self.keep:]:
+            if version == current:
+                continue
+            for suffix in ("txt", "json"):
+                (self.root / f"{name}.{version}.{suffix}").unlink(missing_ok=True)
+        for path in [self.root / f"{name}.pkl", *self.root.glob(f"{name}.*.pkl"),
+                     *(self.root / n for n in legacy)]:
+            if path.exists():
+                path.unlink()
+                logger.info(f"旧形式のモデルを削除: {path.name}")
@@ -9,6 +9,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from src.database import get_recent_trades_all
 from src.notifier import send_trade_alert
+from src.profiling import profile_run
 
 logging.basicConfig(
     level=logging.INFO,
@@ -39,4 +40,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with profile_run("notify_hourly"):
+        main()
@@ -0,0 +1,243 @@
+"""
+仮想通貨自動売買Bot - オプトインのプロファイリング
+環境変数で有効化し、スクリプトを書き換えずに CPU / メモリの計測結果をファイルに残す。
+未設定時は profile_run() が何もしないコンテキストを返すだけで、計測コストはかからない。
+
+環境変数:
+  PROFILE           cpu (cProfile) / mem (tracemalloc) / sample (スタックのサンプリング)。
+                    カンマ区切りで併用可 (例: cpu,mem)。"1" は cpu と同じ
+  PROFILE_DIR       出力先 (既定: data/profiles/<エントリ名>_<UTC時刻>/)
+  PROFILE_INTERVAL  サンプリング間隔 秒 (sample: スタック採取, mem: 使用量の時系列。既定 0.01 / 0.5)
+  PROFILE_STAGES    計測範囲をスパン名に限定 (src/metrics.py の span 名, カンマ区切り, 前方一致)
+                    例: PROFILE_STAGES=stage.signals,task.ml_retrain
+                    未指定ならエントリポイント全体を1区間として計測
+
+出力 (区間ごと):
+  <区間>.pstats / <区間>_cpu.txt      cProfile (snakeviz 等で開ける) と累積時間上位
+  <区間>_alloc.txt                    区間内で増えた割り当て上位 (tracemalloc, 行単位)
+  <区間>.collapsed                    サンプリングしたスタック (flamegraph.pl / speedscope 形式)
+  memory_timeline.csv                 経過秒, 現在使用量, ピーク (mem かつ間隔指定時)
+
+注意: cProfile / sample は区間を開始したスレッドのみが対象。bot のシグナル計算を
+見る場合は BOT_EXECUTOR=serial で実行すること。
+"""
+import io
+import os
+import sys
+import time
+import pathlib
+import pstats
+import logging
+import cProfile
+import threading
+import traceback
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+from src.config import PROJECT_ROOT
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ROOT = PROJECT_ROOT / "data" / "profiles"
+_TOP_N = 40
+
+
+def _requested_modes() -> set:
+    raw = os.getenv("PROFILE", "").strip().lower()
+    if raw in ("", "0", "off"):
+        return set()
+    modes = {m.strip() for m in raw.split(",") if m.strip()}
+    if "1" in modes:
+        modes = (modes - {"1"}) | {"cpu"}
+    unknown = modes - {"cpu", "mem", "sample"}
+    if unknown:
+        logger.warning(f"PROFILE の未対応モードを無視: {sorted(unknown)}")
+    return modes & {"cpu", "mem", "sample"}
+
+
+def _safe_name(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "._-" else "_" for c in name)
+
+
+class _StackSampler:
+    """対象スレッドのスタックを一定間隔で採取し、折り畳み形式で数える。"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+
+class Profiler:
+    """1エントリポイント分のプロファイリングセッション。"""
+
+    def __init__(self, entry: str, modes: set, out_dir=None, interval: float = None,
+                 stages=None):
+        self.entry = entry
+        self.modes = modes
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.out_dir = out_dir or (PROFILE_ROOT / f"{_safe_name(entry)}_{stamp}")
+        self.interval = interval
+        self.stages = tuple(stages or ())
+        self._profiles = {}      # {区間名: cProfile.Profile} 同じ区間は繰り返し分を累積
+        self._samples = {}       # {区間名: {折り畳みスタック: 回数}}
+        self._alloc = {}         # {区間名: [StatisticDiff]} 区間ごとの増分を累積
+        self._active = None      # cProfile/sampler が有効な区間 (入れ子は外側のみ計測)
+        self._timeline = []
+        self._timeline_stop = threading.Event()
+        self._started = time.monotonic()
+
+    # ── 区間 ──
+
+    def wants(self, span_name: str) -> bool:
+        return bool(self.stages) and span_name.startswith(self.stages)
+
+    @contextmanager
+    def scope(self, name: str):
+        """name の区間を計測する。既に別区間を計測中なら CPU 系は入れ子を計測しない。"""
+        nested = self._active is not None
+        profile = sampler = None
+        if not nested:
+            self._active = name
+            if "cpu" in self.modes:
+                profile = self._profiles.setdefault(name, cProfile.Profile())
+                profile.enable()
+            if "sample" in self.modes:
+                sampler = _StackSampler(threading.get_ident(), self.interval or 0.01)
+                sampler.start()
+        before = tracemalloc.take_snapshot() if "mem" in self.modes else None
+        try:
+            yield
+        finally:
+            if before is not None:
+                diff = tracemalloc.take_snapshot().compare_to(before, "lineno")
+                self._alloc.setdefault(name, []).extend(diff[:_TOP_N])
+            if profile is not None:
+                profile.disable()
+            if sampler is not None:
+                sampler.stop()
+                counts = self._samples.setdefault(name, {})
+                for key, n in sampler.counts.items():
+                    counts[key] = counts.get(key, 0) + n
+            if not nested:
+                self._active = None
+
+    # ── セッション ──
+
+    def start(self):
+        if "mem" in self.modes and not tracemalloc.is_tracing():
+            tracemalloc.start(int(os.getenv("PROFILE_MEM_FRAMES", "1")))
+            if self.interval:
+                threading.Thread(target=self._record_memory, name="profile-memory",
+                                 daemon=True).start()
+        if self.stages:
+            from src.metrics import METRICS
+            METRICS.span_hook = self._span_hook
+
+    def _span_hook(self, name: str):
+        return self.scope(name) if self.wants(name) else None
+
+    def _record_memory(self):
+        interval = self.interval or 0.5
+        while not self._timeline_stop.wait(interval):
+            current, peak = tracemalloc.get_traced_memory()
+            self._timeline.append((time.monotonic() - self._started, current, peak))
+
+    def finish(self):
+        self._timeline_stop.set()
+        if self.stages:
+            from src.metrics import METRICS
+            METRICS.span_hook = None
+        try:
+            self._write()
+        except Exception as e:
+            logger.error(f"プロファイル出力エラー: {e}")
+            logger.debug(traceback.format_exc())
+        if "mem" in self.modes and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            logger.info(f"🧠 tracemalloc: 現在 {current / 2**20:.1f}MiB / ピーク {peak / 2**20:.1f}MiB")
+            tracemalloc.stop()
+
+    def _write(self):
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        for name, profile in self._profiles.items():
+            base = self.out_dir / _safe_name(name)
+            profile.dump_stats(str(base) + ".pstats")
+            buf = io.StringIO()
+            pstats.Stats(profile, stream=buf).sort_stats("cumulative").print_stats(_TOP_N)
+            (self.out_dir / f"{_safe_name(name)}_cpu.txt").write_text(buf.getvalue())
+        for name, counts in self._samples.items():
+            lines = [f"{stack} {n}" for stack, n in sorted(counts.items(), key=lambda kv: -kv[1])]
+            (self.out_dir / f"{_safe_name(name)}.collapsed").write_text("\n".join(lines) + "\n")
+        for name, diffs in self._alloc.items():
+            merged = {}
+            for d in diffs:
+                key = str(d.traceback)
+                size, count = merged.get(key, (0, 0))
+                merged[key] = (size + d.size_diff, count + d.count_diff)
+            ranked = sorted(merged.items(), key=lambda kv: -kv[1][0])[:_TOP_N]
+            lines = [f"{size / 1024:>10.1f} KiB {count:>+8d} blocks  {where}"
+                     for where, (size, count) in ranked]
+            (self.out_dir / f"{_safe_name(name)}_alloc.txt").write_text("\n".join(lines) + "\n")
+        if self._timeline:
+            lines = ["elapsed_s,current_bytes,peak_bytes"]
+            lines += [f"{t:.3f},{c},{p}" for t, c, p in self._timeline]
+            (self.out_dir / "memory_timeline.csv").write_text("\n".join(lines) + "\n")
+        logger.info(f"🔬 プロファイル出力: {self.out_dir} (モード: {','.join(sorted(self.modes))})")
+
+
+def profile_run(entry: str):
+    """
+    エントリポイント全体を囲むコンテキスト。PROFILE 未設定なら何もしない。
+
+        with profile_run("run_bots"):
+            main()
+    """
+    modes = _requested_modes()
+    if not modes:
+        return nullcontext()
+    return _profile_session(entry, modes)
+
+
+@contextmanager
+def _profile_session(entry: str, modes: set):
+    interval = float(os.environ["PROFILE_INTERVAL"]) if os.getenv("PROFILE_INTERVAL") else None
+    stages = [s.strip() for s in os.getenv("PROFILE_STAGES", "").split(",") if s.strip()]
+    out_dir = pathlib.Path(os.environ["PROFILE_DIR"]) if os.getenv("PROFILE_DIR") else None
+    profiler = Profiler(entry, modes, out_dir=out_dir, interval=interval, stages=stages)
+    # print ベースのスクリプト (backtest_*) でも出力先がわかるように (設定済みなら何もしない)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    logger.info(f"🔬 プロファイリング有効: {','.join(sorted(modes))}"
+                + (f" (区間: {','.join(stages)})" if stages else " (全体)"))
+    profiler.start()
+    try:
+        if stages:
+            yield profiler
+        else:
+            with profiler.scope(entry):
+                yield profiler
+    finally:
+        profiler.finish()
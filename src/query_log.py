@@ -0,0 +1,209 @@
+"""
+仮想通貨自動売買Bot - SQLite スロークエリログ
+database.get_connection() の接続をこのモジュールの InstrumentedConnection にすると、
+各ステートメントの所要時間・行数・呼び出し元 (src/ scripts/ 内の最初のフレーム) を
+QUERY_STATS に記録する。
+
+- 所要時間は execute と fetch* の合計 (SQLite は fetch 時に評価が進むため)
+- DB_SLOW_QUERY_MS を超えたステートメントは警告ログに出す
+- SELECT / UPDATE / DELETE は SQL 文ごとに1回だけ EXPLAIN QUERY PLAN を取り、
+  インデックスを使わない全件走査 (SCAN <table>) があれば計画を記録・ログに残す
+- 実行ごとの集計は query_metrics テーブルへ (bot_runner.report_query_metrics。SQL 本文は query_texts)、
+  日次の集計は scripts/db_query_report.py で見る
+
+既定で有効。DB_QUERY_LOG=0 で無効 (素の sqlite3.Connection を使う)。
+"""
+import sys
+import time
+import logging
+import sqlite3
+import threading
+
+from src.config import PROJECT_ROOT, DB_SLOW_QUERY_MS
+from src.metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+_THIS_FILE = __file__
+_PROJECT_DIR = str(PROJECT_ROOT)
+_EXPLAINED_VERBS = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+
+def _call_site() -> str:
+    """SQL を発行したプロジェクト内の関数 ("database.py:get_positions")。"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename != _THIS_FILE and filename.startswith(_PROJECT_DIR):
+            return f"{filename.rsplit('/', 1)[-1]}:{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+def _normalize(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+def _full_scans(plan_rows) -> list:
+    """EXPLAIN QUERY PLAN の detail 列から、インデックスを使わない全件走査を抜き出す。"""
+    return [d for d in plan_rows if d.startswith("SCAN ") and " USING " not in d]
+
+
+class QueryStats:
+    """ステートメント単位の記録と、(呼び出し元, SQL) ごとの集計。"""
+
+    def __init__(self, slow_ms: float = DB_SLOW_QUERY_MS):
+        self.slow_ms = slow_ms
+        self._executions = {}   # {(call_site, sql): [[seconds, rows], ...]}
+        self._plans = {}        # {sql: [全件走査の detail, ...]} (走査なしは [])
+        self._lock = threading.Lock()
+
+    def start(self, call_site: str, sql: str) -> list:
+        """1ステートメント分の記録枠を作って返す (fetch 時に加算していく)。"""
+        record = [0.0, 0]
+        with self._lock:
+            self._executions.setdefault((call_site, sql), []).append(record)
+        return record
+
+    def needs_plan(self, sql: str) -> bool:
+        return sql not in self._plans and sql.lstrip().upper().startswith(_EXPLAINED_VERBS)
+
+    def set_plan(self, sql: str, scans: list):
+        self._plans[sql] = scans
+
+    def plan(self, sql: str) -> list:
+        return self._plans.get(sql) or []
+
+    def reset(self):
+        with self._lock:
+            self._executions = {}
+
+    def summary(self) -> list:
+        """
+        (呼び出し元, SQL) ごとの集計を返す (ミリ秒, 合計時間の多い順)。
+
+        Returns:
+            [{"call_site", "sql", "count", "rows", "total_ms", "p95_ms", "max_ms",
+              "slow", "full_scan"}, ...]
+        """
+        with self._lock:
+            executions = {k: [list(r) for r in v] for k, v in self._executions.items()}
+        rows = []
+        for (call_site, sql), records in executions.items():
+            values = sorted(r[0] for r in records)
+            rows.append({
+                "call_site": call_site,
+                "sql": sql,
+                "count": len(records),
+                "rows": sum(r[1] for r in records),
+                "total_ms": sum(values) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "max_ms": values[-1] * 1000,
+                "slow": sum(1 for v in values if v * 1000 >= self.slow_ms),
+                "full_scan": "; ".join(self.plan(sql)),
+            })
+        rows.sort(key=lambda r: -r["total_ms"])
+        return rows
+
+
+QUERY_STATS = QueryStats()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """execute / fetch の所要時間と行数を QUERY_STATS に記録するカーソル。"""
+
+    _record = None
+    _sql = ""
+    _site = ""
+    _logged = False
+
+    def _begin(self, sql: str, parameters):
+        self._sql = _normalize(sql)
+        self._site = _call_site()
+        self._logged = False
+        if QUERY_STATS.needs_plan(self._sql) and parameters is not None:
+            self._explain(sql, parameters)
+        self._record = QUERY_STATS.start(self._site, self._sql)
+
+    def _explain(self, sql: str, parameters):
+        try:
+            plan = sqlite3.Cursor(self.connection).execute(
+                "EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+            scans = _full_scans([row[-1] for row in plan])
+        except sqlite3.Error:
+            scans = []
+        QUERY_STATS.set_plan(self._sql, scans)
+        if scans:
+            logger.info(f"🔍 全件走査: {self._site}: {'; '.join(scans)} ← {self._sql[:160]}")
+
+    def _add(self, seconds: float, rows: int):
+        record = self._record
+        if record is None:
+            return
+        record[0] += seconds
+        record[1] += rows
+        if not self._logged and record[0] * 1000 >= QUERY_STATS.slow_ms:
+            self._logged = True
+            scans = QUERY_STATS.plan(self._sql)
+            logger.warning(
+                f"🐢 遅いクエリ {record[0] * 1000:.0f}ms (行数{record[1]}) {self._site}: "
+                f"{self._sql[:160]}" + (f" [全件走査: {'; '.join(scans)}]" if scans else "")
+            )
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            # 更新系は影響行数、SELECT は fetch 時に行数を数える
+            self._add(time.perf_counter() - start, max(self.rowcount, 0))
+
+    def executemany(self, sql, seq_of_parameters):
+        self._begin(sql, None)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._add(time.perf_counter() - start, max(self.rowcount, 0))
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._add(time.perf_counter() - start, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._add(time.perf_counter() - start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._add(time.perf_counter() - start, len(rows))
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._add(time.perf_counter() - start, 0)
+            raise
+        self._add(time.perf_counter() - start, 1)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """cursor() / execute() / executemany() を InstrumentedCursor 経由にする接続。"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
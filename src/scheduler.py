@@ -0,0 +1,135 @@
+"""
+仮想通貨自動売買Bot - 実行スケジューラ
+1回の実行 (Actions ジョブ / 常駐モードの1サイクル) の締切内で、
+優先度と所要予算つきのタスクを実行する。
+
+- 必須タスク (売買判断) は常に先に、優先度順に実行する。締切の判定対象外
+- 任意タスク (ML再学習・ダッシュボード出力・リサーチ取得など重い処理) は、
+  残り時間が「予算 + 予備」を満たすときだけ実行し、足りなければ見送る
+- align_to_bar_close(): 足確定が間近なら、確定直後まで待ってから売買に入る
+  (必須タスクの予算が締切に収まる場合のみ)
+"""
+import time
+import logging
+import traceback
+from datetime import datetime, timezone
+
+from src.config import SCHEDULER_RESERVE_SECONDS
+from src.metrics import span
+
+logger = logging.getLogger(__name__)
+
+
+class Task:
+    """スケジューラに登録する1タスク。"""
+
+    def __init__(self, name: str, fn, priority: int = 0, budget_seconds: float = 0.0,
+                 required: bool = False):
+        self.name = name
+        self.fn = fn
+        self.priority = priority              # 小さいほど先に実行
+        self.budget_seconds = budget_seconds  # 想定所要秒数 (任意タスクの実行可否判定に使う)
+        self.required = required
+
+
+class RunScheduler:
+    """締切 (開始からの秒数) つきのタスク実行器。"""
+
+    def __init__(self, deadline_seconds: float, reserve_seconds: float = SCHEDULER_RESERVE_SECONDS,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.started = clock()
+        self.deadline_seconds = deadline_seconds
+        self.reserve_seconds = reserve_seconds
+        self.tasks = []
+
+    def add(self, name: str, fn, priority: int = 0, budget_seconds: float = 0.0,
+            required: bool = False) -> Task:
+        task = Task(name, fn, priority, budget_seconds, required)
+        self.tasks.append(task)
+        return task
+
+    def elapsed(self) -> float:
+        return self.clock() - self.started
+
+    def remaining(self) -> float:
+        """締切までの残り秒数 (予備は差し引かない)。"""
+        return self.deadline_seconds - self.elapsed()
+
+    def can_afford(self, seconds: float) -> bool:
+        """seconds 秒の処理を予備を残したまま締切内に終えられるか。"""
+        return self.remaining() - self.reserve_seconds >= seconds
+
+    def _ordered(self) -> list:
+        # 必須 → 任意、それぞれ優先度順 (同順位は登録順)
+        return sorted(self.tasks, key=lambda t: (not t.required, t.priority))
+
+    def required_budget(self) -> float:
+        return sum(t.budget_seconds for t in self.tasks if t.required)
+
+    def align_to_bar_close(self, timeframe_sec: int, grace_seconds: float,
+                           max_wait_seconds: float, now: datetime = None) -> float:
+        """
+        次の足確定 (+猶予) が max_wait_seconds 以内で、待っても必須タスクが締切に
+        収まるなら、その時刻まで待機する。直前の足確定から猶予内に起動した場合は、
+        その足の猶予の残りだけ待つ。
+
+        Returns:
+            float: 待機した秒数 (待たなかった場合は 0)
+        """
+        now = now or datetime.now(timezone.utc)
+        ts = now.timestamp()
+        next_close = (int(ts) // timeframe_sec + 1) * timeframe_sec
+        wait = next_close + grace_seconds - ts
+        # 直前の足確定から猶予内 (確定直後) なら、次の足ではなくその足の猶予が明けるまで待つ
+        # (取引所側の集計が終わる前の足で売買しない)
+        if ts - (next_close - timeframe_sec) < grace_seconds:
+            wait = next_close - timeframe_sec + grace_seconds - ts
+        if wait <= 0 or wait > max_wait_seconds:
+            return 0.0
+        if not self.can_afford(wait + self.required_budget()):
+            logger.info(f"⏱ 足確定まで{wait:.0f}秒ですが、締切に収まらないため待たずに実行します")
+            return 0.0
+        logger.info(f"⏱ 足確定を待機: {wait:.0f}秒")
+        self.sleep(wait)
+        return wait
+
+    def run(self) -> dict:
+        """
+        登録タスクを実行する。
+
+        Returns:
+            {name: {"status": "DONE" | "SKIPPED" | "ERROR", "elapsed": float,
+                    "result": Any, "error": str}}
+        """
+        outcomes = {}
+        for task in self._ordered():
+            if not task.required and not self.can_afford(task.budget_seconds):
+                logger.info(
+                    f"⏭ [{task.name}] 残り時間不足のため見送り "
+                    f"(残り{self.remaining():.0f}秒 / 必要{task.budget_seconds:.0f}秒+予備{self.reserve_seconds:.0f}秒)"
+                )
+                outcomes[task.name] = {"status": "SKIPPED", "elapsed": 0.0}
+                continue
+
+            start = self.clock()
+            try:
+                with span(f"task.{task.name}"):
+                    result = task.fn()
+                outcomes[task.name] = {"status": "DONE", "result": result}
+            except Exception as e:
+                logger.error(f"  ❌ [{task.name}] タスク実行エラー: {e}")
+                logger.debug(traceback.format_exc())
+                outcomes[task.name] = {"status": "ERROR", "error": str(e)}
+            elapsed = self.clock() - start
+            outcomes[task.name]["elapsed"] = elapsed
+            if elapsed > task.budget_seconds > 0:
+                logger.warning(f"[{task.name}] 予算超過: {elapsed:.1f}秒 (予算{task.budget_seconds:.0f}秒)")
+
+        logger.info(
+            "⏱ タスク実行結果: " + ", ".join(
+                f"{name}={o['status']}({o['elapsed']:.1f}s)" for name, o in outcomes.items())
+            + f" / 残り{self.remaining():.0f}秒"
+        )
+        return outcomes
@@ -1,10 +1,20 @@
 """
 仮想通貨自動売買Bot - 仮想約定エンジン
 target_position ベースのポジション調整 (ロングのみ: 0.0 ~ 1.0)
+
+状態 (残高・稼働中か・保有数量) の読込と台帳 (約定・スナップショット) の書き込み、
+現在時刻は ledger (台帳バックエンド) が受け持つ。約定規則 (変更閾値・最低保有期間・コスト・
+サーキットブレーカーと復帰のヒステリシス) は Simulator 側にだけあり、どの台帳でも同じ。
+
+  DatabaseLedger  本番 (src/database.py の bot_state / trades / balances, 時刻は現在時刻)
+  MemoryLedger    バックテスト用 (メモリ上の配列に約定を追記, 時刻は set_time で進める)
 """
 import logging
 from datetime import datetime, timezone
 
+import numpy as np
+import pandas as pd
+
 from src.config import (
     INITIAL_BALANCE, TOTAL_COST_RATE, USD_JPY_RATE,
     CIRCUIT_BREAKER_THRESHOLD, POSITION_CHANGE_THRESHOLD,
@@ -21,6 +31,125 @@ logger = logging.getLogger(__name__)
 RECOVERY_LOSS_RATE = CIRCUIT_BREAKER_THRESHOLD * 0.5  # 例: 20% → 10%まで回復で復帰
 
 
+class DatabaseLedger:
+    """本番の台帳: 状態・約定・スナップショットを DB に読み書きする。"""
+
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    def load_state(self, bot_name: str):
+        """(残高 or None(未登録), 稼働中か, {symbol: 保有数量})"""
+        state = get_bot_state(bot_name)
+        quantities = {symbol: data["position"] for symbol, data in get_positions(bot_name).items()}
+        if not state:
+            return None, True, quantities
+        return state["balance"], bool(state["is_active"]), quantities
+
+    def update_state(self, bot_name: str, balance: float, is_active: bool = True):
+        update_bot_state(bot_name, balance, is_active=is_active)
+
+    def last_trade_time(self, bot_name: str, symbol: str):
+        return get_last_trade_time(bot_name, symbol)
+
+    def record_trade(self, timestamp: datetime, **trade):
+        save_trade(timestamp=timestamp.isoformat(), **trade)
+
+    def save_snapshot(self, timestamp: datetime, **snapshot):
+        save_balance_snapshot(timestamp=timestamp.isoformat(), **snapshot)
+
+
+class MemoryLedger:
+    """
+    メモリ上の台帳 (バックテスト用)。DB を読み書きしないため apply_signal を大量に回せる。
+
+    - 時刻は set_time(足の時刻) で進める (最低保有期間の判定と約定時刻に使う)
+    - 約定は列ごとの NumPy 配列に追記する (容量が尽きたら倍に拡張)。trades() で DataFrame
+    - 複数の Simulator (bot) で共有できる。理由の文字列 (note) は保存しない
+    """
+
+    _COLUMNS = ("price", "effective_price", "quantity", "balance", "position",
+                "target_position", "prev_position", "profit_loss", "confidence")
+
+    def __init__(self, capacity: int = 1024):
+        self.time = None
+        self.states = {}        # {bot_name: (balance, is_active)}
+        self.positions = {}     # {bot_name: {symbol: 約定後の保有数量}}
+        self.snapshots = []
+        self._last_trade = {}   # {(bot_name, symbol): 直近の約定時刻}
+        self._names = {}        # bot名・銘柄 → 番号 (配列には番号で持つ)
+        self.count = 0
+        self._alloc(capacity)
+
+    def _alloc(self, capacity: int):
+        def grow(old, dtype):
+            arr = np.zeros(capacity, dtype=dtype)
+            if old is not None:
+                arr[:self.count] = old[:self.count]
+            return arr
+        prev = getattr(self, "_arrays", {})
+        self._arrays = {
+            "timestamp": grow(prev.get("timestamp"), "datetime64[ns]"),
+            "bot": grow(prev.get("bot"), np.int32),
+            "symbol": grow(prev.get("symbol"), np.int32),
+            "side": grow(prev.get("side"), np.int8),  # 1=BUY, -1=SELL
+            **{c: grow(prev.get(c), np.float64) for c in self._COLUMNS},
+        }
+
+    def _id(self, name: str) -> int:
+        return self._names.setdefault(name, len(self._names))
+
+    def set_time(self, ts):
+        """現在時刻を進める (datetime / pd.Timestamp, tz-aware)。"""
+        self.time = ts.to_pydatetime() if hasattr(ts, "to_pydatetime") else ts
+
+    def now(self) -> datetime:
+        if self.time is None:
+            raise RuntimeError("MemoryLedger.set_time で時刻を設定してください")
+        return self.time
+
+    def load_state(self, bot_name: str):
+        balance, is_active = self.states.get(bot_name, (None, True))
+        return balance, is_active, dict(self.positions.get(bot_name, {}))
+
+    def update_state(self, bot_name: str, balance: float, is_active: bool = True):
+        self.states[bot_name] = (balance, is_active)
+
+    def last_trade_time(self, bot_name: str, symbol: str):
+        return self._last_trade.get((bot_name, symbol))
+
+    def record_trade(self, timestamp: datetime, bot_name: str, symbol: str, action: str,
+                     note: str = "", **values):
+        if self.count == len(self._arrays["bot"]):
+            self._alloc(len(self._arrays["bot"]) * 2)
+        i = self.count
+        a = self._arrays
+        a["timestamp"][i] = np.datetime64(timestamp.astimezone(timezone.utc).replace(tzinfo=None), "ns")
+        a["bot"][i] = self._id(bot_name)
+        a["symbol"][i] = self._id(symbol)
+        a["side"][i] = 1 if action == "BUY" else -1
+        for c in self._COLUMNS:
+            a[c][i] = values.get(c, 0.0)
+        self.count += 1
+        self._last_trade[(bot_name, symbol)] = timestamp
+        self.positions.setdefault(bot_name, {})[symbol] = values["position"]
+
+    def save_snapshot(self, timestamp: datetime, **snapshot):
+        self.snapshots.append(dict(snapshot, timestamp=timestamp))
+
+    def trades(self) -> pd.DataFrame:
+        """約定の一覧 (timestamp は UTC)。"""
+        names = {i: name for name, i in self._names.items()}
+        n = self.count
+        a = self._arrays
+        return pd.DataFrame({
+            "timestamp": pd.to_datetime(a["timestamp"][:n], utc=True),
+            "bot_name": [names[i] for i in a["bot"][:n]],
+            "symbol": [names[i] for i in a["symbol"][:n]],
+            "action": np.where(a["side"][:n] > 0, "BUY", "SELL"),
+            **{c: a[c][:n].copy() for c in self._COLUMNS},
+        })
+
+
 class Simulator:
     """
     仮想約定エンジン (target_position ベース)。
@@ -28,27 +157,27 @@ class Simulator:
     - 各botの仮想残高・ポジションを管理
     - target_position と current_position の差分でトレード実行
     - 循環ブレーカー判定は全銘柄の時価評価で行う (偽陽性防止)
+    - ledger 未指定は本番の DB (DatabaseLedger)。バックテストは MemoryLedger を渡し、
+      必要なら初期資産・変更閾値・最低保有期間を差し替える (既定は本番の設定値)
     """
 
-    def __init__(self, bot_name: str):
+    def __init__(self, bot_name: str, ledger=None, initial_balance: float = INITIAL_BALANCE,
+                 position_change_threshold: float = POSITION_CHANGE_THRESHOLD,
+                 min_hold_minutes: float = MIN_HOLD_MINUTES):
         self.bot_name = bot_name
+        self.ledger = ledger if ledger is not None else DatabaseLedger()
+        self.initial_balance = initial_balance
+        self.position_change_threshold = position_change_threshold
+        self.min_hold_minutes = min_hold_minutes
         self._load_state()
 
     def _load_state(self):
-        """データベースからボット状態を読み込む。"""
-        state = get_bot_state(self.bot_name)
-        if state:
-            self.balance = state["balance"]
-            self.is_active = bool(state["is_active"])
-        else:
-            self.balance = INITIAL_BALANCE
-            self.is_active = True
-
+        """台帳からボット状態を読み込む。"""
+        balance, is_active, quantities = self.ledger.load_state(self.bot_name)
+        self.balance = self.initial_balance if balance is None else balance
+        self.is_active = is_active
         # ポジション: {symbol: quantity (coin count)}
-        positions = get_positions(self.bot_name)
-        self.quantities = {}
-        for symbol, data in positions.items():
-            self.quantities[symbol] = data["position"]
+        self.quantities = quantities
 
     def apply_signal(self, symbol: str, signal: dict, current_price: float,
                      all_prices: dict = None) -> dict:
@@ -75,7 +204,7 @@ class Simulator:
             if self._check_recovery(prices_dict):
                 logger.info(f"[{self.bot_name}] ✅ 損失率回復によりサーキットブレーカー解除")
                 self.is_active = True
-                update_bot_state(self.bot_name, self.balance, is_active=True)
+                self.ledger.update_state(self.bot_name, self.balance, is_active=True)
             else:
                 return {"executed": False, "reason": "サーキットブレーカーにより停止中"}
 
@@ -96,7 +225,7 @@ class Simulator:
         delta = target_pos - current_pos
 
         # 閾値以下の変更はスキップ（コスト負け防止）
-        if abs(delta) < POSITION_CHANGE_THRESHOLD:
+        if abs(delta) < self.position_change_threshold:
             return {
                 "executed": False,
                 "reason": f"変更幅不足 (delta={delta:.3f})",
@@ -106,20 +235,19 @@ class Simulator:
 
         # 最低保有期間 (2026-07-05 構成見直し①): 直近約定から一定時間はポジション変更しない。
         # 5分足ノイズによる往復約定がコストの主因(累計-90,244円)だったための抑制策
-        if MIN_HOLD_MINUTES > 0:
-            last_ts = get_last_trade_time(self.bot_name, symbol)
+        now = self.ledger.now()
+        if self.min_hold_minutes > 0:
+            last_ts = self.ledger.last_trade_time(self.bot_name, symbol)
             if last_ts is not None:
-                elapsed_min = (datetime.now(timezone.utc) - last_ts).total_seconds() / 60
-                if elapsed_min < MIN_HOLD_MINUTES:
+                elapsed_min = (now - last_ts).total_seconds() / 60
+                if elapsed_min < self.min_hold_minutes:
                     return {
                         "executed": False,
-                        "reason": f"最低保有期間内 ({elapsed_min:.0f}分 < {MIN_HOLD_MINUTES}分)",
+                        "reason": f"最低保有期間内 ({elapsed_min:.0f}分 < {self.min_hold_minutes}分)",
                         "current_pos": current_pos,
                         "target_pos": target_pos,
                     }
 
-        now = datetime.now(timezone.utc).isoformat()
-
         if delta > 0:
             result = self._increase_position(
                 symbol, price_jpy, delta, total_asset,
@@ -134,7 +262,7 @@ class Simulator:
         # サーキットブレーカー判定 (取引後、全銘柄評価で)
         if not self._check_circuit_breaker_jpy(prices_dict):
             self.is_active = False
-            update_bot_state(self.bot_name, self.balance, is_active=False)
+            self.ledger.update_state(self.bot_name, self.balance, is_active=False)
 
         return result
 
@@ -156,7 +284,7 @@ class Simulator:
         self.balance -= buy_amount
         self.quantities[symbol] = self.quantities.get(symbol, 0.0) + quantity
 
-        save_trade(
+        self.ledger.record_trade(
             timestamp=timestamp, bot_name=self.bot_name, symbol=symbol,
             action="BUY", price=price_jpy, effective_price=effective_price,
             quantity=quantity, balance=self.balance,
@@ -164,7 +292,7 @@ class Simulator:
             target_position=target_pos, prev_position=prev_pos,
             confidence=confidence, note=reason,
         )
-        update_bot_state(self.bot_name, self.balance)
+        self.ledger.update_state(self.bot_name, self.balance)
 
         logger.info(
             f"[{self.bot_name}] BUY {symbol}: "
@@ -202,7 +330,7 @@ class Simulator:
 
         profit_loss = sell_quantity * (effective_price - price_jpy)
 
-        save_trade(
+        self.ledger.record_trade(
             timestamp=timestamp, bot_name=self.bot_name, symbol=symbol,
             action="SELL", price=price_jpy, effective_price=effective_price,
             quantity=sell_quantity, balance=self.balance,
@@ -210,7 +338,7 @@ class Simulator:
             target_position=target_pos, prev_position=prev_pos,
             profit_loss=profit_loss, confidence=confidence, note=reason,
         )
-        update_bot_state(self.bot_name, self.balance)
+        self.ledger.update_state(self.bot_name, self.balance)
 
         logger.info(
             f"[{self.bot_name}] SELL {symbol}: "
@@ -245,7 +373,7 @@ class Simulator:
     def _check_circuit_breaker_jpy(self, current_prices_usd: dict) -> bool:
         """サーキットブレーカー判定。True=継続, False=発動 (停止)。"""
         total = self._total_asset_jpy(current_prices_usd)
-        loss_rate = (INITIAL_BALANCE - total) / INITIAL_BALANCE
+        loss_rate = (self.initial_balance - total) / self.initial_balance
         if loss_rate >= CIRCUIT_BREAKER_THRESHOLD:
             logger.warning(
                 f"[{self.bot_name}] ⚠️ サーキットブレーカー発動！ "
@@ -257,11 +385,17 @@ class Simulator:
     def _check_recovery(self, current_prices_usd: dict) -> bool:
         """停止中botが復帰可能か判定。総資産が回復閾値以上なら True。"""
         total = self._total_asset_jpy(current_prices_usd)
-        loss_rate = (INITIAL_BALANCE - total) / INITIAL_BALANCE
+        loss_rate = (self.initial_balance - total) / self.initial_balance
         return loss_rate < RECOVERY_LOSS_RATE
 
-    def save_snapshot(self, current_prices: dict, trade_count: int = 0):
-        """残高スナップショット(円)を保存する。current_pricesはUSD建て全銘柄dict。"""
+    def save_snapshot(self, current_prices: dict, trade_count: int = 0, run_id: str = None) -> dict:
+        """
+        残高スナップショット(円)を保存する。current_pricesはUSD建て全銘柄dict。
+        run_id 指定時、同じ実行のスナップショットは1botにつき1行まで (再実行で重複しない)。
+
+        Returns:
+            dict: 保存した値 (balance, position_value, total_asset, total_pnl, is_active, quantities)
+        """
         position_value = 0.0
         for sym, qty in self.quantities.items():
             if qty <= 0:
@@ -271,10 +405,10 @@ class Simulator:
                 continue
             position_value += qty * price * USD_JPY_RATE
         total_asset = self.balance + position_value
-        total_pnl = total_asset - INITIAL_BALANCE
+        total_pnl = total_asset - self.initial_balance
 
-        save_balance_snapshot(
-            timestamp=datetime.now(timezone.utc).isoformat(),
+        self.ledger.save_snapshot(
+            timestamp=self.ledger.now(),
             bot_name=self.bot_name,
             balance=self.balance,
             total_position_value=position_value,
@@ -283,4 +417,13 @@ class Simulator:
             total_pnl=total_pnl,
             trade_count=trade_count,
             is_active=self.is_active,
+            run_id=run_id,
         )
+        return {
+            "balance": self.balance,
+            "position_value": position_value,
+            "total_asset": total_asset,
+            "total_pnl": total_pnl,
+            "is_active": self.is_active,
+            "quantities": dict(self.quantities),
+        }
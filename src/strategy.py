@@ -9,6 +9,8 @@ import logging
 import pandas as pd
 from abc import ABC, abstractmethod
 
+from src.metrics import span
+
 logger = logging.getLogger(__name__)
 
 
@@ -82,7 +84,8 @@ class BaseBot(ABC):
                 continue
 
             try:
-                signal = self.compute_signal(df, symbol)
+                with span("bot.compute_signal", self.name):
+                    signal = self.compute_signal(df, symbol)
                 # target_position を 0.0 ~ 1.0 にクランプ
                 tp = signal.get("target_position", 0.0)
                 signal["target_position"] = max(0.0, min(1.0, tp))
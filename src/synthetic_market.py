@@ -0,0 +1,185 @@
+"""
+仮想通貨自動売買Bot - 合成マーケット生成器
+モック取引所 (scripts/mock_exchange_server.py) の価格源。数百銘柄まで決定的に生成する。
+
+シナリオ:
+  - gbm:    幾何ブラウン運動 (銘柄ごとにドリフト/ボラを乱数で付与)
+  - regime: 上昇/下落/高ボラの3レジームをマルコフ連鎖で切替えるGBM
+  - gap:    GBM + ジャンプ (窓開け) + 欠損バー (取引所側のデータ抜け)
+
+系列は (seed, 銘柄名) から決定的に生成されるため、同じ設定なら何度起動しても同一。
+基準足は5分足で、上位足は集約して返す。
+"""
+import zlib
+
+import numpy as np
+
+SCENARIOS = ("gbm", "regime", "gap")
+
+BASE_BAR_MS = 5 * 60 * 1000
+BARS_PER_DAY = 288
+_DT = 5 / (365 * 24 * 60)  # 5分の年率換算
+
+# 実在銘柄の初期価格の目安 (未登録銘柄は乱数)
+_INITIAL_PRICES = {"BTC": 60_000.0, "ETH": 3_000.0, "SOL": 150.0, "USD": 150.0}
+
+# regime シナリオの各レジーム (年率ドリフト, 年率ボラ) と滞在確率 (5分足あたり)
+_REGIMES = ((0.8, 0.5), (-0.8, 0.7), (0.0, 1.6))
+_REGIME_STAY_PROB = 0.999  # 平均滞在 ≈ 1000本 ≈ 3.5日
+
+# gap シナリオ: ジャンプ発生率 (1日あたり) と大きさ、欠損バーの確率
+_JUMPS_PER_DAY = 1.0
+_JUMP_SIGMA = 0.04
+_MISSING_BAR_PROB = 0.002
+
+
+def synthetic_symbols(count: int) -> list:
+    """BTC/ETH/SOL に続けて合成銘柄 SY001/USD ... を count 件まで並べる。"""
+    symbols = ["BTC/USD", "ETH/USD", "SOL/USD"][:count]
+    symbols += [f"SY{i:03d}/USD" for i in range(1, count - len(symbols) + 1)]
+    return symbols
+
+
+class SyntheticMarket:
+    """決定的な合成OHLCV・ticker・funding/OIを返すマーケット。"""
+
+    def __init__(self, symbols, scenario: str = "gbm", seed: int = 42,
+                 history_days: int = 60, future_days: int = 7, now_ms: int = None):
+        if scenario not in SCENARIOS:
+            raise ValueError(f"未対応のシナリオ: {scenario} (選択肢: {SCENARIOS})")
+        self.symbols = list(symbols)
+        self.scenario = scenario
+        self.seed = seed
+        if now_ms is None:
+            now_ms = int(np.datetime64("now", "ms").astype(np.int64))
+        day_ms = BARS_PER_DAY * BASE_BAR_MS
+        self.start_ms = (now_ms // day_ms - history_days) * day_ms
+        self.n_bars = (history_days + future_days) * BARS_PER_DAY
+        self._series = {}
+
+    # ── 生成 ──
+
+    def _rng(self, symbol: str, stream: int = 0):
+        return np.random.default_rng([self.seed, zlib.crc32(symbol.encode()), stream])
+
+    def _generate(self, symbol: str) -> dict:
+        rng = self._rng(symbol)
+        n = self.n_bars
+        base = symbol.split("/")[0]
+        s0 = _INITIAL_PRICES.get(base) or float(10 ** rng.uniform(-1, 4))
+
+        if symbol == "USD/JPY":
+            mu, sigma = np.zeros(n), np.full(n, 0.08)
+        elif self.scenario == "regime":
+            stay = rng.random(n) < _REGIME_STAY_PROB
+            jumps = rng.integers(0, len(_REGIMES), n)
+            state = np.empty(n, dtype=int)
+            current = 0
+            for i in range(n):  # マルコフ連鎖は経路依存のため逐次
+                if not stay[i]:
+                    current = jumps[i]
+                state[i] = current
+            params = np.array(_REGIMES)
+            mu, sigma = params[state, 0], params[state, 1]
+        else:
+            mu = np.full(n, rng.normal(0.0, 0.3))
+            sigma = np.full(n, rng.uniform(0.4, 1.2))
+
+        ret = (mu - 0.5 * sigma ** 2) * _DT + sigma * np.sqrt(_DT) * rng.standard_normal(n)
+        missing = np.zeros(n, dtype=bool)
+        if self.scenario == "gap" and symbol != "USD/JPY":
+            jump_mask = rng.random(n) < _JUMPS_PER_DAY / BARS_PER_DAY
+            ret = ret + jump_mask * rng.normal(0.0, _JUMP_SIGMA, n)
+            missing = rng.random(n) < _MISSING_BAR_PROB
+
+        close = s0 * np.exp(np.cumsum(ret))
+        open_ = np.concatenate(([s0], close[:-1]))
+        wick = np.abs(rng.normal(0.0, sigma * np.sqrt(_DT) / 2, (2, n)))
+        high = np.maximum(open_, close) * (1 + wick[0])
+        low = np.minimum(open_, close) * (1 - wick[1])
+        # 出来高: 対数正規 × 値幅が大きい足ほど増える
+        volume = rng.lognormal(0.0, 0.5, n) * (1 + 50 * np.abs(ret)) * 1_000_000 / s0
+
+        return {"open": open_, "high": high, "low": low, "close": close,
+                "volume": volume, "missing": missing}
+
+    def series(self, symbol: str) -> dict:
+        if symbol not in self._series:
+            self._series[symbol] = self._generate(symbol)
+        return self._series[symbol]
+
+    def current_index(self, now_ms: int) -> int:
+        """now_ms を含む基準足のインデックス (生成範囲にクリップ)。"""
+        idx = (now_ms - self.start_ms) // BASE_BAR_MS
+        return int(min(max(idx, 0), self.n_bars - 1))
+
+    # ── 参照 ──
+
+    def ohlcv(self, symbol: str, interval_minutes: int, now_ms: int,
+              since_ms: int = None, limit: int = 720) -> list:
+        """
+        [ts_ms, open, high, low, close, volume] のリストを返す (形成中の足を含む)。
+        Kraken と同様、since 以降のうち直近 limit 本までに制限する。
+        """
+        if interval_minutes % 5 != 0:
+            raise ValueError("interval は5分の倍数のみ対応")
+        s = self.series(symbol)
+        k = interval_minutes // 5
+        end = self.current_index(now_ms) + 1
+        last_bucket = (end - 1) // k
+        first_bucket = 0
+        if since_ms is not None:
+            first_bucket = max(0, (since_ms - self.start_ms) // BASE_BAR_MS) // k
+        first_bucket = max(first_bucket, last_bucket - limit + 1)
+
+        rows = []
+        for b in range(first_bucket, last_bucket + 1):
+            lo, hi = b * k, min((b + 1) * k, end)
+            keep = ~s["missing"][lo:hi]
+            if not keep.any():
+                continue
+            o = s["open"][lo:hi][keep]
+            c = s["close"][lo:hi][keep]
+            rows.append([
+                int(self.start_ms + lo * BASE_BAR_MS),
+                float(o[0]), float(s["high"][lo:hi][keep].max()),
+                float(s["low"][lo:hi][keep].min()), float(c[-1]),
+                float(s["volume"][lo:hi][keep].sum()),
+            ])
+        return rows
+
+    def ticker(self, symbol: str, now_ms: int) -> dict:
+        """直近価格と24時間統計を返す。"""
+        s = self.series(symbol)
+        i = self.current_index(now_ms)
+        lo = max(0, i - BARS_PER_DAY + 1)
+        last = float(s["close"][i])
+        volume = float(s["volume"][lo:i + 1].sum())
+        vwap = float((s["close"][lo:i + 1] * s["volume"][lo:i + 1]).sum() / volume) if volume else last
+        return {
+            "last": last,
+            "bid": last * (1 - 0.0001),
+            "ask": last * (1 + 0.0001),
+            "open": float(s["open"][lo]),
+            "high": float(s["high"][lo:i + 1].max()),
+            "low": float(s["low"][lo:i + 1].min()),
+            "volume": volume,
+            "vwap": vwap,
+        }
+
+    def derivatives(self, symbol: str, now_ms: int) -> dict:
+        """perp の funding rate (1時間ごとに変化) と建玉を返す。"""
+        hour = (now_ms - self.start_ms) // 3_600_000
+        rng = self._rng(symbol, stream=int(hour) + 1)
+        s = self.series(symbol)
+        i = self.current_index(now_ms)
+        # 直近24時間のリターンに連動した funding (Kraken 実測の1e-5オーダー)
+        ref = s["close"][max(0, i - BARS_PER_DAY)]
+        momentum = float(s["close"][i] / ref - 1)
+        funding = momentum * 3e-4 + rng.normal(0.0, 1e-5)
+        oi_base = float(s["volume"][max(0, i - BARS_PER_DAY):i + 1].sum()) * 5
+        return {
+            "funding_rate": funding,
+            "open_interest": max(oi_base * (1 + rng.normal(0.0, 0.03)), 1.0),
+            "mark_price": float(s["close"][i]),
+        }
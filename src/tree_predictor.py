@@ -0,0 +1,145 @@
+"""
+仮想通貨自動売買Bot - LightGBM モデルの NumPy 推論器
+Booster.save_model のテキスト形式を読み、lightgbm を import せずに Booster.predict と
+同じ値を返す。売買の経路 (bot #09 の推論) はこちらを使い、lightgbm は学習時のみ読む。
+
+- 全木のノードを1つの配列にまとめ、(行 × 木) の現在ノードを深さ方向に一斉に進める
+  (ループ回数は最大深さのみ。行数が増えても Python 側の処理は増えない)
+- 分岐規則は LightGBM の NumericalDecision と同じ: 欠損種別 (None/Zero/NaN) と
+  default_left の扱い、閾値は fval <= threshold で左。|値| <= kZeroThreshold の入力は 0
+- 一致は scripts/check_tree_predictor.py で確認する (CI でも実行)
+- 木の出力は木の順に逐次加算する (LightGBM と同じ加算順で、丸め誤差まで一致させる)
+- 対応するのは数値特徴量・回帰系の目的関数 (恒等変換) のみ。カテゴリ分岐・線形木・
+  多クラス等を含むモデルは読込時に ValueError
+"""
+import numpy as np
+
+_K_ZERO_THRESHOLD = float(np.float32(1e-35))  # LightGBM の kZeroThreshold (float の 1e-35f)
+_MISSING_NONE, _MISSING_ZERO, _MISSING_NAN = 0, 1, 2
+# 出力を変換しない (生スコアがそのまま予測値の) 目的関数
+_IDENTITY_OBJECTIVES = ("regression", "regression_l1", "huber", "fair", "quantile", "mape")
+
+
+def _parse_blocks(text: str):
+    """ヘッダと各木の key=value を辞書で返す。"""
+    header, trees, current = {}, [], None
+    for line in text.splitlines():
+        if line.startswith("end of trees"):
+            break
+        if line.startswith("Tree="):
+            current = {}
+            trees.append(current)
+            continue
+        if "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        (current if current is not None else header)[key] = value
+    return header, trees
+
+
+class TreePredictor:
+    """LightGBM のテキスト形式モデルを NumPy 配列に展開した推論器。"""
+
+    def __init__(self, model_str: str):
+        header, trees = _parse_blocks(model_str)
+        objective = header.get("objective", "").split(" ")[0]
+        if objective not in _IDENTITY_OBJECTIVES:
+            raise ValueError(f"未対応の目的関数: {objective}")
+        if int(header.get("num_tree_per_iteration", 1)) != 1:
+            raise ValueError("多クラスのモデルには未対応です")
+        self.feature_names = header.get("feature_names", "").split()
+
+        features, thresholds, decision, lefts, rights, leaf_values, roots = [], [], [], [], [], [], []
+        node_base = leaf_base = 0
+        for tree in trees:
+            if int(tree.get("num_cat", 0)) or int(tree.get("is_linear", 0)):
+                raise ValueError("カテゴリ分岐・線形木を含むモデルには未対応です")
+            values = np.array(tree["leaf_value"].split(), dtype=np.float64)
+            n_leaves = int(tree["num_leaves"])
+            if n_leaves == 1:
+                roots.append(-(leaf_base + 1))
+            else:
+                left = np.array(tree["left_child"].split(), dtype=np.int64)
+                right = np.array(tree["right_child"].split(), dtype=np.int64)
+                # 子の番号を全体配列での番号に (葉は ~葉番号 = -(葉番号+1) で表す)
+                lefts.append(np.where(left >= 0, left + node_base, left - leaf_base))
+                rights.append(np.where(right >= 0, right + node_base, right - leaf_base))
+                features.append(np.array(tree["split_feature"].split(), dtype=np.int64))
+                thresholds.append(np.array(tree["threshold"].split(), dtype=np.float64))
+                decision.append(np.array(tree["decision_type"].split(), dtype=np.int64))
+                roots.append(node_base)
+                node_base += n_leaves - 1
+            leaf_values.append(values)
+            leaf_base += n_leaves
+
+        def cat(parts, dtype):
+            return np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+
+        self.split_feature = cat(features, np.int64)
+        self.threshold = cat(thresholds, np.float64)
+        decision_type = cat(decision, np.int64)
+        self.default_left = (decision_type & 2) != 0
+        self.missing_type = (decision_type >> 2) & 3
+        self.left_child = cat(lefts, np.int64)
+        self.right_child = cat(rights, np.int64)
+        self.leaf_value = cat(leaf_values, np.float64)
+        self.roots = np.array(roots, dtype=np.int64)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls(f.read())
+
+    def num_trees(self) -> int:
+        return len(self.roots)
+
+    def _matrix(self, data) -> np.ndarray:
+        if hasattr(data, "columns"):
+            missing = [c for c in self.feature_names if c not in data.columns]
+            if missing:
+                raise ValueError(f"特徴量が不足しています: {missing}")
+            data = data[self.feature_names]
+        X = np.asarray(data, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != len(self.feature_names):
+            raise ValueError(f"特徴量の数が違います ({X.shape[1]} != {len(self.feature_names)})")
+        # LightGBM は推論の入力で |値| <= kZeroThreshold を 0 として渡す (疎な行に詰める際に落とす)。
+        # 欠損種別 None の分岐はゼロ境界 (-kZeroThreshold) を閾値に持つため、同じく 0 にそろえる
+        return np.where(np.abs(X) <= _K_ZERO_THRESHOLD, 0.0, X)
+
+    def predict(self, data) -> np.ndarray:
+        """
+        行ごとの予測値 (Booster.predict と同じ値)。
+
+        Args:
+            data: DataFrame (列名で並べ替える) または (行数, 特徴量数) の配列
+        """
+        X = self._matrix(data)
+        n_rows = len(X)
+        out = np.zeros(n_rows)
+        if n_rows == 0 or not len(self.roots):
+            return out
+
+        current = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+        row_index = np.broadcast_to(np.arange(n_rows)[:, None], current.shape)
+        active = current >= 0
+        while active.any():
+            node = current[active]
+            fval = X[row_index[active], self.split_feature[node]]
+            missing_type = self.missing_type[node]
+            is_nan = np.isnan(fval)
+            # 欠損種別が NaN 以外なら NaN は 0 として扱う
+            fval = np.where(is_nan & (missing_type != _MISSING_NAN), 0.0, fval)
+            use_default = (
+                ((missing_type == _MISSING_ZERO) & (np.abs(fval) <= _K_ZERO_THRESHOLD))
+                | ((missing_type == _MISSING_NAN) & is_nan)
+            )
+            go_left = np.where(use_default, self.default_left[node], fval <= self.threshold[node])
+            current[active] = np.where(go_left, self.left_child[node], self.right_child[node])
+            active = current >= 0
+
+        leaf_out = self.leaf_value[-current - 1]
+        for t in range(leaf_out.shape[1]):
+            out += leaf_out[:, t]
+        return out
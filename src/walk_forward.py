@@ -0,0 +1,290 @@
+"""
+仮想通貨自動売買Bot - Bot #09 (ML ゲート) のウォークフォワード学習・評価
+本番と同じ周期 (retrain_interval_hours) で過去の各時点に再学習したと仮定し、各モデルを
+次の再学習までの足にだけ適用して、全期間のアウトオブサンプル (OOS) 予測を作る。
+
+  fold k: 再学習時刻 T_k = T_0 + k × retrain_interval_hours
+    学習: T_k までにターゲット (prediction_horizon 本先リターン) が確定した足の直近 train_bars 本
+          (本番の fit_model と同じく前方 80% で学習・後方 20% で早期終了)
+    予測: 判断時刻 (足の終了時刻) が [T_k, T_k+1) の足
+  T_0 は学習できる足が min_train_samples 本そろった時刻 (それより前の足には予測を出さない)
+
+- ルックアヘッド防止: 学習に使う足はターゲットの確定時刻 (h 本先の足の終了時刻) で選ぶ
+- fold は互いに独立なのでプロセスプールで並列に学習する。特徴量行列とターゲットは
+  共有メモリ (multiprocessing.shared_memory) に1回だけ置き、ワーカーは複製せずに参照する
+  (fold ごとに pickle で送るのは fold の範囲だけ)
+- 再学習は全てフル再学習として扱う (本番の継続学習・ドリフト判定は再現しない)
+- 予測系列は prediction_to_signal で target_position に変換して CSV に保存する。
+  PredictionSignals (compute_signal 互換) でバックテスト (scripts/backtest_restructure.py) に渡せる
+"""
+import os
+import time
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+import ccxt
+import numpy as np
+import pandas as pd
+
+from src.config import SIGNAL_TIMEFRAME, ML_WALK_FORWARD_WORKERS, ML_WALK_FORWARD_DIR
+from src.strategy import BaseBot
+from src.bots.bot_09_ml_gate import FEATURE_COLUMNS, fit_model, prediction_to_signal
+
+logger = logging.getLogger(__name__)
+
+# ワーカー内で参照する配列 {名前: (SharedMemory or None, ndarray)}
+_ARRAYS = {}
+
+
+def make_dataset(bot, df: pd.DataFrame, timeframe: str = SIGNAL_TIMEFRAME):
+    """
+    シグナル足の OHLCV から特徴量 X・ターゲット y・ターゲットの確定時刻 ready を作る。
+    X は特徴量が全てそろった足 (index は足の開始時刻)。末尾の足のようにターゲットが
+    まだ無い足も予測対象として残し、y は NaN・ready は NaT とする。
+    """
+    horizon = bot.params["prediction_horizon"]
+    tf = pd.Timedelta(seconds=ccxt.Exchange.parse_timeframe(timeframe))
+    features = bot._build_features(df)
+    target = df["close"].astype(float).pct_change(horizon).shift(-horizon)
+    ts = pd.Series(pd.DatetimeIndex(df["timestamp"]), index=df.index)
+    ready = ts.shift(-horizon) + tf
+
+    valid = features.notna().all(axis=1).to_numpy()
+    index = pd.DatetimeIndex(ts[valid])
+    X = features[valid].set_axis(index)
+    y = target[valid].to_numpy(dtype=float)
+    return X, y, pd.DatetimeIndex(ready[valid])
+
+
+def plan_folds(index: pd.DatetimeIndex, ready: pd.DatetimeIndex, interval_hours: float,
+               train_bars: int, min_train_samples: int,
+               timeframe: str = SIGNAL_TIMEFRAME) -> list:
+    """
+    再学習時刻ごとの fold を作る (行位置は make_dataset の X の行)。
+
+    Returns:
+        [{"fold": k, "retrain_at": T_k, "train": (開始, 終了), "test": (開始, 終了)}, ...]
+    """
+    if len(index) < min_train_samples:
+        return []
+    tf = pd.Timedelta(seconds=ccxt.Exchange.parse_timeframe(timeframe))
+    decision = (index + tf).as_unit("ns").asi8
+    # 未確定 (NaT) は末尾にしか無いので、最大値で埋めれば昇順のまま二分探索できる
+    ready_ns = np.where(ready.isna(), np.iinfo(np.int64).max, ready.as_unit("ns").asi8)
+    if ready_ns[min_train_samples - 1] == np.iinfo(np.int64).max:
+        return []
+    interval = pd.Timedelta(hours=interval_hours).value
+
+    folds = []
+    retrain_at = int(ready_ns[min_train_samples - 1])
+    while retrain_at <= decision[-1]:
+        test_start = int(np.searchsorted(decision, retrain_at, side="left"))
+        test_end = int(np.searchsorted(decision, retrain_at + interval, side="left"))
+        if test_end > test_start:
+            train_end = int(np.searchsorted(ready_ns, retrain_at, side="right"))
+            folds.append({
+                "fold": len(folds),
+                "retrain_at": pd.Timestamp(retrain_at, tz="UTC"),
+                "train": (max(0, train_end - train_bars), train_end),
+                "test": (test_start, test_end),
+            })
+        retrain_at += interval
+    return folds
+
+
+def _share(arrays: dict):
+    """配列を共有メモリに複製し、(SharedMemory のリスト, ワーカーに渡す {名前: (shm名, 形)}) を返す。"""
+    handles, specs = [], {}
+    for key, arr in arrays.items():
+        arr = np.ascontiguousarray(arr, dtype=np.float64)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        handles.append(shm)
+        np.ndarray(arr.shape, dtype=np.float64, buffer=shm.buf)[...] = arr
+        specs[key] = (shm.name, arr.shape)
+    return handles, specs
+
+
+def _attach(specs: dict):
+    """ワーカーの初期化: 共有メモリの配列を参照する (破棄は作成した親が行う)。"""
+    for key, (name, shape) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _ARRAYS[key] = (shm, np.ndarray(shape, dtype=np.float64, buffer=shm.buf))
+
+
+def _run_fold(fold: dict, params: dict, num_boost_round: int) -> dict:
+    """1 fold を学習し、テスト区間を予測する。"""
+    start = time.perf_counter()
+    X, y = _ARRAYS["X"][1], _ARRAYS["y"][1]
+    a, b = fold["train"]
+    labeled = ~np.isnan(y[a:b])
+    model = fit_model(pd.DataFrame(X[a:b][labeled], columns=list(FEATURE_COLUMNS)),
+                      pd.Series(y[a:b][labeled]), params, num_boost_round)
+    c, d = fold["test"]
+    prediction = model.predict(pd.DataFrame(X[c:d], columns=list(FEATURE_COLUMNS)))
+    return {
+        "fold": fold["fold"],
+        "prediction": prediction,
+        "train_rows": int(labeled.sum()),
+        "num_trees": model.num_trees(),
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def _cpu_count() -> int:
+    """このプロセスが使える CPU コア数 (コンテナの CPU 割り当てを反映する)。"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def resolve_workers(workers: int = None) -> int:
+    """並列プロセス数 (None は設定値、0 は CPU コア数)。"""
+    workers = ML_WALK_FORWARD_WORKERS if workers is None else workers
+    return workers if workers > 0 else _cpu_count()
+
+
+def run_tasks(X: pd.DataFrame, y: np.ndarray, tasks: list, num_boost_round: int = 200,
+              workers: int = None) -> list:
+    """
+    (fold, LightGBM パラメータ) の組を学習・予測する。workers > 1 ならプロセスプールで
+    並列に実行し、X・y は共有メモリで渡す。結果は tasks の順に返す。
+    """
+    workers = min(resolve_workers(workers), len(tasks))
+    if workers <= 1:
+        _ARRAYS.update(X=(None, X.to_numpy(dtype=float)), y=(None, np.asarray(y, dtype=float)))
+        try:
+            return [_run_fold(fold, params, num_boost_round) for fold, params in tasks]
+        finally:
+            _ARRAYS.clear()
+
+    # 並列時は LightGBM のスレッドを分け合う (コア数を超えて OpenMP スレッドを立てない)
+    threads = max(1, _cpu_count() // workers)
+    handles, specs = _share({"X": X.to_numpy(dtype=float), "y": y})
+    try:
+        # fork だと親の OpenMP (LightGBM) の状態を引き継いで固まることがあるため spawn で起動する
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_attach, initargs=(specs,)) as pool:
+            futures = [pool.submit(_run_fold, fold, {"num_threads": threads, **params}, num_boost_round)
+                       for fold, params in tasks]
+            return [f.result() for f in futures]
+    finally:
+        for shm in handles:
+            shm.close()
+            shm.unlink()
+
+
+def run_folds(X: pd.DataFrame, y: np.ndarray, folds: list, params: dict = None,
+              num_boost_round: int = 200, workers: int = None) -> list:
+    """全 fold を同じパラメータ (LGB_PARAMS への上書き) で学習・予測する。結果は fold の順。"""
+    params = dict(params or {})
+    return run_tasks(X, y, [(fold, params) for fold in folds], num_boost_round, workers)
+
+
+def walk_forward(bot, df: pd.DataFrame, params: dict = None, workers: int = None,
+                 timeframe: str = SIGNAL_TIMEFRAME) -> pd.DataFrame:
+    """
+    OHLCV (シグナル足) 全期間のウォークフォワード予測を作る。
+    再学習周期・学習窓・最低学習本数は bot の params (retrain_interval_hours /
+    train_window_bars / min_train_samples) に従う。params は LightGBM のパラメータ
+    (既定は bot の lgb_params = 本番の再学習と同じ)。
+
+    Returns:
+        DataFrame: timestamp (足の開始時刻) / prediction / target_position / realized (実現リターン,
+        未確定は NaN) / fold / retrain_at。attrs["folds"] に fold ごとの学習本数・木の数・所要時間
+    """
+    p = bot.params
+    X, y, ready = make_dataset(bot, df, timeframe)
+    # train_window_bars は5分足の行数 (本番の再学習と同じくシグナル足の本数に換算する)
+    train_bars = p["train_window_bars"] // bot._bars_per_signal()
+    folds = plan_folds(X.index, ready, p["retrain_interval_hours"], train_bars,
+                       p["min_train_samples"], timeframe)
+    columns = ["timestamp", "prediction", "target_position", "realized", "fold", "retrain_at"]
+    if not folds:
+        return pd.DataFrame(columns=columns)
+
+    results = run_folds(X, y, folds, params or bot.lgb_params, workers=workers)
+    parts = []
+    for fold, result in zip(folds, results):
+        c, d = fold["test"]
+        parts.append(pd.DataFrame({
+            "timestamp": X.index[c:d],
+            "prediction": result["prediction"],
+            "realized": y[c:d],
+            "fold": fold["fold"],
+            "retrain_at": fold["retrain_at"],
+        }))
+    out = pd.concat(parts, ignore_index=True)
+    out["target_position"] = [prediction_to_signal(v)["target_position"] for v in out["prediction"]]
+    out = out[columns]
+    out.attrs["folds"] = [
+        {"fold": f["fold"], "retrain_at": f["retrain_at"].isoformat(), "train_rows": r["train_rows"],
+         "test_rows": f["test"][1] - f["test"][0], "num_trees": r["num_trees"],
+         "elapsed": round(r["elapsed"], 3)}
+        for f, r in zip(folds, results)
+    ]
+    return out
+
+
+def evaluate(predictions: pd.DataFrame) -> dict:
+    """OOS 予測の評価 (実現リターンが確定した足のみ)。"""
+    scored = predictions.dropna(subset=["realized"])
+    pred = scored["prediction"].to_numpy(dtype=float)
+    real = scored["realized"].to_numpy(dtype=float)
+    if len(scored) < 2:
+        return {"rows": len(scored), "mse": None, "hit_rate": None, "ic": None}
+    ic = float(np.corrcoef(pred, real)[0, 1]) if pred.std() > 0 and real.std() > 0 else 0.0
+    return {
+        "rows": len(scored),
+        "mse": float(np.mean((pred - real) ** 2)),
+        "hit_rate": float(np.mean(np.sign(pred) == np.sign(real))),
+        "ic": ic,
+        "long_ratio": float(np.mean(scored["target_position"].to_numpy() > 0.1)),
+    }
+
+
+def predictions_path(symbol: str, out_dir=ML_WALK_FORWARD_DIR, timeframe: str = SIGNAL_TIMEFRAME):
+    return out_dir / f"ml_gate_{symbol.replace('/', '_')}_{timeframe}.csv"
+
+
+def save_predictions(predictions: pd.DataFrame, symbol: str, out_dir=ML_WALK_FORWARD_DIR):
+    path = predictions_path(symbol, out_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    predictions.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def load_predictions(symbol: str, out_dir=ML_WALK_FORWARD_DIR):
+    """保存済みの予測系列。無ければ None。"""
+    path = predictions_path(symbol, out_dir)
+    if not path.exists():
+        return None
+    df = pd.read_csv(path)
+    for col in ("timestamp", "retrain_at"):
+        df[col] = pd.to_datetime(df[col], utc=True, format="mixed")
+    return df
+
+
+class PredictionSignals:
+    """
+    保存済みの予測系列を compute_signal 互換で返す (バックテスト用)。
+    渡された df の最終足の予測を使い、予測の無い足 (学習前・範囲外) は HOLD。
+    """
+
+    def __init__(self, predictions: dict):
+        # {symbol: 予測系列 DataFrame}
+        self.series = {
+            symbol: pd.Series(df["prediction"].to_numpy(dtype=float),
+                              index=pd.DatetimeIndex(df["timestamp"]))
+            for symbol, df in predictions.items() if df is not None and not df.empty
+        }
+
+    def compute_signal(self, df: pd.DataFrame, symbol: str) -> dict:
+        series = self.series.get(symbol)
+        ts = df["timestamp"].iloc[-1]
+        if series is None or ts not in series.index:
+            return BaseBot._hold_signal("予測なし (ウォークフォワード対象外)")
+        return prediction_to_signal(float(series[ts]))